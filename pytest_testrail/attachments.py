@@ -0,0 +1,109 @@
+import mimetypes
+import os
+import uuid
+from typing import Iterator, List, Union
+
+import pytest
+
+# Files to attach to an item's TestRail result.
+attachments_key = pytest.StashKey[List[str]]()
+
+# Largest file, in bytes, sent as an attachment by default.
+DEFAULT_MAX_ATTACHMENT_SIZE = 256 * 1024 * 1024
+
+CHUNK_SIZE = 64 * 1024
+
+
+def add_attachment(item: pytest.Item, path: Union[str, 'os.PathLike[str]']) -> None:
+    """Register a file to attach to the TestRail result of an item.
+
+    Files can be registered until the item's teardown is finished,
+    ie: a screenshot taken by a fixture after a failure.
+
+    Arguments:
+        item: The pytest item.
+        path: Path of the file.
+    """
+    item.stash.setdefault(attachments_key, []).append(os.fspath(path))
+
+
+class MultipartFile:
+    """multipart/form-data body for one file, read from disk as it is sent.
+
+    requests streams objects with read() and __iter__ instead of
+    building the body in memory. __len__ lets it set Content-Length.
+
+    Arguments:
+        path: Path of the file.
+        field: Name of the form field.
+    """
+
+    def __init__(self, path: str, field: str = 'attachment'):
+        self.path = path
+        self.boundary = uuid.uuid4().hex
+
+        filename = os.path.basename(path).replace('"', '%22')
+        mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+        self._head = (
+            f'--{self.boundary}\r\n'
+            f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f'Content-Type: {mimetype}\r\n\r\n'
+        ).encode()
+        self._tail = f'\r\n--{self.boundary}--\r\n'.encode()
+
+        self._size = len(self._head) + os.path.getsize(path) + len(self._tail)
+        self._parts = self._iter_parts()
+        self._buffer = b''
+
+    @property
+    def content_type(self) -> str:
+        """Get the Content-Type header for the body."""
+        return f'multipart/form-data; boundary={self.boundary}'
+
+    def __len__(self) -> int:
+        """Get the size of the whole body, in bytes."""
+        return self._size
+
+    def _iter_parts(self) -> Iterator[bytes]:
+        """Get the body in chunks."""
+        yield self._head
+
+        with open(self.path, 'rb') as f:
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+
+        yield self._tail
+
+    def __iter__(self) -> Iterator[bytes]:
+        """Iterate over the body in chunks."""
+        return self
+
+    def __next__(self) -> bytes:
+        """Get the next chunk of the body."""
+        chunk = self.read(CHUNK_SIZE)
+        if not chunk:
+            raise StopIteration
+        return chunk
+
+    def read(self, size: int = -1) -> bytes:
+        """Read up to size bytes of the body, or all of it if size is negative."""
+        while size < 0 or len(self._buffer) < size:
+            try:
+                self._buffer += next(self._parts)
+            except StopIteration:
+                break
+
+        if size < 0:
+            rv, self._buffer = self._buffer, b''
+        else:
+            rv, self._buffer = self._buffer[:size], self._buffer[size:]
+
+        return rv
+
+    def close(self) -> None:
+        """Close the file, if it is still open."""
+        self._parts.close()
@@ -0,0 +1,179 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from typing import Dict, Optional
+
+from filelock import FileLock
+
+# Time to live, in seconds, of responses from each read-only endpoint.
+# Endpoints not listed are never cached. Plans and runs are not cached:
+# sessions add, close and publish to them, so another session must see their state.
+DEFAULT_TTLS: Dict[str, float] = {
+    'get_statuses': 24 * 60 * 60,
+    'get_case_fields': 24 * 60 * 60,
+    'get_result_fields': 24 * 60 * 60,
+    'get_projects': 60 * 60,
+    'get_project': 60 * 60,
+    'get_suites': 60 * 60,
+    'get_suite': 60 * 60,
+    'get_milestones': 10 * 60,
+}
+
+# Total size, in bytes, of the cached responses before the least recently used are removed.
+DEFAULT_MAX_SIZE = 50 * 1024 * 1024
+
+# The cache directory is scanned every this many writes, or when the writes
+# since the last scan could make it larger than its maximum size.
+EVICT_INTERVAL = 100
+
+
+def default_cache_dir() -> str:
+    """Get the directory used for the plugin's persistent caches.
+
+    $XDG_CACHE_HOME/pytest-testrail, or ~/.cache/pytest-testrail.
+    """
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'pytest-testrail')
+
+
+def clear_cache(cache_dir: Optional[str] = None) -> None:
+    """Remove every cached response, case index and durations file."""
+    shutil.rmtree(cache_dir or default_cache_dir(), ignore_errors=True)
+
+
+class ResponseCache:
+    """Persistent cache of TestRail API responses, shared by every process.
+
+    Each response is kept in its own file, written atomically, so many
+    processes can read and write the cache at the same time.
+    A file's modification time is its last use. When the cache grows past
+    max_size, the least recently used responses are removed.
+
+    Arguments:
+        cache_dir: Directory of the plugin's caches.
+        ttls: Time to live, in seconds, of each endpoint's responses.
+        max_size: Total size, in bytes, of the cached responses.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Optional[str] = None,
+        ttls: Optional[Dict[str, float]] = None,
+        max_size: int = DEFAULT_MAX_SIZE,
+    ):
+        self.directory = os.path.join(cache_dir or default_cache_dir(), 'responses')
+        self.ttls = DEFAULT_TTLS if ttls is None else ttls
+        self.max_size = max_size
+
+        self.lock = FileLock(os.path.join(self.directory, '.lock'))
+
+        # Size of the cache at the last scan, plus what this process wrote since.
+        # Other processes' writes are only seen by the next scan.
+        self._size: Optional[int] = None
+        self._puts_since_scan = 0
+
+    @staticmethod
+    def key(user: str, url: str) -> str:
+        """Get the cache key of a request.
+
+        Arguments:
+            user: Account making the request. Accounts can see different data.
+            url: Full URL of the request, including the query.
+        """
+        return hashlib.sha256(f'{user}\n{url}'.encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        """Get the path of the file holding a response."""
+        return os.path.join(self.directory, f'{key}.json')
+
+    def get(self, key: str) -> Optional[str]:
+        """Get a cached response body, or None if it is missing or expired."""
+        path = self._path(key)
+
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if entry['expires'] < time.time():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+
+        # Mark as recently used.
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        content: str = entry['content']
+        return content
+
+    def put(self, key: str, endpoint: str, content: str) -> None:
+        """Add a response body to the cache.
+
+        Arguments:
+            key: Key from ResponseCache.key().
+            endpoint: Name of the endpoint, used to get the time to live.
+            content: Body of the response.
+        """
+        ttl = self.ttls.get(endpoint)
+        if not ttl:
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+
+        path = self._path(key)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'expires': time.time() + ttl, 'content': content}, f)
+            size = f.tell()
+
+        os.replace(tmp_path, path)
+
+        self._puts_since_scan += 1
+        if self._size is not None:
+            self._size += size
+
+        if self._size is None or self._size > self.max_size:
+            self.evict()
+        elif self._puts_since_scan >= EVICT_INTERVAL:
+            self.evict()
+
+    def evict(self) -> None:
+        """Remove the least recently used responses until the cache fits in max_size."""
+        with self.lock:
+            entries = []
+            total = 0
+
+            for entry in os.scandir(self.directory):
+                if not entry.name.endswith('.json'):
+                    continue
+
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+            self._puts_since_scan = 0
+
+            if total > self.max_size:
+                for _mtime, size, path in sorted(entries):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        continue
+
+                    total -= size
+                    if total <= self.max_size:
+                        break
+
+            self._size = total
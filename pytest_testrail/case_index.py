@@ -0,0 +1,125 @@
+import hashlib
+import json
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from filelock import FileLock
+
+from .cache import default_cache_dir
+from .testrail_api_client import _TestRailAPI, fetch_pages
+
+# An index refreshed this recently, in seconds, is used without a request.
+# This lets every pytest-xdist worker share one refresh.
+REFRESH_INTERVAL = 60
+
+# get_cases with updated_after does not return deleted or moved cases.
+# The index is rebuilt from scratch when it is older than this, in seconds.
+FULL_REFRESH_INTERVAL = 24 * 60 * 60
+
+
+class CaseIndex:
+    """Local copy of the case ids in a TestRail suite.
+
+    The index is kept in a JSON file between sessions. The first session
+    fetches every case with get_cases, the next ones only fetch cases
+    updated since the last refresh.
+
+    Arguments:
+        client: TestRail API client.
+        project_id: ID of the project containing the suite.
+        suite_id: ID of the suite. Not needed for single suite projects.
+        cache_dir: Directory where the index file is kept.
+    """
+
+    def __init__(
+        self,
+        client: _TestRailAPI,
+        project_id: int,
+        suite_id: Optional[int] = None,
+        cache_dir: Optional[str] = None,
+    ):
+        self.client = client
+        self.project_id = project_id
+        self.suite_id = suite_id
+        self.cache_dir = cache_dir or default_cache_dir()
+
+        # Instances are told apart by their API url.
+        url_hash = hashlib.sha1(str(client.base_uri).encode()).hexdigest()[:12]
+        name = f'cases-{url_hash}-{project_id}-{suite_id or 0}.json'
+
+        self.path = os.path.join(self.cache_dir, name)
+        self.lock = FileLock(f'{self.path}.lock')
+
+        self.case_ids: Set[int] = set()
+
+    def _read(self) -> Dict[str, Any]:
+        """Get the content of the index file, or an empty dict."""
+        try:
+            with open(self.path) as f:
+                data: Dict[str, Any] = json.load(f)
+                return data
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self, data: Dict[str, Any]) -> None:
+        """Replace the index file."""
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+
+        os.replace(tmp_path, self.path)
+
+    def _fetch_cases(self, updated_after: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Get every case in the suite, following get_cases pagination.
+
+        Arguments:
+            updated_after: If given, only cases updated after this timestamp are fetched.
+        """
+        params: Dict[str, Any] = {}
+        if self.suite_id:
+            params['suite_id'] = self.suite_id
+        if updated_after:
+            params['updated_after'] = updated_after
+
+        return fetch_pages(
+            self.client, 'get_cases', 'cases', {'project_id': self.project_id}, params,
+        )
+
+    def refresh(self) -> None:
+        """Load the index file and update it from TestRail if needed."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        with self.lock:
+            data = self._read()
+            now = time.time()
+
+            full = now - data.get('full_refresh_at', 0) > FULL_REFRESH_INTERVAL
+            stale = now - data.get('refreshed_at', 0) > REFRESH_INTERVAL
+
+            if full:
+                cases = self._fetch_cases()
+                case_ids = {case['id'] for case in cases}
+                data = {'full_refresh_at': now, 'updated_after': 0}
+
+            elif stale:
+                cases = self._fetch_cases(updated_after=data.get('updated_after'))
+                case_ids = set(data.get('case_ids', [])) | {case['id'] for case in cases}
+
+            else:
+                self.case_ids = set(data.get('case_ids', []))
+                return
+
+            # Use TestRail's timestamps, the local clock may not match the server's.
+            data['updated_after'] = max(
+                [data['updated_after']] + [case.get('updated_on') or 0 for case in cases],
+            )
+            data['refreshed_at'] = now
+            data['case_ids'] = sorted(case_ids)
+            self._write(data)
+
+            self.case_ids = case_ids
+
+    def unknown(self, case_ids: Iterable[int]) -> List[int]:
+        """Get the case ids that are not in the suite."""
+        return [case_id for case_id in case_ids if case_id not in self.case_ids]
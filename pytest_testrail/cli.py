@@ -0,0 +1,456 @@
+import argparse
+import itertools
+import os
+import signal
+import socket
+import sys
+import threading
+from typing import Any, Dict, List, Optional
+
+from .controller import _TestRailController
+from .daemon import UploaderDaemon
+from .junit import iter_junit_results
+from .results import Results
+from .spool import read_spool
+from .testrail_api_client import _TestRailAPI
+
+
+def _add_connection_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the arguments needed to connect to TestRail."""
+    parser.add_argument('--tr-url', required=True, help='Web address of the TestRail instance.')
+    parser.add_argument('--tr-email', required=True, help='E-mail address of a TestRail account.')
+    parser.add_argument('--tr-password', required=True, help='Password or API key of the account.')
+    parser.add_argument(
+        '--tr-timeout', type=float, default=30.0, help='Timeout for requests to TestRail.',
+    )
+    parser.add_argument(
+        '--tr-upload-chunk-size',
+        type=int,
+        default=0,
+        help='Maximum number of results sent in one request. 0 sends every result at once.',
+    )
+
+
+def _new_client(args: argparse.Namespace) -> _TestRailAPI:
+    """Get a TestRail API client from the command line arguments."""
+    return _TestRailAPI(
+        base_url=args.tr_url,
+        auth=(args.tr_email, args.tr_password),
+        timeout=args.tr_timeout,
+    )
+
+
+def publish(args: argparse.Namespace) -> int:
+    """Publish the results in spool files.
+
+    Each spool file is removed once its results are published.
+
+    Returns:
+        int: Exit code.
+    """
+    client = _new_client(args)
+    exit_code = 0
+
+    for path in args.spools:
+        header, results = read_spool(path)
+
+        run_id = args.tr_run_id or header.get('run_id')
+        plan_id = header.get('plan_id')
+        if not run_id and not plan_id:
+            print(f'{path}: no testrun or testplan, use --tr-run-id.', file=sys.stderr)
+            exit_code = 1
+            continue
+
+        try:
+            controller = _TestRailController(
+                client,
+                publish_blocked=header.get('publish_blocked', True),
+                version=header.get('version', ''),
+                custom_comment=header.get('custom_comment', ''),
+                testrun_id=run_id or 0,
+                testplan_id=plan_id or 0,
+                upload_chunk_size=args.tr_upload_chunk_size,
+            )
+            spooled = Results(results)
+            controller.upload_results_to_testrail(spooled)
+        except Exception as error:
+            print(f'{path}: results not published: {error}', file=sys.stderr)
+            exit_code = 1
+            continue
+
+        if not args.keep:
+            os.remove(path)
+
+        print(f'{path}: {len(spooled)} results published.')
+
+    return exit_code
+
+
+def _single(headers: List[Dict[str, Any]], key: str) -> Any:
+    """Get a value every shard artifact agrees on.
+
+    Artifacts without the value are ignored.
+
+    Raises:
+        ValueError: If artifacts have different values.
+    """
+    values = {header.get(key) for header in headers} - {None}
+    if len(values) > 1:
+        found = ', '.join(str(value) for value in sorted(values))
+        raise ValueError(f'Shard artifacts have different {key}: {found}')
+
+    return values.pop() if values else None
+
+
+def merge(args: argparse.Namespace) -> int:
+    """Publish the results of every shard artifact at once, to one testrun.
+
+    The testrun is created once, with the cases collected by every shard.
+    Results from every shard are sorted together, as if they came from
+    one session, then uploaded.
+
+    Returns:
+        int: Exit code.
+    """
+    headers = []
+    for path in args.artifacts:
+        header, _results = read_spool(path)
+        if not header.get('shard'):
+            print(f'{path}: not a shard artifact.', file=sys.stderr)
+            return 1
+        headers.append(header)
+
+    first = headers[0]
+    try:
+        project_id = _single(headers, 'project_id')
+        suite_id = _single(headers, 'suite_id')
+        run_id = args.tr_run_id or _single(headers, 'run_id')
+        plan_id = 0 if run_id else (args.tr_plan_id or _single(headers, 'plan_id'))
+    except ValueError as error:
+        print(error, file=sys.stderr)
+        return 1
+
+    results = Results(spill_threshold=args.tr_spill_threshold)
+
+    try:
+        controller = _TestRailController(
+            _new_client(args),
+            publish_blocked=first.get('publish_blocked', True),
+            include_all=first.get('include_all', False),
+            version=first.get('version', ''),
+            custom_comment=first.get('custom_comment', ''),
+            testrun_name=args.tr_testrun_name or first.get('testrun_name'),
+            testrun_id=run_id or 0,
+            testplan_id=plan_id or 0,
+            upload_chunk_size=args.tr_upload_chunk_size,
+        )
+
+        if not run_id and not plan_id:
+            case_ids = sorted({
+                case_id for header in headers for case_id in header.get('case_ids') or ()
+            })
+            run_id = controller.create_run(
+                assign_user_id=first.get('assign_user_id'),
+                project_id=project_id,
+                suite_id=suite_id,
+                tr_keys=case_ids,
+                milestone_id=first.get('milestone_id'),
+                description=first.get('description') or '',
+            )
+            controller.testrun_id = run_id
+
+        for path in args.artifacts:
+            _header, items = read_spool(path)
+            for item in items:
+                results.append(item)
+
+        controller.upload_results_to_testrail(results)
+
+        if args.tr_close_on_complete:
+            controller.close_testrail()
+    except Exception as error:
+        print(f'Shard results not published: {error}', file=sys.stderr)
+        return 1
+    finally:
+        count = len(results)
+        results.cleanup()
+
+    if not args.keep:
+        for path in args.artifacts:
+            os.remove(path)
+
+    target = f'testrun {run_id}' if run_id else f'testplan {plan_id}'
+    print(f'{count} results from {len(args.artifacts)} shard artifacts published to {target}.')
+    return 0
+
+
+def import_junit(args: argparse.Namespace) -> int:
+    """Publish the results in JUnit XML files.
+
+    Results are read from every file, then published like results from a
+    pytest session. Unless a testrun or testplan is given, a testrun is
+    created with every case found.
+
+    Returns:
+        int: Exit code.
+    """
+    results = Results(spill_threshold=args.tr_spill_threshold)
+
+    try:
+        controller = _TestRailController(
+            _new_client(args),
+            publish_blocked=True,
+            include_all=args.tr_testrun_suite_include_all,
+            version=args.tr_version,
+            custom_comment=args.tr_custom_comment,
+            testrun_name=args.tr_testrun_name,
+            testrun_id=args.tr_run_id,
+            testplan_id=0 if args.tr_run_id else args.tr_plan_id,
+            upload_chunk_size=args.tr_upload_chunk_size,
+        )
+
+        case_ids = set()
+        # Testcases of later files are published last, so reruns keep their place.
+        counter = itertools.count()
+        for path in args.reports:
+            for item in iter_junit_results(
+                path,
+                case_property=args.case_property,
+                comment_size_limit=controller.comment_size_limit,
+                counter=counter,
+            ):
+                case_ids.add(item.case_id)
+                results.append(item)
+
+        if not results:
+            print('No testcases with a case id found.', file=sys.stderr)
+            return 1
+
+        if not controller.testrun_id and not controller.testplan_id:
+            if not args.tr_testrun_project_id or not args.tr_testrun_suite_id:
+                print(
+                    'A new testrun needs --tr-testrun-project-id and --tr-testrun-suite-id.',
+                    file=sys.stderr,
+                )
+                return 1
+
+            controller.testrun_id = controller.create_run(
+                assign_user_id=args.tr_testrun_assignedto_id,
+                project_id=args.tr_testrun_project_id,
+                suite_id=args.tr_testrun_suite_id,
+                tr_keys=sorted(case_ids),
+                milestone_id=args.tr_milestone_id,
+                description=args.tr_testrun_description,
+            )
+
+        controller.upload_results_to_testrail(results)
+
+        if args.tr_close_on_complete:
+            controller.close_testrail()
+    except Exception as error:
+        print(f'JUnit results not published: {error}', file=sys.stderr)
+        return 1
+    finally:
+        count = len(results)
+        results.cleanup()
+
+    if controller.testrun_id:
+        target = f'testrun {controller.testrun_id}'
+    else:
+        target = f'testplan {controller.testplan_id}'
+    print(f'{count} results from {len(args.reports)} JUnit files published to {target}.')
+    return 0
+
+
+def daemon(args: argparse.Namespace) -> int:
+    """Run the uploader daemon until it is interrupted or terminated.
+
+    Returns:
+        int: Exit code.
+    """
+    if not hasattr(socket, 'AF_UNIX'):
+        print('The uploader daemon needs Unix domain sockets.', file=sys.stderr)
+        return 1
+
+    uploader = UploaderDaemon(
+        _new_client(args),
+        args.socket,
+        flush_interval=args.flush_interval,
+        max_retries=args.max_retries,
+        retry_delay=args.retry_delay,
+        upload_chunk_size=args.tr_upload_chunk_size,
+        spool_dir=args.spool_dir,
+    )
+
+    def stop(signum, frame) -> None:
+        # shutdown() waits for serve_forever(), which runs in this thread.
+        threading.Thread(target=uploader.shutdown).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    uploader.serve_forever()
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Get the parser for the pytest-testrail command."""
+    parser = argparse.ArgumentParser(
+        prog='pytest-testrail',
+        description='Publish results to TestRail outside of a pytest session.',
+    )
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    publish_parser = commands.add_parser(
+        'publish',
+        help='Publish results written to spool files by --tr-finish-budget.',
+    )
+    _add_connection_arguments(publish_parser)
+    publish_parser.add_argument(
+        '--tr-run-id',
+        type=int,
+        default=0,
+        help='Testrun to publish to, instead of the one in the spool file.',
+    )
+    publish_parser.add_argument(
+        '--keep', action='store_true', help='Do not remove spool files once published.',
+    )
+    publish_parser.add_argument('spools', nargs='+', help='Spool files to publish.')
+    publish_parser.set_defaults(function=publish)
+
+    merge_parser = commands.add_parser(
+        'merge',
+        help='Publish the artifacts written by --tr-shard-artifact to one testrun.',
+    )
+    _add_connection_arguments(merge_parser)
+    merge_parser.add_argument(
+        '--tr-run-id',
+        type=int,
+        default=0,
+        help='Testrun to publish to. By default, a new testrun is created.',
+    )
+    merge_parser.add_argument(
+        '--tr-plan-id', type=int, default=0, help='Testplan to publish to.',
+    )
+    merge_parser.add_argument(
+        '--tr-testrun-name', default=None, help='Name of the new testrun.',
+    )
+    merge_parser.add_argument(
+        '--tr-close-on-complete',
+        action='store_true',
+        help='Close the testrun or testplan once results are published.',
+    )
+    merge_parser.add_argument(
+        '--tr-spill-threshold',
+        type=int,
+        default=0,
+        help='Number of results held in memory before they are written to temporary files.',
+    )
+    merge_parser.add_argument(
+        '--keep', action='store_true', help='Do not remove artifacts once published.',
+    )
+    merge_parser.add_argument('artifacts', nargs='+', help='Shard artifacts to publish.')
+    merge_parser.set_defaults(function=merge)
+
+    junit_parser = commands.add_parser(
+        'import-junit',
+        help='Publish results from JUnit XML files, ie: from runs without the plugin.',
+    )
+    _add_connection_arguments(junit_parser)
+    junit_parser.add_argument(
+        '--tr-run-id',
+        type=int,
+        default=0,
+        help='Testrun to publish to. By default, a new testrun is created.',
+    )
+    junit_parser.add_argument(
+        '--tr-plan-id', type=int, default=0, help='Testplan to publish to.',
+    )
+    junit_parser.add_argument(
+        '--tr-testrun-project-id', type=int, default=0, help='Project of the new testrun.',
+    )
+    junit_parser.add_argument(
+        '--tr-testrun-suite-id', type=int, default=0, help='Suite of the new testrun.',
+    )
+    junit_parser.add_argument(
+        '--tr-testrun-suite-include-all',
+        action='store_true',
+        help='Include every case of the suite in the new testrun.',
+    )
+    junit_parser.add_argument(
+        '--tr-testrun-name', default=None, help='Name of the new testrun.',
+    )
+    junit_parser.add_argument(
+        '--tr-testrun-description', default='', help='Description of the new testrun.',
+    )
+    junit_parser.add_argument(
+        '--tr-testrun-assignedto-id',
+        type=int,
+        default=None,
+        help='User the new testrun is assigned to.',
+    )
+    junit_parser.add_argument(
+        '--tr-milestone-id', type=int, default=None, help='Milestone of the new testrun.',
+    )
+    junit_parser.add_argument(
+        '--tr-version', default='', help='Version the results were tested against.',
+    )
+    junit_parser.add_argument(
+        '--tr-custom-comment', default='', help='Text added to the comment of every result.',
+    )
+    junit_parser.add_argument(
+        '--tr-close-on-complete',
+        action='store_true',
+        help='Close the testrun or testplan once results are published.',
+    )
+    junit_parser.add_argument(
+        '--tr-spill-threshold',
+        type=int,
+        default=10000,
+        help='Number of results held in memory before they are written to temporary files.',
+    )
+    junit_parser.add_argument(
+        '--case-property',
+        default='case_id',
+        help='Name of the testcase property holding case ids.',
+    )
+    junit_parser.add_argument('reports', nargs='+', help='JUnit XML files to publish.')
+    junit_parser.set_defaults(function=import_junit)
+
+    daemon_parser = commands.add_parser(
+        'daemon',
+        help='Publish results handed off by pytest sessions run with --tr-daemon-socket.',
+    )
+    _add_connection_arguments(daemon_parser)
+    daemon_parser.add_argument('--socket', required=True, help='Unix socket to listen on.')
+    daemon_parser.add_argument(
+        '--flush-interval',
+        type=float,
+        default=1.0,
+        help='Seconds between uploads. Results received in between are sent together.',
+    )
+    daemon_parser.add_argument(
+        '--max-retries',
+        type=int,
+        default=5,
+        help='Number of times a failed upload is sent again before it is spooled.',
+    )
+    daemon_parser.add_argument(
+        '--retry-delay',
+        type=float,
+        default=1.0,
+        help='Seconds before the first retry, doubled for every retry.',
+    )
+    daemon_parser.add_argument(
+        '--spool-dir', default='.', help='Directory of the spool files for failed uploads.',
+    )
+    daemon_parser.set_defaults(function=daemon)
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the pytest-testrail command."""
+    args = build_parser().parse_args(argv)
+    exit_code: int = args.function(args)
+    return exit_code
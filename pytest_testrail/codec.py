@@ -0,0 +1,354 @@
+import struct
+import zlib
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .comment import CompressedComment
+from .result_item import ResultItem
+
+MAGIC = b'TRR1'
+
+# Status strings sent as a single byte. Others are sent as a string.
+STATUS_CODES = {
+    'passed': 0,
+    'failed': 1,
+    'skipped': 2,
+}
+_STATUS_NAMES = {code: name for name, code in STATUS_CODES.items()}
+_STATUS_NONE = 254
+_STATUS_OTHER = 255
+
+# Plain text comments shorter than this are not worth compressing.
+COMPRESS_MIN_SIZE = 64
+
+_FLAG_CASE_ID = 1
+_FLAG_DURATION = 2
+_FLAG_COMMENT = 4
+_FLAG_COMPRESSED = 8
+_FLAG_DEFECTS = 16
+_FLAG_PARAMETRIZE = 32
+
+_DOUBLE = struct.Struct('<d')
+
+# Raised while decoding a truncated or corrupt frame. Reported as one ValueError.
+_DECODE_ERRORS = (struct.error, IndexError, KeyError, EOFError, zlib.error)
+
+
+def _write_varint(buffer: bytearray, value: int) -> None:
+    """Add an unsigned LEB128 integer to a buffer."""
+    while value > 0x7F:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def _read_varint(data: bytes, position: int) -> Tuple[int, int]:
+    """Read an unsigned LEB128 integer.
+
+    Returns:
+        The integer, and the position after it.
+    """
+    value = 0
+    shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+def _read_stream_varint(stream: BinaryIO) -> Optional[int]:
+    """Read an unsigned LEB128 integer from a stream.
+
+    Returns:
+        The integer, or None at the end of the stream.
+    """
+    value = 0
+    shift = 0
+    while True:
+        byte = stream.read(1)
+        if not byte:
+            if shift:
+                raise ValueError('Truncated result stream')
+            return None
+
+        value |= (byte[0] & 0x7F) << shift
+        if byte[0] < 0x80:
+            return value
+        shift += 7
+
+
+class ResultEncoder:
+    """Encode a stream of ResultItem objects in a compact binary format.
+
+    The stream starts with MAGIC. Each result is a frame: its size as a
+    varint, then the result.
+
+    - case id: varint
+    - status: one byte
+    - flags: one byte, for the optional fields below
+    - timestamp and duration: 8 byte floats
+    - test name, defects and unknown statuses: index in a string table
+      shared by the whole stream. A string is written in full the first
+      time it is seen.
+    - comment: length prefixed, zlib compressed unless short
+    - test parametrize: length prefixed str()
+
+    Arguments:
+        compress_min_size: Plain text comments shorter than this are not compressed.
+    """
+
+    def __init__(self, compress_min_size: int = COMPRESS_MIN_SIZE):
+        self.compress_min_size = compress_min_size
+        self._strings: Dict[str, int] = {}
+        self._started = False
+
+    def _write_string(self, buffer: bytearray, value: str) -> None:
+        """Add a string table reference, and the string if it is new."""
+        index = self._strings.get(value)
+        if index is not None:
+            _write_varint(buffer, index)
+            return
+
+        index = len(self._strings)
+        self._strings[value] = index
+        _write_varint(buffer, index)
+
+        data = value.encode('utf-8')
+        _write_varint(buffer, len(data))
+        buffer += data
+
+    def encode(self, item: ResultItem) -> bytes:
+        """Get the frame of one result. The first frame starts with MAGIC."""
+        record = bytearray()
+        flags = 0
+
+        comment = item.comment
+        comment_data = b''
+        if comment is not None:
+            flags |= _FLAG_COMMENT
+            if isinstance(comment, CompressedComment):
+                comment_data = comment.data
+                flags |= _FLAG_COMPRESSED
+            else:
+                comment_data = str(comment).encode('utf-8')
+                if len(comment_data) >= self.compress_min_size:
+                    comment_data = zlib.compress(comment_data)
+                    flags |= _FLAG_COMPRESSED
+
+        if item.case_id is not None:
+            flags |= _FLAG_CASE_ID
+        if item.duration is not None:
+            flags |= _FLAG_DURATION
+        if item.defects is not None:
+            flags |= _FLAG_DEFECTS
+        if item.test_parametrize is not None:
+            flags |= _FLAG_PARAMETRIZE
+
+        _write_varint(record, item.case_id if item.case_id is not None else 0)
+
+        if item.status_id is None:
+            record.append(_STATUS_NONE)
+        else:
+            status_code = STATUS_CODES.get(item.status_id)
+            record.append(_STATUS_OTHER if status_code is None else status_code)
+
+        record.append(flags)
+        record += _DOUBLE.pack(item.timestamp)
+
+        if flags & _FLAG_DURATION:
+            record += _DOUBLE.pack(item.duration)
+
+        self._write_string(record, item.test_name)
+
+        if item.status_id is not None and item.status_id not in STATUS_CODES:
+            self._write_string(record, item.status_id)
+
+        if flags & _FLAG_DEFECTS:
+            self._write_string(record, item.defects)  # type: ignore
+
+        if flags & _FLAG_COMMENT:
+            _write_varint(record, len(comment_data))
+            record += comment_data
+
+        if flags & _FLAG_PARAMETRIZE:
+            parametrize = str(item.test_parametrize).encode('utf-8')
+            _write_varint(record, len(parametrize))
+            record += parametrize
+
+        frame = bytearray()
+        if not self._started:
+            frame += MAGIC
+            self._started = True
+
+        _write_varint(frame, len(record))
+        frame += record
+        return bytes(frame)
+
+
+class ResultDecoder:
+    """Decode a stream written by ResultEncoder.
+
+    Arguments:
+        decompress: If compressed comments are decompressed to str.
+            By default they are kept as CompressedComment.
+    """
+
+    def __init__(self, decompress: bool = False):
+        self.decompress = decompress
+        self._strings: List[str] = []
+
+    def _read_string(self, data: bytes, position: int) -> Tuple[str, int]:
+        """Read a string table reference, and the string if it is new."""
+        index, position = _read_varint(data, position)
+        if index < len(self._strings):
+            return self._strings[index], position
+
+        length, position = _read_varint(data, position)
+        value = data[position:position + length].decode('utf-8')
+        self._strings.append(value)
+        return value, position + length
+
+    def decode(self, record: bytes) -> ResultItem:
+        """Get the result in one frame, without its size prefix.
+
+        Raises:
+            ValueError: If the frame is truncated or corrupt.
+        """
+        try:
+            return self._decode(record)
+        except _DECODE_ERRORS as error:
+            raise ValueError(f'Corrupt result frame: {error!r}') from error
+
+    def _decode(self, record: bytes) -> ResultItem:
+        """Get the result in one frame, without the handling of corrupt frames."""
+        case_id, position = _read_varint(record, 0)
+        status_code = record[position]
+        flags = record[position + 1]
+        position += 2
+
+        (timestamp,) = _DOUBLE.unpack_from(record, position)
+        position += _DOUBLE.size
+
+        duration = None
+        if flags & _FLAG_DURATION:
+            (duration,) = _DOUBLE.unpack_from(record, position)
+            position += _DOUBLE.size
+
+        test_name, position = self._read_string(record, position)
+
+        status_id: Optional[str] = _STATUS_NAMES.get(status_code)
+        if status_code == _STATUS_OTHER:
+            status_id, position = self._read_string(record, position)
+
+        defects = None
+        if flags & _FLAG_DEFECTS:
+            defects, position = self._read_string(record, position)
+
+        comment = None
+        if flags & _FLAG_COMMENT:
+            length, position = _read_varint(record, position)
+            data = record[position:position + length]
+            position += length
+
+            if not flags & _FLAG_COMPRESSED:
+                comment = data.decode('utf-8')
+            elif self.decompress:
+                comment = zlib.decompress(data).decode('utf-8')
+            else:
+                comment = CompressedComment.from_compressed(data)
+
+        test_parametrize = None
+        if flags & _FLAG_PARAMETRIZE:
+            length, position = _read_varint(record, position)
+            test_parametrize = record[position:position + length].decode('utf-8')
+
+        return ResultItem(
+            test_name=test_name,
+            case_id=case_id if flags & _FLAG_CASE_ID else None,  # type: ignore
+            status_id=status_id,  # type: ignore
+            duration=duration,  # type: ignore
+            comment=comment,
+            defects=defects,
+            test_parametrize=test_parametrize,  # type: ignore
+            timestamp=timestamp,
+        )
+
+
+def write_results(stream: BinaryIO, results: Iterable[ResultItem]) -> int:
+    """Write results to a binary stream.
+
+    Returns:
+        int: Number of results written.
+    """
+    encoder = ResultEncoder()
+    count = 0
+
+    for item in results:
+        stream.write(encoder.encode(item))
+        count += 1
+
+    # An empty stream still has the magic bytes.
+    if not count:
+        stream.write(MAGIC)
+
+    return count
+
+
+def read_results(stream: BinaryIO, decompress: bool = False) -> Iterator[ResultItem]:
+    """Read results from a binary stream written by write_results().
+
+    Results are decoded one frame at a time, as the iterator is consumed.
+
+    Arguments:
+        stream: Binary stream to read.
+        decompress: If compressed comments are decompressed to str.
+
+    Raises:
+        ValueError: If the stream is not a result stream, or is truncated or corrupt.
+    """
+    magic = stream.read(len(MAGIC))
+    if magic != MAGIC:
+        raise ValueError(f'Not a result stream: {magic!r}')
+
+    decoder = ResultDecoder(decompress=decompress)
+
+    while True:
+        size = _read_stream_varint(stream)
+        if size is None:
+            return
+
+        record = stream.read(size)
+        if len(record) < size:
+            raise ValueError('Truncated result stream')
+
+        yield decoder.decode(record)
+
+
+def encode_results(results: Iterable[ResultItem]) -> bytes:
+    """Get results as bytes."""
+    encoder = ResultEncoder()
+    data = b''.join(encoder.encode(item) for item in results)
+    return data or MAGIC
+
+
+def decode_results(data: bytes, decompress: bool = False) -> List[ResultItem]:
+    """Get results from the bytes of encode_results()."""
+    if not data.startswith(MAGIC):
+        raise ValueError(f'Not a result stream: {data[:len(MAGIC)]!r}')
+
+    decoder = ResultDecoder(decompress=decompress)
+    results = []
+    position = len(MAGIC)
+
+    while position < len(data):
+        try:
+            size, position = _read_varint(data, position)
+        except IndexError as error:
+            raise ValueError('Truncated result stream') from error
+
+        results.append(decoder.decode(data[position:position + size]))
+        position += size
+
+    return results
@@ -0,0 +1,134 @@
+import zlib
+from collections import deque
+from typing import Any, Deque, Optional, Union
+
+from _pytest._io import TerminalWriter
+
+
+class TailBuffer:
+    """File-like object that only keeps the last characters written to it.
+
+    Arguments:
+        size: Number of characters to keep.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.truncated = False
+
+        self._chunks: Deque[str] = deque()
+        self._length = 0
+
+    def write(self, text: str) -> int:
+        """Add text to the buffer, discarding the oldest text over the size."""
+        self._chunks.append(text)
+        self._length += len(text)
+
+        # Drop whole chunks that are no longer part of the tail.
+        while len(self._chunks) > 1 and self._length - len(self._chunks[0]) >= self.size:
+            self._length -= len(self._chunks.popleft())
+            self.truncated = True
+
+        return len(text)
+
+    def flush(self) -> None:
+        """Mimic a file object, there is nothing to flush."""
+
+    def getvalue(self) -> str:
+        """Get the text currently in the buffer."""
+        value = ''.join(self._chunks)
+
+        if len(value) > self.size:
+            self.truncated = True
+            value = value[-self.size:]
+
+        return value
+
+
+class CompressedComment:
+    """Comment text held in memory as zlib compressed bytes.
+
+    str() returns the original text.
+
+    Arguments:
+        text: The comment text.
+    """
+
+    __slots__ = ('data',)
+
+    def __init__(self, text: str):
+        self.data = zlib.compress(text.encode('utf-8'))
+
+    @classmethod
+    def from_compressed(cls, data: bytes) -> 'CompressedComment':
+        """Get a comment from data that is already compressed."""
+        comment = cls.__new__(cls)
+        comment.data = data
+        return comment
+
+    def __str__(self) -> str:
+        """Get the decompressed text."""
+        return zlib.decompress(self.data).decode('utf-8')
+
+    def __eq__(self, other: object) -> bool:
+        """Compare against another comment or a string."""
+        if isinstance(other, CompressedComment):
+            return self.data == other.data
+
+        return str(self) == other
+
+    def __hash__(self) -> int:
+        """Hash the compressed data."""
+        return hash(self.data)
+
+
+Comment = Union[str, CompressedComment]
+
+
+def render_comment(longrepr: Any, size: int) -> Optional[str]:
+    """Render a pytest report's longrepr, keeping only the last characters.
+
+    Tracebacks are rendered into a TailBuffer, so the full text is never
+    built in memory.
+
+    Arguments:
+        longrepr: longrepr attribute from a pytest report.
+        size: Maximum number of characters to keep.
+
+    Returns:
+        str, or None if there is no longrepr.
+    """
+    if longrepr is None:
+        return None
+
+    if hasattr(longrepr, 'toterminal'):
+        buffer = TailBuffer(size)
+        longrepr.toterminal(TerminalWriter(file=buffer))
+
+        text = buffer.getvalue()
+        # Match str(longrepr), which strips the full text.
+        if buffer.truncated:
+            return text.rstrip()
+
+        return text.strip()
+
+    return str(longrepr)[-size:]
+
+
+def capture_comment(longrepr: Any, size: int, compress: bool = False) -> Optional[Comment]:
+    """Get a size bounded comment from a pytest report's longrepr.
+
+    Arguments:
+        longrepr: longrepr attribute from a pytest report.
+        size: Maximum number of characters to keep.
+        compress: If the comment should be compressed in memory.
+
+    Returns:
+        str or CompressedComment, or None if there is no longrepr.
+    """
+    text = render_comment(longrepr, size)
+
+    if compress and text:
+        return CompressedComment(text)
+
+    return text
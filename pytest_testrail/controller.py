@@ -1,10 +1,21 @@
+import itertools
+import logging
+import os
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
-from typing import List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
+import requests
+
+from .attachments import DEFAULT_MAX_ATTACHMENT_SIZE, MultipartFile
 from .logger import get_logger
+from .profiler import Profiler
+from .result_item import ResultItem
 from .results import Results
 from .status import TESTRAIL_TEST_STATUS
-from .testrail_api_client import _TestRailAPI
+from .testrail_api_client import _TestRailAPI, fetch_pages
+from .tracing import Tracer
 
 
 class _TestRailController:
@@ -18,6 +29,13 @@ class _TestRailController:
         testrun_name: Optional[str] = '',
         testrun_id: int = 0,
         testplan_id: int = 0,
+        upload_chunk_size: int = 0,
+        profiler: Optional[Profiler] = None,
+        tracer: Optional[Tracer] = None,
+        background_checks: bool = False,
+        attachment_workers: int = 4,
+        max_attachment_size: int = DEFAULT_MAX_ATTACHMENT_SIZE,
+        defer_errors: bool = False,
     ):
         self.client = client
         self.publish_blocked = publish_blocked
@@ -26,6 +44,13 @@ class _TestRailController:
         self.custom_comment = custom_comment
         self.testrun_id = testrun_id
         self.testplan_id = testplan_id
+        self.upload_chunk_size = upload_chunk_size
+        self.profiler = Profiler() if profiler is None else profiler
+        self.tracer = Tracer() if tracer is None else tracer
+        self.attachment_workers = attachment_workers
+        self.max_attachment_size = max_attachment_size
+        # Results not sent because of a request error are deferred instead of raising.
+        self.defer_errors = defer_errors
 
         self.new_testrun_name_date_format = '%d-%m-%Y %H:%M:%S'
         self.testrun_name = testrun_name or self._new_testrun_name()
@@ -34,22 +59,152 @@ class _TestRailController:
 
         self.comment_size_limit = 4000
 
+        # time.monotonic() value after which no more requests are sent.
+        self.deadline: Optional[float] = None
+
+        # Number of results sent to each testrun.
+        self.published: Dict[int, int] = {}
+        # Results not sent before the deadline, by testrun, sorted for publishing.
+        # None is used for the testplan when its testruns could not be fetched.
+        # They spill to disk like the results they come from.
+        self.deferred: Dict[Optional[int], Results] = {}
+        # Blocked cases of each testrun, and open testruns of each testplan.
+        # Fetched once, every upload of the session shares them.
+        self.blocked_cases: Dict[int, List[Optional[int]]] = {}
+        self.open_runs: Dict[int, List[int]] = {}
+        # Id of the newest result created for each (case_id, test_name), by testrun.
+        self.result_ids: Dict[int, Dict[Tuple[int, str], int]] = {}
+
         # Sanity check against desired configuration against TestRail.
-        if self.testplan_id:
-            plan_response = self.client.get_plan(plan_id=self.testplan_id).get().json()
+        # In the background, they run while pytest collects tests.
+        self._checks: Optional[Future] = None
+        if background_checks:
+            executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='pytest-testrail')
+            self._checks = executor.submit(self.check_configuration)
+            executor.shutdown(wait=False)
+        else:
+            self.check_configuration()
+
+    def check_configuration(self) -> None:
+        """Check the testplan or testrun can receive results.
+
+        The connection to TestRail is opened at the same time,
+        so later requests don't wait for DNS and the TLS handshake.
+
+        Raises:
+            Exception: If the testplan or testrun is completed.
+        """
+        with self.tracer.span('check_configuration'):
+            if not self.testplan_id and not self.testrun_id:
+                self.client.warm_up()
 
-            self.client.validate_response(plan_response)
+            if self.testplan_id:
+                plan_response = self.client.get_plan(plan_id=self.testplan_id).get().json()
 
-            if plan_response.get('is_completed'):
-                raise Exception('Test plan is marked as completed.')
+                self.client.validate_response(plan_response)
 
-        if self.testrun_id:
-            run_response = self.client.get_run(run_id=self.testrun_id).get().json()
+                if plan_response.get('is_completed'):
+                    raise Exception('Test plan is marked as completed.')
+
+            if self.testrun_id:
+                run_response = self.client.get_run(run_id=self.testrun_id).get().json()
+
+                self.client.validate_response(run_response)
+
+                if run_response.get('is_completed'):
+                    raise Exception('Test run is marked as completed.')
+
+    def wait_until_ready(self) -> None:
+        """Wait for the checks running in the background, if any.
+
+        Raises:
+            Exception: Errors raised by check_configuration(), on every call.
+        """
+        checks = self._checks
+        if checks is None:
+            return
+
+        with self.profiler.measure('wait_for_checks'), self.tracer.span('wait_for_checks'):
+            checks.result()
+
+        self._checks = None
+
+    def time_left(self) -> Optional[float]:
+        """Get the seconds left before the deadline, or None if there is no deadline."""
+        if self.deadline is None:
+            return None
+
+        return self.deadline - time.monotonic()
+
+    def deadline_passed(self) -> bool:
+        """If the deadline is set and has passed."""
+        time_left = self.time_left()
+        return time_left is not None and time_left <= 0
+
+    def budgeted_kwargs(self) -> Dict[str, Any]:
+        """Get the timeout for one request, limited to the time left before the deadline.
+
+        It is passed to each request instead of being set on the client,
+        so other threads using the client are not affected.
+
+        A requests timeout limits each connect and read, not a whole
+        request. The deadline is checked between requests, but one slow
+        request can still run past it.
+
+        Returns:
+            The keyword arguments for the request. Empty without a deadline.
+        """
+        time_left = self.time_left()
+        if time_left is None:
+            return {}
+
+        time_left = max(time_left, 0.001)
+        timeout = self.client.timeout
+
+        if isinstance(timeout, tuple):
+            return {
+                'timeout': tuple(time_left if t is None else min(t, time_left) for t in timeout),
+            }
+
+        return {'timeout': time_left if timeout is None else min(timeout, time_left)}
 
-            self.client.validate_response(run_response)
+    def _can_defer(self, error: requests.RequestException) -> bool:
+        """If results not sent because of a request error can be deferred.
 
-            if run_response.get('is_completed'):
-                raise Exception('Test run is marked as completed.')
+        A timeout is deferred when there is a deadline, any error with defer_errors.
+        """
+        if self.defer_errors:
+            self.logger.warning(f'Results deferred after a request error: {error}')
+            return True
+
+        return self.deadline is not None and isinstance(error, requests.Timeout)
+
+    def _defer(
+        self,
+        testrun_id: Optional[int],
+        items: Iterable[ResultItem],
+        source: Results,
+    ) -> None:
+        """Keep results that could not be sent before the deadline.
+
+        Counted as a retry in the client's metrics, as they are sent again
+        later by the daemon or from the spool file.
+
+        Arguments:
+            testrun_id: Testrun the results are for.
+            items: Results not sent.
+            source: Results the items come from. Deferred results spill like them.
+        """
+        deferred = self.deferred.get(testrun_id)
+        if deferred is None:
+            deferred = self.deferred[testrun_id] = source.empty_copy()
+
+        count = len(deferred)
+        for item in items:
+            deferred.append(item)
+
+        if len(deferred) > count:
+            self.client.metrics.record_retry('add_results_for_cases')
 
     def _new_testrun_name(self) -> str:
         """Get a new testrun name using a timestamp."""
@@ -58,10 +213,16 @@ class _TestRailController:
         return f'Automated Run {now.strftime(self.new_testrun_name_date_format)}'
 
     def get_open_runs(self, plan_id: int) -> list:
-        """Get a list of available testruns associated to a testplan in TestRail."""
+        """Get a list of available testruns associated to a testplan in TestRail.
+
+        The testplan is fetched once, later calls get the same testruns.
+        """
+        if plan_id in self.open_runs:
+            return self.open_runs[plan_id]
+
         testruns_list = []
 
-        response = self.client.get_plan(plan_id=plan_id).get().json()
+        response = self.client.get_plan(plan_id=plan_id).get(**self.budgeted_kwargs()).json()
 
         self.client.validate_response(response)
 
@@ -70,6 +231,7 @@ class _TestRailController:
                 if not run['is_completed']:
                     testruns_list.append(run['id'])
 
+        self.open_runs[plan_id] = testruns_list
         return testruns_list
 
     def create_run(
@@ -92,9 +254,10 @@ class _TestRailController:
             'milestone_id': milestone_id,
         }
 
-        response = self.client.add_run(project_id=project_id).post(
-            json=data,
-        ).json()
+        with self.tracer.span('create_run', project_id=project_id, suite_id=suite_id):
+            response = self.client.add_run(project_id=project_id).post(
+                json=data,
+            ).json()
 
         self.client.validate_response(response)
 
@@ -108,24 +271,42 @@ class _TestRailController:
 
         return testrun_id
 
-    def get_blocked_cases(self, testrun_id: int) -> List[Optional[int]]:
-        rv: List[Optional[int]] = []
+    def get_cases_with_status(
+        self,
+        testrun_id: int,
+        statuses: Iterable[str],
+    ) -> List[Optional[int]]:
+        """Get the cases of a testrun that currently have one of some statuses.
 
-        response: dict = self.client.get_tests(run_id=testrun_id).get().json()
+        Arguments:
+            testrun_id: Id of the testrun.
+            statuses: Names of TestRail statuses, ie: 'failed'.
+        """
+        status_ids = {TESTRAIL_TEST_STATUS[status] for status in statuses}
 
-        self.client.validate_response(response)
+        tests = fetch_pages(
+            self.client, 'get_tests', 'tests', {'run_id': testrun_id},
+            request_kwargs=self.budgeted_kwargs(),
+        )
 
-        tests: List[dict] = response['tests']
+        return [test.get('case_id') for test in tests if test.get('status_id') in status_ids]
 
-        if tests:
-            rv = [
-                test.get('case_id') for test in tests
-                if test.get('status_id') == TESTRAIL_TEST_STATUS["blocked"]
-            ]
+    def get_blocked_cases(self, testrun_id: int) -> List[Optional[int]]:
+        """Get the blocked cases of a testrun.
 
-        return rv
+        They are fetched once, later calls get the same cases.
+        """
+        if testrun_id not in self.blocked_cases:
+            self.blocked_cases[testrun_id] = self.get_cases_with_status(testrun_id, ['blocked'])
 
-    def send_to_testrail(self, testrun_id: int, results: Results) -> None:
+        return self.blocked_cases[testrun_id]
+
+    def send_to_testrail(
+        self,
+        testrun_id: int,
+        results: Results,
+        exclude_case_ids: Optional[Iterable[int]] = None,
+    ) -> None:
         """Add results one by one to improve errors handling.
 
         Results are sorted by case_id, by name, by run order, then by status_id.
@@ -140,79 +321,300 @@ class _TestRailController:
         (i.e.: Rerun and parametrized),
         failing results relative to the latest run will be updated last.
 
+        If upload_chunk_size is set, results are sent in requests of at most
+        that many results, in the same order.
+
+        If the deadline passes, or a request fails with defer_errors set,
+        the results not sent yet are kept in deferred.
+
         Arguments:
             testrun_id: Id of the testrun to feed
+            exclude_case_ids: Cases whose results are not sent.
         """
-        self.results = results._sort()
+        blocked_cases: List[Optional[int]] = []
+        excluded = list(exclude_case_ids or ())
+
+        if self.deadline_passed():
+            self._defer(testrun_id, results.iter_sorted(exclude_case_ids=excluded), results)
+            return
 
         # Exclude testcases with "blocked" status.
         if self.publish_blocked is False:
-            self.logger.info('Blocked testcases will not be published.')
+            # Only logged when they are fetched.
+            fetched = testrun_id not in self.blocked_cases
+            if fetched:
+                self.logger.info('Blocked testcases will not be published.')
+
+            try:
+                with self.profiler.measure('sessionfinish.blocked_fetch'):
+                    blocked_cases = self.get_blocked_cases(testrun_id)
+            except requests.RequestException as error:
+                if not self._can_defer(error):
+                    raise
+
+                self._defer(testrun_id, results.iter_sorted(exclude_case_ids=excluded), results)
+                return
+
+            if fetched:
+                blocked_test_str = ', '.join(str(c) for c in blocked_cases)
+                self.logger.info(
+                    (
+                        "Blocked testcases excluded:"
+                        f"{blocked_test_str}."
+                    ),
+                )
+
+        sorted_results = self.profiler.timed_iter(
+            'sessionfinish.sort',
+            results.iter_sorted(
+                exclude_case_ids=[c for c in blocked_cases if c is not None] + excluded,
+            ),
+        )
 
-            blocked_cases = self.get_blocked_cases(testrun_id)
+        # Publish results
+        post_data: Dict[str, list] = {'results': []}
+        chunk: List[ResultItem] = []
+        requests_sent = 0
 
-            blocked_test_str = ', '.join(str(c) for c in blocked_cases)
-            self.logger.info(
-                (
-                    "Blocked testcases excluded:"
-                    f"{blocked_test_str}."
-                ),
-            )
+        for result in sorted_results:
+            with self.profiler.measure('sessionfinish.payload_build'):
+                entry = result.as_api_payload(
+                    custom_comment=self.custom_comment,
+                    comment_size_limit=self.comment_size_limit,
+                )
 
-            self.results = [
-                result for result in self.results if result.case_id not in blocked_cases
-            ]
+                if self.version:
+                    entry['version'] = self.version
 
-        # Publish results
-        post_data: dict[str, list] = {'results': []}
+            post_data['results'].append(entry)
+            chunk.append(result)
 
-        for result in self.results:
-            entry = result.as_api_payload(
-                custom_comment=self.custom_comment,
-                comment_size_limit=self.comment_size_limit,
-            )
+            if self.upload_chunk_size and len(chunk) >= self.upload_chunk_size:
+                if not self._send_chunk(testrun_id, post_data, chunk, sorted_results, results):
+                    return
 
-            if self.version:
-                entry['version'] = self.version
+                requests_sent += 1
+                post_data = {'results': []}
+                chunk = []
 
-            post_data['results'].append(entry)
+        if chunk or not requests_sent:
+            self._send_chunk(testrun_id, post_data, chunk, iter(()), results)
 
-        response = self.client.add_results_for_cases(run_id=testrun_id).post(
-            json=post_data,
-        ).json()
+    def _send_chunk(
+        self,
+        testrun_id: int,
+        post_data: dict,
+        chunk: List[ResultItem],
+        rest: Iterator[ResultItem],
+        results: Results,
+    ) -> bool:
+        """Send one chunk of results, unless the deadline has passed.
+
+        Arguments:
+            testrun_id: Id of the testrun to feed.
+            post_data: Payload for the chunk.
+            chunk: Results in the payload.
+            rest: Results not in a chunk yet. Deferred with the chunk.
+            results: Results being sent.
+
+        Returns:
+            bool: False if the chunk and the rest of the results were deferred.
+        """
+        if not self.deadline_passed():
+            try:
+                response = self._post_results(testrun_id, post_data)
+            except requests.RequestException as error:
+                if not self._can_defer(error):
+                    raise
+            else:
+                self.published[testrun_id] = self.published.get(testrun_id, 0) + len(chunk)
+                self._keep_result_ids(testrun_id, chunk, response)
+                return True
+
+        self._defer(testrun_id, itertools.chain(chunk, rest), results)
+        return False
+
+    def _keep_result_ids(self, testrun_id: int, chunk: List[ResultItem], response) -> None:
+        """Map each result of a chunk to the id TestRail gave it.
+
+        TestRail returns the new results in the order they were sent.
+        Results are sent oldest first, so the newest result of a test wins.
+        """
+        if not isinstance(response, list):
+            return
+
+        result_ids = self.result_ids.setdefault(testrun_id, {})
+        for item, result in zip(chunk, response):
+            if item.case_id is not None and isinstance(result, dict) and 'id' in result:
+                result_ids[(item.case_id, item.test_name)] = result['id']
+
+    def _post_results(self, testrun_id: int, post_data: dict):
+        """Send one add_results_for_cases request.
+
+        Returns:
+            The response from TestRail.
+        """
+        span = self.tracer.span(
+            'upload_chunk', run_id=testrun_id, result_count=len(post_data['results']),
+        )
+        with self.profiler.measure('sessionfinish.post'), span:
+            response = self.client.add_results_for_cases(run_id=testrun_id).post(
+                json=post_data,
+                **self.budgeted_kwargs(),
+            ).json()
 
         self.client.validate_response(response)
+        return response
 
-    def upload_results_to_testrail(self, results: Results) -> None:
-        tests_list = ', '.join([str(result.case_id) for result in results])
-        self.logger.info(f"Publishing testcases: {tests_list}.")
+    def upload_results_to_testrail(
+        self,
+        results: Results,
+        exclude_case_ids: Optional[Iterable[int]] = None,
+        quiet: bool = False,
+    ) -> None:
+        """Send results to the testrun, or to every open testrun of the testplan.
+
+        Arguments:
+            results: Results to send.
+            exclude_case_ids: Cases whose results are not sent.
+            quiet: Log progress at the debug level, ie: for small batches
+                sent while tests run.
+        """
+        self.wait_until_ready()
+        excluded = list(exclude_case_ids or ())
+        level = logging.DEBUG if quiet else logging.INFO
+
+        self.logger.log(level, f'Publishing {len(results)} results.')
+        # Reading every case id can mean reading every spilled result.
+        if self.logger.isEnabledFor(logging.DEBUG):
+            tests_list = ', '.join([str(result.case_id) for result in results])
+            self.logger.debug(f"Publishing testcases: {tests_list}.")
 
         if self.testrun_id:
-            self.send_to_testrail(self.testrun_id, results)
+            self.send_to_testrail(self.testrun_id, results, excluded)
 
         elif self.testplan_id:
-            testruns = self.get_open_runs(self.testplan_id)
-
-            self.logger.info(
-                f"Updating testruns: {', '.join([str(elt) for elt in testruns])}.",
+            testruns = None
+            if not self.deadline_passed():
+                try:
+                    testruns = self.get_open_runs(self.testplan_id)
+                except requests.RequestException as error:
+                    if not self._can_defer(error):
+                        raise
+
+            if testruns is None:
+                self._defer(None, results.iter_sorted(exclude_case_ids=excluded), results)
+                return
+
+            self.logger.log(
+                level, f"Updating testruns: {', '.join([str(elt) for elt in testruns])}.",
             )
             for testrun_id in testruns:
-                self.send_to_testrail(testrun_id, results)
+                with self.tracer.span('plan_run', plan_id=self.testplan_id, run_id=testrun_id):
+                    self.send_to_testrail(testrun_id, results, excluded)
+
+        if self.deferred:
+            deferred_count = sum(len(items) for items in self.deferred.values())
+            self.logger.warning(f'Publishing stopped, {deferred_count} results deferred.')
+        else:
+            self.logger.log(level, 'Publishing complete.')
+
+    def upload_attachments(self, attachments: Dict[Tuple[int, str], List[str]]) -> int:
+        """Attach files to the results sent to TestRail.
 
-        self.logger.info('Publishing complete.')
+        Files are streamed from disk, a few at a time.
+        Files for results that were not sent, missing files and files larger than
+        max_attachment_size are skipped.
+
+        Arguments:
+            attachments: Paths of the files for each (case_id, test_name).
+
+        Returns:
+            int: Number of files attached.
+        """
+        jobs = []
+        for result_ids in self.result_ids.values():
+            for key, paths in attachments.items():
+                result_id = result_ids.get(key)
+                if result_id is None:
+                    continue
+
+                for path in paths:
+                    try:
+                        size = os.path.getsize(path)
+                    except OSError:
+                        self.logger.warning(f'Attachment not found: {path}')
+                        continue
+
+                    if size > self.max_attachment_size:
+                        self.logger.warning(
+                            f'Attachment too large: {path} ({size} bytes,'
+                            f' limit is {self.max_attachment_size})',
+                        )
+                        continue
+
+                    jobs.append((result_id, path))
+
+        if not jobs:
+            return 0
+
+        with ThreadPoolExecutor(
+            max_workers=max(1, self.attachment_workers),
+            thread_name_prefix='pytest-testrail',
+        ) as executor:
+            attached = sum(executor.map(lambda job: self._attach(*job), jobs))
+
+        self.logger.info(f'{attached} files attached to results.')
+        return attached
+
+    def _attach(self, result_id: int, path: str) -> bool:
+        """Send one add_attachment_to_result request.
+
+        Returns:
+            bool: True if the file was attached.
+        """
+        if self.deadline_passed():
+            return False
+
+        body = MultipartFile(path)
+        try:
+            with self.tracer.span('upload_attachment', result_id=result_id, size=len(body)):
+                response = self.client.add_attachment_to_result(result_id=result_id).post(
+                    data=body,
+                    headers={'Content-Type': body.content_type},
+                    **self.budgeted_kwargs(),
+                ).json()
+        except (requests.RequestException, ValueError) as error:
+            self.logger.warning(f'Attachment {path} not sent: {error}')
+            return False
+        finally:
+            body.close()
+
+        self.client.validate_response(response)
+        return isinstance(response, dict) and 'attachment_id' in response
 
     def close_testrail(
         self,
         run_id: Optional[int] = None,
         plan_id: Optional[int] = None,
     ) -> None:
-        """Close a testrun or testplan."""
+        """Close a testrun or testplan.
+
+        The request is limited to the time left before the deadline, if any.
+        """
+        self.wait_until_ready()
+
         run_id = run_id or self.testrun_id
         plan_id = plan_id or self.testplan_id
 
+        self._close(run_id, plan_id)
+
+    def _close(self, run_id: Optional[int], plan_id: Optional[int]) -> None:
+        """Send the request closing a testrun or testplan."""
         if run_id:
             response = self.client.close_run(run_id=run_id).post(
                 json={},
+                **self.budgeted_kwargs(),
             ).json()
 
             self.client.validate_response(response)
@@ -221,6 +623,7 @@ class _TestRailController:
         elif plan_id:
             response = self.client.close_plan(plan_id=plan_id).post(
                 json={},
+                **self.budgeted_kwargs(),
             ).json()
 
             self.client.validate_response(response)
@@ -1,6 +1,9 @@
 import re
 from typing import Any, List, Optional, Tuple, Union
 
+TEST_ID_PATTERN = re.compile('(?P<test_id>[0-9]+$)')
+DEFECT_ID_PATTERN = re.compile('(?P<defect_id>.*)')
+
 
 def clean_test_ids(test_ids: Union[Tuple[str], Any]) -> List[int]:
     """Clean pytest marker containing testrail testcase ids.
@@ -13,10 +16,8 @@ def clean_test_ids(test_ids: Union[Tuple[str], Any]) -> List[int]:
     """
     rv = []
 
-    pattern = '(?P<test_id>[0-9]+$)'
-
     for test_id in test_ids:
-        match = re.search(pattern, test_id)
+        match = TEST_ID_PATTERN.search(test_id)
         if match:
             clean_test_id: Optional[str] = match.groupdict().get('test_id')
             if clean_test_id:
@@ -36,13 +37,27 @@ def clean_test_defects(defect_ids: Union[Tuple[str], Any]) -> List[str]:
     """
     rv = []
 
-    pattern = '(?P<defect_id>.*)'
-
     for defect_id in defect_ids:
-        match = re.search(pattern, defect_id)
+        match = DEFECT_ID_PATTERN.search(defect_id)
         if match:
             clean_defect_id: Optional[str] = match.groupdict().get('defect_id')
             if clean_defect_id:
                 rv.append(clean_defect_id)
 
     return rv
+
+
+def format_test_defects(defect_ids: Union[Tuple[str], Any]) -> Optional[str]:
+    """Format pytest marker containing defects ids for the TestRail defects field.
+
+    Attributes:
+        defect_ids (tuple[str]):
+
+    Returns:
+        str: Comma separated defect_ids, or None if there are none.
+    """
+    if not defect_ids:
+        return None
+
+    defects = str(clean_test_defects(defect_ids))
+    return defects.replace('[', '').replace(']', '').replace("'", '')
@@ -0,0 +1,392 @@
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .codec import read_results, write_results
+from .controller import _TestRailController
+from .logger import get_logger
+from .result_item import ResultItem
+from .results import Results
+from .spool import default_spool_path, write_spool
+from .testrail_api_client import _TestRailAPI
+
+# run_id, plan_id, version, custom_comment, publish_blocked
+BatchKey = Tuple[Optional[int], Optional[int], str, str, bool]
+
+
+def hand_off(
+    socket_path: str,
+    header: Dict[str, Any],
+    results: Iterable[ResultItem],
+    timeout: float = 30.0,
+) -> int:
+    """Send results to the uploader daemon.
+
+    The header is sent as a line of JSON, then the results in the
+    binary format of codec.write_results().
+
+    Returns once the daemon has received them, not once they are published.
+
+    Arguments:
+        socket_path: Path of the daemon's Unix socket.
+        header: run_id and plan_id the results are for, and publishing
+            settings: version, custom_comment and publish_blocked.
+            If close is True, the testrun or testplan is closed once
+            the results queued for it are published.
+        results: Results to send.
+        timeout: Seconds to wait for the daemon.
+
+    Returns:
+        int: Number of results sent.
+
+    Raises:
+        OSError: If the daemon is not running or did not accept the results.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+
+        with sock.makefile('wb') as f:
+            f.write(json.dumps(header).encode() + b'\n')
+            count = write_results(f, results)
+
+        sock.shutdown(socket.SHUT_WR)
+
+        with sock.makefile('rb') as f:
+            reply = f.readline().strip()
+
+    if reply != b'ok':
+        raise ConnectionError(f'Uploader daemon did not accept the results: {reply.decode()}')
+
+    return count
+
+
+class _HandOffHandler(socketserver.StreamRequestHandler):
+    """Receive the results of one hand_off() call."""
+
+    def handle(self) -> None:
+        """Read the header and results, then queue them."""
+        try:
+            header = json.loads(self.rfile.readline())
+            items = list(read_results(self.rfile))
+        except (ValueError, TypeError) as error:
+            self.wfile.write(f'error: {error}\n'.encode())
+            return
+
+        self.server.uploader.add(header, items)  # type: ignore
+        self.wfile.write(b'ok\n')
+
+
+class UploaderDaemon:
+    """Long-lived process publishing results for many pytest processes.
+
+    Results handed off by every process are queued by testrun, then
+    published together every flush_interval seconds. Every upload shares
+    the client's session, so connections to TestRail stay open.
+
+    When a request fails, the results not sent yet are kept and sent again
+    by a later flush, after retry_delay seconds, doubled for every retry.
+    Results already sent are not sent again. Other testruns are published
+    in the meantime. After max_retries retries, the results left are
+    written to a spool file.
+
+    Arguments:
+        client: TestRail API client.
+        socket_path: Path of the Unix socket to listen on.
+        flush_interval: Seconds between uploads.
+        max_retries: Number of times results that failed are sent again.
+        retry_delay: Seconds before the first retry, doubled for every retry.
+        upload_chunk_size: Maximum number of results sent in one request.
+        spool_dir: Directory of the spool files for results that kept failing.
+    """
+
+    def __init__(
+        self,
+        client: _TestRailAPI,
+        socket_path: str,
+        flush_interval: float = 1.0,
+        max_retries: int = 5,
+        retry_delay: float = 1.0,
+        upload_chunk_size: int = 0,
+        spool_dir: str = '.',
+    ):
+        self.client = client
+        self.socket_path = socket_path
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.upload_chunk_size = upload_chunk_size
+        self.spool_dir = spool_dir
+
+        self.logger = get_logger()
+
+        self.pending: Dict[BatchKey, List[ResultItem]] = {}
+        # Results not sent by a failed flush, by batch and by testrun.
+        # None is used for a testplan whose testruns could not be fetched.
+        self.unsent: Dict[BatchKey, Dict[Optional[int], Results]] = {}
+        # Number of failed flushes in a row, and when to retry, for each batch.
+        self.failures: Dict[BatchKey, int] = {}
+        self.retry_at: Dict[BatchKey, float] = {}
+        # Testruns and testplans to close once their results are published,
+        # with the number of failed attempts to close them.
+        self.close_requested: Dict[Tuple[Optional[int], Optional[int]], int] = {}
+
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._server: Optional[socketserver.BaseServer] = None
+
+    def add(self, header: Dict[str, Any], items: List[ResultItem]) -> None:
+        """Queue results handed off by a pytest process."""
+        run_id = header.get('run_id') or None
+        plan_id = None if run_id else (header.get('plan_id') or None)
+
+        key: BatchKey = (
+            run_id,
+            plan_id,
+            header.get('version') or '',
+            header.get('custom_comment') or '',
+            header.get('publish_blocked', True),
+        )
+
+        with self._lock:
+            if items:
+                self.pending.setdefault(key, []).extend(items)
+
+            if header.get('close'):
+                self.close_requested.setdefault((run_id, plan_id), 0)
+
+    def flush(self, final: bool = False) -> None:
+        """Publish queued results, then close the testruns that asked for it.
+
+        Batches waiting for a retry are skipped until it is time.
+
+        Arguments:
+            final: Send every batch now, and spool the results that fail.
+        """
+        now = time.monotonic()
+
+        with self._lock:
+            keys = [
+                key for key in set(self.pending) | set(self.unsent)
+                if final or self.retry_at.get(key, 0) <= now
+            ]
+            batches = [(key, self.pending.pop(key, [])) for key in keys]
+
+        for key, items in batches:
+            self._upload(key, items, final)
+
+        with self._lock:
+            busy = {key[:2] for key in set(self.pending) | set(self.unsent)}
+            close_requested = [target for target in self.close_requested if target not in busy]
+
+        for run_id, plan_id in close_requested:
+            self._close(run_id, plan_id, final)
+
+    @staticmethod
+    def _name(run_id: Optional[int], plan_id: Optional[int]) -> str:
+        """Get the name of a testrun or testplan for messages."""
+        return f'testrun {run_id}' if run_id else f'testplan {plan_id}'
+
+    def _controller(
+        self,
+        run_id: Optional[int],
+        plan_id: Optional[int],
+        version: str = '',
+        custom_comment: str = '',
+        publish_blocked: bool = True,
+    ) -> _TestRailController:
+        """Get a controller publishing to a testrun or testplan.
+
+        Results not sent because of a request error are kept in its deferred.
+        """
+        return _TestRailController(
+            self.client,
+            publish_blocked=publish_blocked,
+            version=version,
+            custom_comment=custom_comment,
+            testrun_id=run_id or 0,
+            testplan_id=plan_id or 0,
+            upload_chunk_size=self.upload_chunk_size,
+            defer_errors=True,
+        )
+
+    def _close(self, run_id: Optional[int], plan_id: Optional[int], final: bool) -> None:
+        """Close a testrun or testplan. If it fails, try again at the next flush."""
+        name = self._name(run_id, plan_id)
+
+        try:
+            self._controller(run_id, plan_id).close_testrail()
+        except Exception as error:
+            with self._lock:
+                attempts = self.close_requested.get((run_id, plan_id), 0) + 1
+                self.close_requested[(run_id, plan_id)] = attempts
+
+                gave_up = final or attempts > self.max_retries
+                if gave_up:
+                    del self.close_requested[(run_id, plan_id)]
+
+            self.logger.warning(f'Closing {name} failed, attempt {attempts}: {error}')
+            if gave_up:
+                self.logger.error(f'{name} not closed.')
+            return
+
+        with self._lock:
+            self.close_requested.pop((run_id, plan_id), None)
+
+    def _upload(self, key: BatchKey, items: List[ResultItem], final: bool = False) -> None:
+        """Publish the results a failed flush did not send, then new results.
+
+        Results that are still not sent wait for a retry, or are written to a
+        spool file once max_retries is reached. New results are not sent
+        before older ones, so the newest result of a case stays the last one.
+        """
+        run_id, plan_id, version, custom_comment, publish_blocked = key
+        name = self._name(run_id, plan_id)
+
+        with self._lock:
+            unsent = self.unsent.pop(key, {})
+
+        controller = self._controller(*key)
+        count = len(items) + sum(len(results) for results in unsent.values())
+        # Results deferred by the controller are already counted as a retry.
+        retry_counted = True
+
+        try:
+            for target_run_id, results in unsent.items():
+                if target_run_id is None:
+                    controller.upload_results_to_testrail(results)
+                else:
+                    controller.send_to_testrail(target_run_id, results)
+
+            if items and not controller.deferred:
+                controller.upload_results_to_testrail(Results(items))
+                items = []
+        except Exception as error:
+            # Not a request error, what was sent is unknown. Everything is sent again.
+            self.logger.warning(f'Publishing to {name} failed: {error}')
+            controller.deferred = {
+                None: Results([r for results in unsent.values() for r in results]),
+            }
+            retry_counted = False
+
+        deferred = {
+            target: results for target, results in controller.deferred.items() if results
+        }
+        if not deferred and not items:
+            with self._lock:
+                self.failures.pop(key, None)
+                self.retry_at.pop(key, None)
+            self.logger.info(f'{count} results published to {name}.')
+            return
+
+        with self._lock:
+            failures = self.failures.get(key, 0) + 1
+
+            if not final and failures <= self.max_retries:
+                self.failures[key] = failures
+                self.retry_at[key] = time.monotonic() + self.retry_delay * 2 ** (failures - 1)
+                self.unsent[key] = deferred
+                if not retry_counted:
+                    self.client.metrics.record_retry('add_results_for_cases')
+                # Sent once the older results are.
+                if items:
+                    self.pending[key] = items + self.pending.get(key, [])
+
+                left = sum(len(results) for results in deferred.values())
+                self.logger.warning(
+                    f'{left} results for {name} not sent, attempt {failures}, will retry.',
+                )
+                return
+
+            self.failures.pop(key, None)
+            self.retry_at.pop(key, None)
+
+        if items:
+            deferred.setdefault(run_id, Results()).extend(items)
+
+        self._spool(key, deferred, reason=f'Uploader daemon gave up after {failures} attempts')
+
+    def _spool(
+        self,
+        key: BatchKey,
+        deferred: Dict[Optional[int], Results],
+        reason: str,
+    ) -> None:
+        """Write results that could not be sent to spool files, one per testrun."""
+        run_id, plan_id, version, custom_comment, publish_blocked = key
+        os.makedirs(self.spool_dir, exist_ok=True)
+
+        for target_run_id, results in deferred.items():
+            target_run_id = target_run_id or run_id
+            target_plan_id = None if target_run_id else plan_id
+            name = self._name(target_run_id, target_plan_id)
+
+            path = default_spool_path(self.spool_dir, target_run_id)
+            header = {
+                'run_id': target_run_id,
+                'plan_id': target_plan_id,
+                'reason': reason,
+                'version': version,
+                'custom_comment': custom_comment,
+                'publish_blocked': publish_blocked,
+            }
+            count = write_spool(path, results.iter_sorted(), header)
+            self.logger.error(f'{count} results for {name} written to {path}.')
+
+        with self._lock:
+            close_requested = self.close_requested.pop((run_id, plan_id), None)
+
+        if close_requested is not None:
+            self.logger.warning(
+                f'{self._name(run_id, plan_id)} not closed, its results were spooled.',
+            )
+
+    def _flush_periodically(self) -> None:
+        """Flush every flush_interval seconds, and once more when stopping."""
+        while not self._stopping.wait(self.flush_interval):
+            self.flush()
+
+        self.flush(final=True)
+
+    def serve_forever(self) -> None:
+        """Listen for results until shutdown() is called.
+
+        Queued results are published before returning.
+        """
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+        server = socketserver.ThreadingUnixStreamServer(  # type: ignore
+            self.socket_path, _HandOffHandler,
+        )
+        server.daemon_threads = True
+        server.uploader = self  # type: ignore
+        self._server = server
+
+        self.client.warm_up()
+
+        flusher = threading.Thread(
+            target=self._flush_periodically, name='pytest-testrail-flush',
+        )
+        flusher.start()
+
+        self.logger.info(f'Uploader daemon listening on {self.socket_path}.')
+
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+            self._stopping.set()
+            flusher.join()
+
+    def shutdown(self) -> None:
+        """Stop serve_forever(). Must be called from another thread."""
+        if self._server is not None:
+            self._server.shutdown()
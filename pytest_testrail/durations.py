@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+from filelock import FileLock
+
+from .cache import default_cache_dir
+from .testrail_api_client import _TestRailAPI, fetch_pages
+
+# Durations fetched this recently, in seconds, are used without a request.
+# This lets every pytest-xdist worker, and the next sessions, share one fetch.
+REFRESH_INTERVAL = 24 * 60 * 60
+
+# Timespans returned by TestRail, ie: '1m 30s'.
+_TIMESPAN_PATTERN = re.compile(r'(\d+(?:\.\d+)?)\s*([wdhms])')
+_TIMESPAN_UNITS = {
+    'w': 5 * 8 * 60 * 60,
+    'd': 8 * 60 * 60,
+    'h': 60 * 60,
+    'm': 60,
+    's': 1,
+}
+
+
+def parse_elapsed(elapsed: Optional[str]) -> Optional[float]:
+    """Get the seconds in a TestRail timespan, ie: '1m 30s'.
+
+    TestRail counts a day as 8 hours and a week as 5 days.
+
+    Returns:
+        The number of seconds, or None if the timespan is empty or invalid.
+    """
+    if not elapsed:
+        return None
+
+    parts = _TIMESPAN_PATTERN.findall(elapsed)
+    if not parts:
+        return None
+
+    return sum(float(value) * _TIMESPAN_UNITS[unit] for value, unit in parts)
+
+
+class DurationIndex:
+    """Local copy of the time each case took in a TestRail testrun.
+
+    Durations come from the elapsed field of the testrun's results.
+    The newest result with an elapsed time is used for each case.
+    They are kept in a JSON file and fetched again once older than
+    REFRESH_INTERVAL.
+
+    Arguments:
+        client: TestRail API client.
+        run_id: ID of the testrun whose results are used.
+        cache_dir: Directory where the durations file is kept.
+    """
+
+    def __init__(
+        self,
+        client: _TestRailAPI,
+        run_id: int,
+        cache_dir: Optional[str] = None,
+    ):
+        self.client = client
+        self.run_id = run_id
+        self.cache_dir = cache_dir or default_cache_dir()
+
+        # Instances are told apart by their API url.
+        url_hash = hashlib.sha1(str(client.base_uri).encode()).hexdigest()[:12]
+        name = f'durations-{url_hash}-{run_id}.json'
+
+        self.path = os.path.join(self.cache_dir, name)
+        self.lock = FileLock(f'{self.path}.lock')
+
+        self.durations: Dict[int, float] = {}
+
+    def _read(self) -> Dict[str, Any]:
+        """Get the content of the durations file, or an empty dict."""
+        try:
+            with open(self.path) as f:
+                data: Dict[str, Any] = json.load(f)
+                return data
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self, data: Dict[str, Any]) -> None:
+        """Replace the durations file."""
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+
+        os.replace(tmp_path, self.path)
+
+    def _fetch_durations(self) -> Dict[int, float]:
+        """Get the duration of each case from the testrun's results."""
+        # Results only have a test id.
+        case_ids = {
+            test['id']: test.get('case_id')
+            for test in fetch_pages(self.client, 'get_tests', 'tests', {'run_id': self.run_id})
+        }
+
+        rv: Dict[int, float] = {}
+        newest: Dict[int, float] = {}
+
+        for result in fetch_pages(
+            self.client, 'get_results_for_run', 'results', {'run_id': self.run_id},
+        ):
+            case_id = case_ids.get(result.get('test_id'))
+            duration = parse_elapsed(result.get('elapsed'))
+            if case_id is None or duration is None:
+                continue
+
+            created_on = result.get('created_on') or 0
+            if created_on >= newest.get(case_id, -1):
+                newest[case_id] = created_on
+                rv[case_id] = duration
+
+        return rv
+
+    def refresh(self) -> None:
+        """Load the durations file and fetch the durations again if needed."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        with self.lock:
+            data = self._read()
+            now = time.time()
+
+            if now - data.get('refreshed_at', 0) <= REFRESH_INTERVAL:
+                self.durations = {
+                    int(case_id): duration
+                    for case_id, duration in data.get('durations', {}).items()
+                }
+                return
+
+            self.durations = self._fetch_durations()
+            self._write({
+                'refreshed_at': now,
+                'durations': {str(k): v for k, v in sorted(self.durations.items())},
+            })
+
+    def duration(self, case_ids: List[int]) -> float:
+        """Get the longest duration of some cases, or 0 if none is known."""
+        return max((self.durations.get(case_id, 0) for case_id in case_ids), default=0)
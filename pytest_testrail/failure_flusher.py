@@ -0,0 +1,103 @@
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from .logger import get_logger
+from .result_item import ResultItem
+
+# Most failed results sent in one request.
+DEFAULT_BATCH_SIZE = 10
+# Seconds a failed result waits for others to be sent with it.
+DEFAULT_INTERVAL = 1.0
+
+
+class FailureFlusher:
+    """Send failed results from a background thread while tests run.
+
+    Results are sent in batches of at most batch_size, waiting at most
+    interval seconds after the first result of a batch.
+
+    Arguments:
+        send: Called with each batch. If it raises, the batch is not
+            counted as sent and is published with the other results.
+        batch_size: Most results in a batch.
+        interval: Seconds a result waits for others before its batch is sent.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[List[ResultItem]], None],
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        interval: float = DEFAULT_INTERVAL,
+    ):
+        self.send = send
+        self.batch_size = max(1, batch_size)
+        self.interval = interval
+
+        self.logger = get_logger()
+
+        # Number of results sent for each case id.
+        self.flushed: Dict[int, int] = {}
+
+        self._queue: 'queue.SimpleQueue[Optional[ResultItem]]' = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, item: ResultItem) -> None:
+        """Queue a failed result. The thread starts with the first one."""
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name='pytest-testrail-flush', daemon=True,
+            )
+            self._thread.start()
+
+        self._queue.put(item)
+
+    def close(self) -> None:
+        """Send the queued results and stop the thread."""
+        if self._thread is None:
+            return
+
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def _run(self) -> None:
+        """Send batches until close() is called."""
+        stopping = False
+
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                return
+
+            batch = [first]
+            deadline = time.monotonic() + self.interval
+
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+
+                if item is None:
+                    stopping = True
+                    break
+
+                batch.append(item)
+
+            self._send(batch)
+
+    def _send(self, batch: List[ResultItem]) -> None:
+        """Send one batch and count its results as sent."""
+        try:
+            self.send(batch)
+        except Exception as error:
+            self.logger.warning(
+                f'{len(batch)} failed results not sent early, they will be published'
+                f' with the other results: {error}',
+            )
+            return
+
+        for item in batch:
+            self.flushed[item.case_id] = self.flushed.get(item.case_id, 0) + 1
@@ -0,0 +1,61 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import pytest
+
+from .converters import clean_test_ids, format_test_defects
+
+
+@dataclass(frozen=True)
+class ItemMetadata:
+    """TestRail data associated with a single pytest item.
+
+    Computed once per item and kept in the item's stash, so report hooks
+    don't need to inspect markers for every test phase.
+
+    Attributes:
+        case_ids: TestRail case ids from the case_id marker.
+        defects: TestRail defects field, already formatted.
+        test_parametrize: Parameters used in the test.
+    """
+
+    case_ids: List[int]
+    defects: Optional[str]
+    test_parametrize: Optional[Dict[str, Any]]
+
+
+# None is stored for items without a case_id marker.
+item_metadata_key = pytest.StashKey[Optional[ItemMetadata]]()
+
+
+def get_item_metadata(item: pytest.Item) -> Optional[ItemMetadata]:
+    """Get the TestRail metadata for a pytest item.
+
+    The metadata is read from the item's stash. If it is not there yet,
+    it is built from the item's markers and stored for the next lookup.
+
+    Returns:
+        ItemMetadata, or None if the item has no case_id marker.
+    """
+    try:
+        return item.stash[item_metadata_key]
+    except KeyError:
+        pass
+
+    metadata: Optional[ItemMetadata] = None
+
+    case_id_marker = item.get_closest_marker('case_id')
+    if case_id_marker:
+        defect_ids_marker = item.get_closest_marker('defect_ids')
+        defect_ids = defect_ids_marker.args if defect_ids_marker else None
+
+        callspec = getattr(item, 'callspec', None)
+
+        metadata = ItemMetadata(
+            case_ids=clean_test_ids(case_id_marker.args),
+            defects=format_test_defects(defect_ids),
+            test_parametrize=callspec.params if callspec else None,
+        )
+
+    item.stash[item_metadata_key] = metadata
+    return metadata
@@ -0,0 +1,123 @@
+import itertools
+import re
+from typing import IO, Iterator, List, Optional, Union
+from xml.etree import ElementTree
+
+from .comment import capture_comment
+from .converters import clean_test_ids, format_test_defects
+from .result_item import ResultItem, comment_capture_size
+
+# Tags of a testcase's child elements, with the pytest status they map to.
+_OUTCOME_TAGS = {
+    'failure': 'failed',
+    'error': 'failed',
+    'skipped': 'skipped',
+}
+
+_SEPARATOR_PATTERN = re.compile(r'[\s,]+')
+
+
+def _testcase_results(
+    testcase: ElementTree.Element,
+    index: int,
+    case_property: str,
+    comment_size: int,
+) -> List[ResultItem]:
+    """Get the results of one testcase element, one per case id."""
+    case_ids: List[int] = []
+    defect_ids: List[str] = []
+
+    for prop in testcase.iterfind('properties/property'):
+        value = prop.get('value') or ''
+        if prop.get('name') == case_property:
+            case_ids.extend(clean_test_ids(_SEPARATOR_PATTERN.split(value.strip())))
+        elif prop.get('name') == 'defect_ids':
+            defect_ids.extend(v for v in _SEPARATOR_PATTERN.split(value.strip()) if v)
+
+    if not case_ids:
+        return []
+
+    status_id = 'passed'
+    comment: Optional[str] = None
+
+    for child in testcase:
+        if child.tag in _OUTCOME_TAGS:
+            status_id = _OUTCOME_TAGS[child.tag]
+
+            message = child.get('message') or ''
+            text = (child.text or '').strip()
+            comment = capture_comment('\n'.join(filter(None, (message, text))), comment_size)
+            break
+
+    try:
+        duration = float(testcase.get('time') or 0)
+    except ValueError:
+        duration = 0.0
+
+    defects = format_test_defects(defect_ids)
+
+    return [
+        ResultItem(
+            test_name=testcase.get('name') or '',
+            case_id=case_id,
+            status_id=status_id,
+            duration=duration,
+            comment=comment,
+            defects=defects,
+            test_parametrize=None,
+            # Testcases are in the order they ran.
+            timestamp=float(index),
+        )
+        for case_id in case_ids
+    ]
+
+
+def iter_junit_results(
+    source: Union[str, IO[bytes]],
+    case_property: str = 'case_id',
+    comment_size_limit: int = 4000,
+    counter: Optional[Iterator[int]] = None,
+) -> Iterator[ResultItem]:
+    """Read results from a JUnit XML file.
+
+    The file is parsed incrementally. Each testcase element is dropped once
+    read, so memory use doesn't grow with the size of the file.
+
+    Testcases are mapped to a result for each case id in their case_property
+    properties, ie: record_property('case_id', 'C1234') in pytest.
+    Testcases without one are skipped.
+
+    Arguments:
+        source: Path or file object of the JUnit XML file.
+        case_property: Name of the testcase property holding case ids.
+        comment_size_limit: Size of the comment published to TestRail.
+        counter: Gives the position of each testcase, used as its timestamp.
+            Share one between files so testcases from later files, ie: reruns,
+            are published after the ones from earlier files.
+    """
+    comment_size = comment_capture_size(comment_size_limit)
+
+    # Open elements, to remove finished ones from their parent.
+    stack: List[ElementTree.Element] = []
+    if counter is None:
+        counter = itertools.count()
+
+    for event, elem in ElementTree.iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            stack.append(elem)
+            continue
+
+        stack.pop()
+
+        if elem.tag in ('system-out', 'system-err') and stack and stack[-1].tag == 'testcase':
+            # Captured output is not published, don't keep it until the testcase ends.
+            elem.clear()
+
+        elif elem.tag == 'testcase':
+            yield from _testcase_results(elem, next(counter), case_property, comment_size)
+
+            if stack:
+                stack[-1].remove(elem)
+
+        elif elem.tag == 'testsuite' and stack:
+            stack[-1].remove(elem)
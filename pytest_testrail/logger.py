@@ -1,18 +1,151 @@
+import atexit
 import logging
-import uuid
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from typing import List, Optional
 
+LOGGER_NAME = 'pytest_testrail'
 
-def get_logger() -> logging.Logger:
-    """Get a new instance of the plugin logger."""
-    logger_name = f"{__name__} {str(uuid.uuid4())}"
+_FORMATTER = logging.Formatter('%(asctime)s - [testrail] - %(message)s')
+
+# Handler of the plugin logger installed by this module, if any.
+_installed: Optional[logging.Handler] = None
+# Writes records when no QueueLogging is running.
+_default_handler: Optional[logging.Handler] = None
+# Running QueueLogging, the newest one's handler is installed.
+_active: List['QueueLogging'] = []
+
+
+class _StderrHandler(logging.StreamHandler):
+    """StreamHandler that writes each record to the sys.stderr it was logged with.
+
+    pytest replaces sys.stderr while capturing output. Records are written
+    by a background thread, by then another test's capture may be active.
+    Records logged without a stream, or whose stream was closed since,
+    go to the original sys.__stderr__.
+    """
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """Write a record to its stream."""
+        stream = getattr(record, 'stderr', None) or sys.stderr
+        if getattr(stream, 'closed', False):
+            stream = sys.__stderr__
+
+        if stream is None:
+            return
+
+        # Only called with the handler's lock held.
+        self.stream = stream
+        super().emit(record)
+
+
+class _StderrQueueHandler(QueueHandler):
+    """QueueHandler that keeps the sys.stderr of the thread logging each record."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Copy a record for the queue, with the current sys.stderr."""
+        record = super().prepare(record)
+        record.stderr = sys.stderr  # type: ignore
+        return record
 
-    logger = logging.getLogger(logger_name)
-    logger.setLevel(logging.INFO)
 
-    logging_formatter = logging.Formatter('%(asctime)s - [testrail] - %(message)s')
-    handler = logging.StreamHandler()
-    handler.setFormatter(logging_formatter)
+class QueueLogging:
+    """Records of the plugin logger written to stderr by a background thread.
+
+    Logging then does not block the test thread. Created by start_logging().
+    """
+
+    def __init__(self):
+        log_queue: queue.SimpleQueue = queue.SimpleQueue()
+
+        handler = _StderrHandler()
+        handler.setFormatter(_FORMATTER)
+
+        self.handler = _StderrQueueHandler(log_queue)
+        self.listener = QueueListener(log_queue, handler)
+
+
+def _install(handler: logging.Handler) -> None:
+    """Replace the handler this module installed on the plugin logger."""
+    global _installed
+
+    logger = logging.getLogger(LOGGER_NAME)
+    if _installed is not None:
+        logger.removeHandler(_installed)
 
     logger.addHandler(handler)
+    _installed = handler
+
+
+def _get_default_handler() -> logging.Handler:
+    """Get the handler writing records to stderr from the thread logging them."""
+    global _default_handler
+
+    if _default_handler is None:
+        _default_handler = _StderrHandler()
+        _default_handler.setFormatter(_FORMATTER)
+
+    return _default_handler
+
+
+def get_logger() -> logging.Logger:
+    """Get the plugin logger.
+
+    Every caller shares the same logger. Records are written to stderr,
+    by a background thread while a session's start_logging() is running.
+    """
+    logger = logging.getLogger(LOGGER_NAME)
+
+    if _installed is None:
+        logger.setLevel(logging.INFO)
+        _install(_get_default_handler())
 
     return logger
+
+
+def start_logging() -> QueueLogging:
+    """Write the plugin's records from a background thread, until stop_logging().
+
+    Nested sessions, ie: pytester, each start their own. Stopping one
+    installs the handler that was used before it.
+    """
+    get_logger()
+
+    queue_logging = QueueLogging()
+    queue_logging.listener.start()
+
+    _active.append(queue_logging)
+    _install(queue_logging.handler)
+
+    return queue_logging
+
+
+def stop_logging(queue_logging: Optional[QueueLogging] = None) -> None:
+    """Write the queued records and stop the background thread.
+
+    Records logged afterwards are written by the previous handler.
+
+    Arguments:
+        queue_logging: What start_logging() returned. If not given, every
+            running QueueLogging is stopped.
+    """
+    if queue_logging is None:
+        for running in reversed(list(_active)):
+            stop_logging(running)
+        return
+
+    if queue_logging not in _active:
+        return
+
+    was_installed = _active[-1] is queue_logging
+    _active.remove(queue_logging)
+
+    # Replaced before stopping, so no record is put on a queue nobody reads.
+    if was_installed:
+        _install(_active[-1].handler if _active else _get_default_handler())
+
+    queue_logging.listener.stop()
+
+
+atexit.register(stop_logging)
@@ -0,0 +1,239 @@
+import inspect
+import linecache
+import os
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Number of frames kept for each allocation.
+# Allocations made by libraries, ie: json decoding a response, are attributed
+# to the closest frame inside this package. Each extra frame makes tracing slower.
+TRACEBACK_LIMIT = 8
+
+# Allocations made while taking a snapshot are not the plugin's.
+_EXCLUDED_FILES = (tracemalloc.__file__, linecache.__file__)
+
+OTHER = 'other'
+
+
+def _function_lines(function: Callable) -> Optional[Tuple[str, int, int]]:
+    """Get the file and line range of a function.
+
+    Returns None if the function has been replaced, ie: by a mock.
+    """
+    function = inspect.unwrap(function)
+    if not inspect.isfunction(function):
+        return None
+
+    lines, first = inspect.getsourcelines(function)
+    return os.path.abspath(inspect.getsourcefile(function) or ''), first, first + len(lines) - 1
+
+
+def _categories() -> List[Tuple[str, int, int, str]]:
+    """Get the code locations for each category of plugin-held data."""
+    from .comment import CompressedComment, capture_comment, render_comment
+    from .controller import _TestRailController
+    from .plugin import PyTestRailPlugin
+    from .result_item import ResultItem
+    from .result_table import ResultTable
+    from .results import Results
+
+    functions: Dict[str, List[Callable]] = {
+        'comments': [
+            capture_comment,
+            render_comment,
+            CompressedComment.__init__,
+        ],
+        'payloads': [
+            ResultItem.as_api_payload,
+            _TestRailController.send_to_testrail,
+        ],
+        'api responses': [
+            _TestRailController.get_open_runs,
+            _TestRailController.get_blocked_cases,
+            _TestRailController.create_run,
+            _TestRailController._post_results,
+            PyTestRailPlugin.skip_missing_items,
+        ],
+        'results': [
+            PyTestRailPlugin.add_result,
+            ResultItem.__post_init__,
+        ],
+    }
+
+    rv = []
+    for category, category_functions in functions.items():
+        for function in category_functions:
+            location = _function_lines(function)
+            if location is not None:
+                rv.append((*location, category))
+
+    # Whole modules, checked after the functions above.
+    for module, category in (
+        (Results, 'results'),
+        (ResultTable, 'results'),
+    ):
+        path = os.path.abspath(inspect.getsourcefile(module) or '')
+        rv.append((path, 0, 2 ** 31, category))
+
+    return rv
+
+
+class MemoryReport:
+    """Measure memory allocated by the plugin, using tracemalloc.
+
+    Allocations are grouped into categories of data held by the plugin:
+    results, comments, API responses and API payloads.
+
+    Arguments:
+        enabled: If False, nothing is measured.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+
+        # Name of the sample, size of each category.
+        self.samples: List[Tuple[str, Dict[str, int]]] = []
+        self.process_peak = 0
+        self.top_sites: List[Tuple[str, int]] = []
+
+        self._peak_total = -1
+        self._locations: Optional[Dict[str, List[Tuple[int, int, str]]]] = None
+        # Category of each (filename, line), or None for frames outside this package.
+        self._frame_categories: Dict[Tuple[str, int], Optional[str]] = {}
+        # Site of each allocation traceback seen by a previous sample.
+        self._sites: Dict[tracemalloc.Traceback, Optional[Tuple[str, str]]] = {}
+
+    def start(self) -> None:
+        """Start tracing allocations."""
+        if self.enabled and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEBACK_LIMIT)
+
+    def stop(self) -> None:
+        """Stop tracing allocations."""
+        if self.enabled and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def _frame_category(self, filename: str, lineno: int) -> Optional[str]:
+        """Get the category of a frame, or None if it's not in this package."""
+        key = (filename, lineno)
+        if key in self._frame_categories:
+            return self._frame_categories[key]
+
+        if self._locations is None:
+            self._locations = {}
+            for path, first, last, category in _categories():
+                self._locations.setdefault(path, []).append((first, last, category))
+
+        rv: Optional[str] = None
+        if filename.startswith(PACKAGE_DIR):
+            rv = OTHER
+            for first, last, category in self._locations.get(filename, []):
+                if first <= lineno <= last:
+                    rv = category
+                    break
+
+        self._frame_categories[key] = rv
+        return rv
+
+    def _site(self, traceback: tracemalloc.Traceback) -> Optional[Tuple[str, str]]:
+        """Get the most recent line of an allocation in this package, and its category.
+
+        Returns None for allocations made outside this package, or by this report.
+        """
+        if traceback in self._sites:
+            return self._sites[traceback]
+
+        rv: Optional[Tuple[str, str]] = None
+
+        # Filtered here, Snapshot.filter_traces() is much slower.
+        if traceback[-1].filename not in _EXCLUDED_FILES:
+            for frame in reversed(traceback):
+                if frame.filename == __file__:
+                    break
+
+                category = self._frame_category(frame.filename, frame.lineno)
+                if category is not None:
+                    rv = (f'{frame.filename}:{frame.lineno}', category)
+                    break
+
+        self._sites[traceback] = rv
+        return rv
+
+    def sample(self, name: str) -> None:
+        """Measure the memory currently held by the plugin.
+
+        Arguments:
+            name: Name of the point in the session being measured.
+        """
+        if not self.enabled or not tracemalloc.is_tracing():
+            return
+
+        snapshot = tracemalloc.take_snapshot()
+
+        sizes: Dict[str, int] = {}
+        sites: Dict[str, int] = {}
+        for stat in snapshot.statistics('traceback'):
+            plugin_site = self._site(stat.traceback)
+            if plugin_site is None:
+                continue
+
+            site, category = plugin_site
+            sizes[category] = sizes.get(category, 0) + stat.size
+            sites[site] = sites.get(site, 0) + stat.size
+
+        self.samples.append((name, sizes))
+        self.process_peak = max(self.process_peak, tracemalloc.get_traced_memory()[1])
+
+        total = sum(sizes.values())
+        if total > self._peak_total:
+            self._peak_total = total
+            self.top_sites = sorted(sites.items(), key=lambda site: -site[1])[:10]
+
+    def peak(self) -> Dict[str, int]:
+        """Get the largest size of each category across every sample."""
+        rv: Dict[str, int] = {}
+        for _name, sizes in self.samples:
+            for category, size in sizes.items():
+                rv[category] = max(rv.get(category, 0), size)
+
+        return rv
+
+    def final(self) -> Dict[str, int]:
+        """Get the size of each category in the last sample."""
+        return dict(self.samples[-1][1]) if self.samples else {}
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Get the measurements in a serializable form."""
+        return {
+            'peak': self.peak(),
+            'final': self.final(),
+            'process_peak': self.process_peak,
+            'top_sites': [list(site) for site in self.top_sites],
+        }
+
+    @staticmethod
+    def summary_lines(data: Dict[str, Any]) -> List[str]:
+        """Get a table from the output of as_dict()."""
+        lines = [f"{'category':<24}{'peak (KiB)':>14}{'final (KiB)':>14}"]
+
+        peak = data['peak']
+        final = data['final']
+        for category in sorted(peak):
+            lines.append(
+                f"{category:<24}{peak[category] / 1024:>14.1f}"
+                f"{final.get(category, 0) / 1024:>14.1f}",
+            )
+
+        lines.append(
+            f"plugin peak: {sum(peak.values()) / 1024:.1f} KiB, "
+            f"process traced peak: {data['process_peak'] / 1024:.1f} KiB",
+        )
+
+        if data['top_sites']:
+            lines.append('top allocation sites:')
+            for site, size in data['top_sites']:
+                lines.append(f'  {size / 1024:>10.1f} KiB  {site}')
+
+        return lines
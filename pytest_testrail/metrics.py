@@ -0,0 +1,258 @@
+import json
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import requests
+
+from .cache import ResponseCache
+from .tracing import Tracer
+
+# Upper bounds, in seconds, of the latency histogram buckets.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, float('inf'))
+
+
+def endpoint_name(url: str) -> str:
+    """Get the TestRail endpoint name from a request URL.
+
+    Example:
+        >>> endpoint_name('https://foo.testrail.io/index.php?/api/v2/get_run/10')
+        'get_run'
+    """
+    path = url.split('/api/v2/', 1)[-1]
+    return path.split('/', 1)[0].split('&', 1)[0]
+
+
+class EndpointMetrics:
+    """Measurements for every request made to one endpoint."""
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        # Times results were kept to be sent again after a failed request.
+        self.retries = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.histogram = [0] * len(LATENCY_BUCKETS)
+
+    def record(
+        self,
+        elapsed: float,
+        bytes_sent: int,
+        bytes_received: int,
+        error: bool,
+    ) -> None:
+        """Add the measurements of one request."""
+        self.count += 1
+        self.errors += int(error)
+        self.bytes_sent += bytes_sent
+        self.bytes_received += bytes_received
+        self.total_time += elapsed
+        self.max_time = max(self.max_time, elapsed)
+
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if elapsed <= bound:
+                self.histogram[index] += 1
+                break
+
+    def merge(self, data: Dict[str, Any]) -> None:
+        """Add measurements from the output of as_dict()."""
+        self.count += data['count']
+        self.errors += data['errors']
+        self.retries += data['retries']
+        self.bytes_sent += data['bytes_sent']
+        self.bytes_received += data['bytes_received']
+        self.total_time += data['total_time']
+        self.max_time = max(self.max_time, data['max_time'])
+        self.histogram = [a + b for a, b in zip(self.histogram, data['histogram'])]
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Get the measurements in a JSON serializable form."""
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'retries': self.retries,
+            'bytes_sent': self.bytes_sent,
+            'bytes_received': self.bytes_received,
+            'total_time': self.total_time,
+            'max_time': self.max_time,
+            'histogram': list(self.histogram),
+        }
+
+
+class Metrics:
+    """Collect measurements of requests made to the TestRail API.
+
+    Measurements are grouped by endpoint, ie: get_run, add_results_for_cases.
+    """
+
+    def __init__(self):
+        self.endpoints: Dict[str, EndpointMetrics] = {}
+        self._lock = threading.Lock()
+
+    def __bool__(self) -> bool:
+        """If any request was measured."""
+        return bool(self.endpoints)
+
+    def record(
+        self,
+        endpoint: str,
+        elapsed: float,
+        bytes_sent: int = 0,
+        bytes_received: int = 0,
+        error: bool = False,
+    ) -> None:
+        """Add the measurements of one request."""
+        with self._lock:
+            metrics = self.endpoints.setdefault(endpoint, EndpointMetrics())
+            metrics.record(elapsed, bytes_sent, bytes_received, error)
+
+    def record_retry(self, endpoint: str) -> None:
+        """Count results kept to be sent to an endpoint again, after a failed request."""
+        with self._lock:
+            self.endpoints.setdefault(endpoint, EndpointMetrics()).retries += 1
+
+    def merge(self, data: Dict[str, Dict[str, Any]]) -> None:
+        """Add measurements from the output of as_dict().
+
+        Used to combine the measurements of pytest-xdist workers.
+        """
+        with self._lock:
+            for endpoint, endpoint_data in data.items():
+                metrics = self.endpoints.setdefault(endpoint, EndpointMetrics())
+                metrics.merge(endpoint_data)
+
+    def as_dict(self) -> Dict[str, Dict[str, Any]]:
+        """Get the measurements in a JSON serializable form."""
+        with self._lock:
+            return {
+                endpoint: metrics.as_dict()
+                for endpoint, metrics in sorted(self.endpoints.items())
+            }
+
+    def write_json(self, path: str) -> None:
+        """Write the measurements to a JSON file."""
+        data = {
+            'latency_buckets': [str(bound) for bound in LATENCY_BUCKETS],
+            'endpoints': self.as_dict(),
+        }
+
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=2)
+
+    def summary_lines(self) -> List[str]:
+        """Get a table of the measurements, one line per endpoint."""
+        lines = [
+            f"{'endpoint':<24}{'calls':>7}{'errors':>8}{'retries':>9}{'avg (s)':>10}"
+            f"{'max (s)':>10}{'sent (B)':>12}{'recv (B)':>12}",
+        ]
+
+        for endpoint, data in self.as_dict().items():
+            average = data['total_time'] / data['count'] if data['count'] else 0.0
+            lines.append(
+                f"{endpoint:<24}{data['count']:>7}{data['errors']:>8}{data['retries']:>9}"
+                f"{average:>10.3f}{data['max_time']:>10.3f}"
+                f"{data['bytes_sent']:>12}{data['bytes_received']:>12}",
+            )
+
+        return lines
+
+
+class MetricsSession(requests.Session):
+    """requests.Session that measures every request it sends.
+
+    Arguments:
+        metrics: Where measurements are recorded.
+        tracer: Records a span for every request.
+        cache: If given, responses from read-only endpoints are cached.
+        timeout: Timeout of requests sent without one.
+    """
+
+    def __init__(
+        self,
+        metrics: Optional[Metrics] = None,
+        tracer: Optional[Tracer] = None,
+        cache: Optional[ResponseCache] = None,
+        timeout: Optional[Union[float, Tuple[float, float]]] = None,
+    ):
+        super().__init__()
+        self.metrics = metrics
+        self.tracer = Tracer() if tracer is None else tracer
+        self.cache = cache
+        self.timeout = timeout
+
+    def request(self, method, url, *args, **kwargs) -> requests.Response:  # type: ignore
+        """Send a request and record its latency, size, and outcome."""
+        kwargs.setdefault('timeout', self.timeout)
+        endpoint = endpoint_name(str(url))
+
+        if self.cache is None or method != 'GET' or endpoint not in self.cache.ttls:
+            with self.tracer.span('http_request', method=method, endpoint=endpoint):
+                return self._measured_request(method, url, *args, **kwargs)
+
+        return self._cached_request(endpoint, method, url, *args, **kwargs)
+
+    def warm_up(self, url: str, **kwargs) -> None:
+        """Open a connection to a host, without recording metrics.
+
+        The connection is kept in the session's pool for the next request.
+        Errors are ignored, the next request will report them.
+        """
+        with self.tracer.span('warm_up'):
+            try:
+                super().request('HEAD', url, allow_redirects=False, **kwargs)
+            except requests.RequestException:
+                pass
+
+    def _cached_request(self, endpoint, method, url, *args, **kwargs) -> requests.Response:
+        """Get a response from the cache, or send the request and cache its response."""
+        full_url = requests.Request(method, str(url), params=kwargs.get('params')).prepare().url
+        user = self.auth[0] if isinstance(self.auth, tuple) else ''
+        key = self.cache.key(str(user), str(full_url))  # type: ignore
+
+        content = self.cache.get(key)  # type: ignore
+        if content is not None:
+            with self.tracer.span('cache_hit', endpoint=endpoint):
+                response = requests.Response()
+                response.status_code = 200
+                response.url = str(full_url)
+                response.encoding = 'utf-8'
+                response._content = content.encode('utf-8')
+                return response
+
+        with self.tracer.span('http_request', method=method, endpoint=endpoint):
+            response = self._measured_request(method, url, *args, **kwargs)
+
+        if response.status_code == 200:
+            self.cache.put(key, endpoint, response.text)  # type: ignore
+
+        return response
+
+    def _measured_request(self, method, url, *args, **kwargs) -> requests.Response:
+        """Send a request, recording metrics if there is somewhere to record them."""
+        if self.metrics is None:
+            return super().request(method, url, *args, **kwargs)
+
+        start = time.perf_counter()
+        try:
+            response = super().request(method, url, *args, **kwargs)
+        except requests.RequestException:
+            self.metrics.record(
+                endpoint_name(str(url)),
+                time.perf_counter() - start,
+                error=True,
+            )
+            raise
+
+        body = response.request.body or b''
+        self.metrics.record(
+            endpoint_name(str(url)),
+            time.perf_counter() - start,
+            bytes_sent=len(body),
+            bytes_received=len(response.content),
+            error=response.status_code >= 400,
+        )
+
+        return response
@@ -1,42 +1,57 @@
-import logging
+import dataclasses
 import os
+import threading
 import time
-from typing import Generator, List, Optional, Tuple, cast
+import warnings
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Generator, Iterable, List, Optional, Set, Tuple, cast
 
 from _pytest.config.argparsing import OptionGroup, Parser
 
 import pytest
 from pytest import Config
 
+import requests
+
+from .attachments import add_attachment, attachments_key
+from .cache import ResponseCache, clear_cache
+from .case_index import CaseIndex
+from .comment import capture_comment
 from .config_manager import ConfigManager
 from .controller import _TestRailController
-from .converters import clean_test_defects, clean_test_ids
-from .logger import get_logger
-from .result_item import ResultItem
+from .daemon import hand_off
+from .durations import DurationIndex
+from .failure_flusher import FailureFlusher
+from .item_metadata import get_item_metadata, item_metadata_key
+from .logger import QueueLogging, get_logger, start_logging, stop_logging
+from .memory import MemoryReport
+from .metrics import Metrics
+from .profiler import Profiler
+from .result_item import ResultItem, comment_capture_size
 from .results import Results
+from .spool import default_spool_path, shard_artifact_path, write_spool
+from .status import RERUN_STATUSES
 from .store import Store
-from .testrail_api_client import _TestRailAPI
+from .testrail_api_client import _TestRailAPI, fetch_pages
+from .tracing import TRACE_FORMATS, Tracer
 
 
 def get_testrail_keys(
-    items: List[pytest.Function],
-) -> List[Tuple[pytest.Function, List[int]]]:
+    items: List[pytest.Item],
+) -> List[Tuple[pytest.Item, List[int]]]:
     """Get Pytest nodes and TestRail ids from pytests markers.
 
+    The TestRail metadata for each item is stored in the item's stash.
+
     Returns:
-        list[tuple[pytest.Function, list[int]]]:
+        list[tuple[pytest.Item, list[int]]]:
             Pytest function and the cases associated with them.
     """
     testcaseids = []
     for item in items:
-        closest_marker: Optional[pytest.Mark]
-
-        marker = 'case_id'
-        closest_marker = item.get_closest_marker(marker)
-        if closest_marker:
-            raw_ids = cast(Tuple[str], closest_marker.args)
-            cleaned_ids = clean_test_ids(raw_ids)
-            testcaseids.append((item, cleaned_ids))
+        metadata = get_item_metadata(item)
+        if metadata:
+            testcaseids.append((item, metadata.case_ids))
 
     return testcaseids
 
@@ -59,7 +74,27 @@ class PyTestRailPlugin:
         version: str = '',
         close_on_complete: bool = False,
         skip_missing: bool = False,
+        deselect_missing: bool = False,
+        rerun_failed: bool = False,
         milestone_id: Optional[int] = None,
+        compress_comments: bool = False,
+        spill_threshold: int = 0,
+        columnar_results: bool = False,
+        metrics: Optional[Metrics] = None,
+        metrics_json: Optional[str] = None,
+        profiler: Optional[Profiler] = None,
+        tracer: Optional[Tracer] = None,
+        trace_path: Optional[str] = None,
+        trace_format: str = 'chrome',
+        memory_report: Optional[MemoryReport] = None,
+        case_index: Optional[CaseIndex] = None,
+        drop_unknown_case_ids: bool = False,
+        duration_index: Optional[DurationIndex] = None,
+        finish_budget: float = 0,
+        shard_artifact: Optional[str] = None,
+        daemon_socket: Optional[str] = None,
+        flush_failures: bool = False,
+        queue_logging: Optional[QueueLogging] = None,
     ):
         self.controller = controller
         self.client = client
@@ -67,25 +102,82 @@ class PyTestRailPlugin:
         self.project_id = project_id
         self.suite_id = suite_id
         self.testrun_description = tr_description
+
+        # Set when a new testrun is being created in the background.
+        self._testrun_future: Optional[Future] = None
+        self.testrun_error: Optional[BaseException] = None
+        # Why the checks on the testrun or testplan failed, ie: a bad URL or credentials.
+        self.configuration_error: Optional[str] = None
+        # The testrun was not created within the finish budget.
+        self.testrun_timed_out = False
+
         self.testrun_id = run_id
         self.testplan_id = plan_id
         self.close_on_complete = close_on_complete
 
         self.skip_missing = skip_missing
+        self.deselect_missing = deselect_missing
+        self.rerun_failed = rerun_failed
         self.milestone_id = milestone_id
+        self.compress_comments = compress_comments
+
+        self.case_index = case_index
+        self.drop_unknown_case_ids = drop_unknown_case_ids
+        self.duration_index = duration_index
+        # If the durations could be loaded, once they were tried.
+        self.durations_loaded: Optional[bool] = None
+
+        # Shared with the client, which records every request made.
+        self.metrics = Metrics() if metrics is None else metrics
+        self.metrics_json = metrics_json
+
+        # Shared with the controller, which measures the publishing phases.
+        self.profiler = Profiler() if profiler is None else profiler
+        self.session_start = time.perf_counter()
+
+        # Shared with the client, controller and store, which record spans.
+        self.tracer = Tracer() if tracer is None else tracer
+        self.trace_path = trace_path
+        self.trace_format = trace_format
+
+        self.memory_report = MemoryReport() if memory_report is None else memory_report
+        self.worker_memory: Dict[str, Dict[str, Any]] = {}
+
+        # Seconds allowed for publishing and closing. 0 has no limit.
+        self.finish_budget = finish_budget
+
+        # Results are written to this file instead of being published.
+        # The merge command publishes the artifacts of every shard at once.
+        self.shard_artifact = shard_artifact
+        self.shard_case_ids: List[int] = []
+
+        # Results are handed off to the uploader daemon listening on this socket.
+        self.daemon_socket = daemon_socket
+
+        # Failed results are sent while tests run, the others at the end of the session.
+        self.flusher: Optional[FailureFlusher] = None
+        if flush_failures and not shard_artifact:
+            self.flusher = FailureFlusher(self.send_failures)
+        # Number of results of each case id, to know which were all sent early.
+        self.case_result_counts: Dict[int, int] = {}
+
+        # What was published and what was written to a spool, by every process.
+        self.config = config
+        self.publish_summary: List[str] = []
+
+        self.results = Results(
+            spill_threshold=spill_threshold,
+            columnar=columnar_results,
+        )
 
-        self.results = Results()
-
-        handler = logging.StreamHandler()
-        self.client.logger.addHandler(handler)
-        self.client.logger.setLevel(logging.INFO)
+        # Files to attach to the results of each (case_id, test_name).
+        self.attachments: Dict[Tuple[int, str], List[str]] = {}
 
         self.logger = get_logger()
+        # Stopped at unconfigure, other sessions' logging is left running.
+        self.queue_logging = queue_logging
 
-        self.case_id_mark = 'case_id'
-        self.defect_ids_mark = 'defect_ids'
-
-        self.store = Store(config)
+        self.store = Store(config, tracer=self.tracer)
         current_store = self.store.get_all()
 
         if self.testrun_id and not current_store.get('run_id'):
@@ -94,6 +186,94 @@ class PyTestRailPlugin:
         if self.testplan_id and not current_store.get('plan_id'):
             self.store.set_value('plan_id', self.testplan_id)
 
+    @property
+    def testrun_id(self) -> int:
+        """ID of the testrun results are published to.
+
+        If a new testrun is being created, wait until it exists.
+        """
+        self.wait_for_testrun()
+        return self._testrun_id
+
+    @testrun_id.setter
+    def testrun_id(self, value: int) -> None:
+        self._testrun_id = value
+
+    def start_testrun_creation(self, config: Config, tr_keys: List[int]) -> None:
+        """Get or create the current testrun in a background thread.
+
+        Tests can run while TestRail creates the testrun.
+        The thread is a daemon, pytest doesn't wait for it to exit.
+        """
+        future: Future = Future()
+        self._testrun_future = future
+
+        thread = threading.Thread(
+            target=self._create_testrun,
+            args=(future, config, tr_keys),
+            name='pytest-testrail-create-run',
+            daemon=True,
+        )
+        thread.start()
+
+    def _create_testrun(self, future: Future, config: Config, tr_keys: List[int]) -> None:
+        """Run set_current_testrun_id(), with its outcome in a future."""
+        future.set_running_or_notify_cancel()
+        try:
+            self.set_current_testrun_id(config, tr_keys)
+        except BaseException as error:
+            future.set_exception(error)
+        else:
+            future.set_result(None)
+
+    def wait_for_testrun(self, timeout: Optional[float] = None) -> bool:
+        """Wait until the testrun created in the background exists.
+
+        Arguments:
+            timeout: Seconds to wait. If the testrun is not created by then,
+                testrun_timed_out is set, and later calls without a timeout
+                don't wait for it. If it is created later, its id is logged.
+
+        Returns:
+            bool: False if the testrun could not be created, or is not created yet.
+        """
+        future = self._testrun_future
+        if future is not None:
+            # Don't block on a testrun that already timed out.
+            if self.testrun_timed_out and timeout is None:
+                timeout = 0
+
+            with self.profiler.measure('wait_for_testrun'), self.tracer.span('wait_for_testrun'):
+                try:
+                    future.result(timeout=None if timeout is None else max(timeout, 0))
+                except FutureTimeoutError:
+                    if not self.testrun_timed_out:
+                        self.testrun_timed_out = True
+                        self.logger.error('Testrun not created within the finish budget.')
+                        future.add_done_callback(self._report_late_testrun)
+                    return False
+                except Exception as error:
+                    self.testrun_error = error
+                    self.logger.error(f'Testrun could not be created: {error!r}')
+
+            self._testrun_future = None
+            self.testrun_timed_out = False
+
+        return self.testrun_error is None
+
+    def _report_late_testrun(self, future: Future) -> None:
+        """Log the id of a testrun created after the finish budget ran out."""
+        if future.exception() is not None:
+            return
+
+        message = (
+            f'Testrun ID={self._testrun_id} was created after the finish budget ran out.'
+            f' Spooled results can be published to it with:'
+            f' pytest-testrail publish --tr-run-id={self._testrun_id}'
+        )
+        self.publish_summary.append(f'{self._process_name()}: {message}')
+        self.logger.warning(message)
+
     def report_header(self) -> str:
         """Get text for pytest's report header."""
         base = 'pytest-testrail:'
@@ -115,7 +295,7 @@ class PyTestRailPlugin:
         # Guard against creating multiple testruns when using xdist
         run_id: int
 
-        with self.store.lock:
+        with self.store.locked():
             current_store = self.store.get_all()
             if current_store:
                 run_id = current_store['run_id']
@@ -135,39 +315,219 @@ class PyTestRailPlugin:
         self.testrun_id = run_id
         self.controller.testrun_id = run_id
 
-    @pytest.hookimpl(trylast=True)
-    def pytest_collection_modifyitems(self, session, config, items) -> None:
-        """Create testrail test run."""
-        items_with_tr_keys = get_testrail_keys(items)
-        tr_keys = [case_id for item in items_with_tr_keys for case_id in item[1]]
+    def get_run_case_ids(self) -> Set[int]:
+        """Get the ids of the cases in the current testrun."""
+        tests = fetch_pages(self.client, 'get_tests', 'tests', {'run_id': self.testrun_id})
 
-        if self.testrun_id:
-            self.testplan_id = 0
+        return {test.get('case_id') for test in tests}
 
-            if self.skip_missing:
-                tests_response: dict = self.client.get_tests(
-                    run_id=self.testrun_id,
-                ).get().json()
+    def skip_missing_items(
+        self,
+        items_with_tr_keys: List[Tuple[pytest.Item, List[int]]],
+    ) -> None:
+        """Skip items with no case in the current testrun."""
+        tests_list = self.get_run_case_ids()
 
-                self.client.validate_response(tests_response)
+        for item, case_id in items_with_tr_keys:
+            if not tests_list.intersection(case_id):
+                mark = pytest.mark.skip('Test is not present in testrun.')
+                item.add_marker(mark)
 
-                tests: Optional[dict] = tests_response['tests']
+    def deselect_items(
+        self,
+        config: Config,
+        items: List[pytest.Item],
+        items_with_tr_keys: List[Tuple[pytest.Item, List[int]]],
+        case_ids: Iterable[Optional[int]],
+        keep_unmarked: bool = True,
+    ) -> List[Tuple[pytest.Item, List[int]]]:
+        """Deselect items with no case in case_ids.
+
+        Unlike skip_missing_items(), deselected items are removed from the
+        session and never run or reported.
+
+        Arguments:
+            config: The pytest config.
+            items: Every collected item. Modified in place.
+            items_with_tr_keys: Items with TestRail markers, and their case ids.
+            case_ids: Cases whose items are kept.
+            keep_unmarked: If items without TestRail markers are kept.
+
+        Returns:
+            The items kept, and their case ids.
+        """
+        # case id -> items marked with it
+        index: Dict[int, List[pytest.Item]] = {}
+        for item, item_case_ids in items_with_tr_keys:
+            for case_id in item_case_ids:
+                index.setdefault(case_id, []).append(item)
+
+        kept = set()
+        for case_id in set(case_ids):
+            for item in index.get(case_id, ()):  # type: ignore
+                kept.add(item)
+
+        if keep_unmarked:
+            deselected = [item for item, _ in items_with_tr_keys if item not in kept]
+        else:
+            deselected = [item for item in items if item not in kept]
 
-                tests_list = []
+        if deselected:
+            deselected_set = set(deselected)
+            items[:] = [item for item in items if item not in deselected_set]
+            config.hook.pytest_deselected(items=deselected)
 
-                if tests:
-                    tests_list = [
-                        test.get('case_id') for test in tests
-                    ]
+        return [(item, ids) for item, ids in items_with_tr_keys if item in kept]
 
-                for item, case_id in items_with_tr_keys:
-                    if not set(case_id).intersection(set(tests_list)):
-                        mark = pytest.mark.skip('Test is not present in testrun.')
-                        item.add_marker(mark)
+    def check_case_ids(
+        self,
+        items_with_tr_keys: List[Tuple[pytest.Item, List[int]]],
+    ) -> List[Tuple[pytest.Item, List[int]]]:
+        """Warn about case ids that are not in the suite, using the case index.
 
-        # No testplan_id, no testrun_id
-        else:
-            self.set_current_testrun_id(config, tr_keys)
+        If drop_unknown_case_ids is set, unknown case ids are removed from the
+        items' metadata. They are not added to a new testrun or published.
+
+        Returns:
+            The items and their remaining case ids.
+        """
+        try:
+            self.case_index.refresh()  # type: ignore
+        except Exception as error:
+            self.logger.warning(f'Case ids not checked, could not load the case index: {error}')
+            return items_with_tr_keys
+
+        rv = []
+        for item, case_ids in items_with_tr_keys:
+            unknown = self.case_index.unknown(case_ids)  # type: ignore
+            if unknown:
+                unknown_str = ', '.join(f'C{case_id}' for case_id in unknown)
+                item.warn(pytest.PytestWarning(f'Cases not in TestRail suite: {unknown_str}'))
+
+                if self.drop_unknown_case_ids:
+                    case_ids = [case_id for case_id in case_ids if case_id not in unknown]
+                    metadata = get_item_metadata(item)
+                    item.stash[item_metadata_key] = dataclasses.replace(
+                        metadata, case_ids=case_ids,  # type: ignore
+                    ) if case_ids else None
+
+            if case_ids:
+                rv.append((item, case_ids))
+
+        return rv
+
+    def order_by_duration(
+        self,
+        items: List[pytest.Item],
+        items_with_tr_keys: List[Tuple[pytest.Item, List[int]]],
+    ) -> None:
+        """Sort items by the time their cases took in TestRail, longest first.
+
+        pytest-xdist sends items to workers in this order, so long tests
+        don't start last. Items without a known duration keep their order,
+        after the others.
+
+        Arguments:
+            items: Every collected item. Modified in place.
+            items_with_tr_keys: Items with TestRail markers, and their case ids.
+        """
+        if not self.load_durations():
+            return
+
+        durations = {
+            item: self.duration_index.duration(case_ids)  # type: ignore
+            for item, case_ids in items_with_tr_keys
+        }
+
+        items.sort(key=lambda item: -durations.get(item, 0))
+
+    def load_durations(self) -> bool:
+        """Load the durations used to order tests, once per session.
+
+        pytest-xdist aborts if its workers collect items in different orders.
+        The controller loads the durations and sends them to every worker,
+        so either every worker orders items the same way or none does.
+
+        Returns:
+            True if the durations were loaded.
+        """
+        workerinput = getattr(self.config, 'workerinput', {})
+        if 'testrail_durations' in workerinput:
+            worker_durations = workerinput['testrail_durations']
+            if worker_durations is None:
+                return False
+
+            self.duration_index.durations = {  # type: ignore
+                int(case_id): duration for case_id, duration in worker_durations.items()
+            }
+            return True
+
+        if self.durations_loaded is None:
+            try:
+                self.duration_index.refresh()  # type: ignore
+                self.durations_loaded = True
+            except Exception as error:
+                self.logger.warning(f'Tests not ordered, could not load durations: {error}')
+                self.durations_loaded = False
+
+        return bool(self.durations_loaded)
+
+    @pytest.hookimpl(trylast=True)
+    def pytest_collection_modifyitems(self, session, config, items) -> None:
+        """Create testrail test run."""
+        with self.profiler.measure('collection'), self.tracer.span('collection'):
+            with self.profiler.measure('collection.get_testrail_keys'):
+                items_with_tr_keys = get_testrail_keys(items)
+
+            if self.case_index is not None:
+                with self.profiler.measure('collection.case_index'):
+                    items_with_tr_keys = self.check_case_ids(items_with_tr_keys)
+
+            tr_keys = [case_id for item in items_with_tr_keys for case_id in item[1]]
+
+            # Checks on the testrun or testplan ran in the background during collection.
+            if not self.configuration_checked() and not os.getenv('PYTEST_XDIST_WORKER'):
+                # Workers leave it to the xdist controller, which runs the same checks.
+                raise pytest.UsageError(self.configuration_error)
+
+            if self.shard_artifact:
+                # The testrun is created once, by the merge command.
+                self.shard_case_ids = tr_keys
+
+            if self.testrun_id:
+                self.testplan_id = 0
+
+                if self.rerun_failed:
+                    with self.profiler.measure('collection.rerun_failed'):
+                        items_with_tr_keys = self.deselect_items(
+                            config,
+                            items,
+                            items_with_tr_keys,
+                            self.controller.get_cases_with_status(
+                                self.testrun_id, RERUN_STATUSES,
+                            ),
+                            keep_unmarked=False,
+                        )
+
+                elif self.deselect_missing:
+                    with self.profiler.measure('collection.deselect_missing'):
+                        items_with_tr_keys = self.deselect_items(
+                            config, items, items_with_tr_keys, self.get_run_case_ids(),
+                        )
+
+                elif self.skip_missing:
+                    with self.profiler.measure('collection.skip_missing'):
+                        self.skip_missing_items(items_with_tr_keys)
+
+            # No testplan_id, no testrun_id
+            elif not self.shard_artifact:
+                self.start_testrun_creation(config, tr_keys)
+
+            if self.duration_index is not None:
+                with self.profiler.measure('collection.order_by_duration'):
+                    self.order_by_duration(items, items_with_tr_keys)
+
+        self.memory_report.sample('collection')
 
     @pytest.hookimpl(tryfirst=True, hookwrapper=True)
     def pytest_runtest_makereport(
@@ -177,66 +537,477 @@ class PyTestRailPlugin:
     ) -> Generator:
         """Collect result and associated TestRail cases of an execution."""
         outcome = yield
-        rep = outcome.get_result()
-        defectids = None
 
-        if 'callspec' in dir(item):
-            test_parametrize = item.callspec.params
-        else:
-            test_parametrize = None
-
-        comment = rep.longrepr
-
-        defect_ids_marker = item.get_closest_marker(self.defect_ids_mark)
-        if defect_ids_marker:
-            defectids = defect_ids_marker.args
-
-        case_id_marker = item.get_closest_marker(self.case_id_mark)
-        if case_id_marker:
-            testcaseids = case_id_marker.args
-
-            if rep.when == 'call' and testcaseids:
-                defects = None
-
-                if defectids:
-                    defects = str(clean_test_defects(defectids))
-                    defects = defects.replace('[', '').replace(']', '').replace("'", '')
-
-                for test_id in clean_test_ids(testcaseids):
-                    data = ResultItem(
-                        test_name=item.name,
-                        case_id=test_id,
-                        status_id=outcome.get_result().outcome,
-                        duration=rep.duration,
-                        comment=comment,
-                        defects=defects,
-                        test_parametrize=test_parametrize,
-                        timestamp=time.time(),
-                    )
+        with self.profiler.measure('makereport'):
+            rep = outcome.get_result()
+            self.add_result(item, rep)
+
+            # Files can be registered until teardown is finished.
+            if rep.when == 'teardown':
+                self.add_attachments(item)
+
+    def add_result(self, item: pytest.Item, rep: pytest.TestReport) -> None:
+        """Add the result of a test's call phase, if the test has TestRail cases."""
+        if rep.when != 'call':
+            return
+
+        metadata = get_item_metadata(item)
+        if not metadata:
+            return
+
+        # Only keep the part of the traceback that can be published.
+        comment = capture_comment(
+            rep.longrepr,
+            comment_capture_size(self.controller.comment_size_limit),
+            compress=self.compress_comments,
+        )
+
+        for test_id in metadata.case_ids:
+            data = ResultItem(
+                test_name=item.name,
+                case_id=test_id,
+                status_id=rep.outcome,
+                duration=rep.duration,
+                comment=comment,
+                defects=metadata.defects,
+                test_parametrize=metadata.test_parametrize,
+                timestamp=time.time(),
+            )
+
+            self.results.append(data)
+
+            if self.flusher is not None:
+                self.case_result_counts[test_id] = self.case_result_counts.get(test_id, 0) + 1
+                if data.status_id == 'failed':
+                    self.flusher.add(data)
+
+    def send_failures(self, items: List[ResultItem]) -> None:
+        """Send failed results before the end of the session."""
+        if not self.wait_for_testrun():
+            raise RuntimeError(f'Testrun could not be created: {self.testrun_error!r}')
+
+        with self.tracer.span('flush_failures', result_count=len(items)):
+            self.controller.upload_results_to_testrail(Results(items), quiet=True)
+
+    def stop_flushing(self) -> List[int]:
+        """Wait for the failed results being sent early.
+
+        Returns:
+            The case ids whose every result was sent early. They are not sent again.
+            Other cases are sent in full, so their newest result is still sent last.
+        """
+        if self.flusher is None:
+            return []
+
+        self.flusher.close()
 
-                    self.results.append(data)
+        sent = sum(self.flusher.flushed.values())
+        if sent:
+            self.publish_summary.append(
+                f'{self._process_name()}: {sent} failed results sent while tests ran',
+            )
+
+        return [
+            case_id for case_id, count in self.flusher.flushed.items()
+            if count == self.case_result_counts.get(case_id)
+        ]
+
+    def add_attachments(self, item: pytest.Item) -> None:
+        """Keep the files registered for an item, if the item has TestRail cases."""
+        paths = item.stash.get(attachments_key, None)
+        if not paths:
+            return
+
+        # Reruns of the item register their own files.
+        del item.stash[attachments_key]
+
+        metadata = get_item_metadata(item)
+        if not metadata:
+            return
+
+        for case_id in metadata.case_ids:
+            self.attachments.setdefault((case_id, item.name), []).extend(paths)
 
     def pytest_sessionfinish(self, session, exitstatus) -> None:
         """Publish results in TestRail."""
+        self.memory_report.sample('before_upload')
+
+        with self.profiler.measure('sessionfinish'), self.tracer.span('sessionfinish'):
+            self.publish()
+
+        self.memory_report.sample('final')
+
+        # Send this worker's measurements to the xdist controller.
+        workeroutput = getattr(session.config, 'workeroutput', None)
+        if isinstance(workeroutput, dict):
+            workeroutput['testrail_metrics'] = self.metrics.as_dict()
+            workeroutput['testrail_profile'] = self.profiler.as_dict()
+            workeroutput['testrail_trace'] = self.tracer.events
+            workeroutput['testrail_publish_summary'] = self.publish_summary
+            if self.memory_report.samples:
+                workeroutput['testrail_memory'] = self.memory_report.as_dict()
+
+    def configuration_checked(self) -> bool:
+        """Wait for the checks on the testrun or testplan running in the background.
+
+        Every process starts them, including the xdist controller, which
+        doesn't collect tests. An error is kept in configuration_error.
+
+        Returns:
+            True if the checks passed.
+        """
+        if self.configuration_error is not None:
+            return False
+
+        try:
+            self.controller.wait_until_ready()
+        except Exception as error:
+            self.configuration_error = f'TestRail configuration check failed: {error}'
+            return False
+
+        return True
+
+    def publish(self) -> None:
+        """Upload results, then close the testrun or testplan if needed.
+
+        With a daemon_socket, results are handed off to the uploader daemon.
+        If finish_budget is set, results not sent when it runs out are
+        written to a spool file and the testrun or testplan is left open.
+        """
         xdist_worker = os.getenv('PYTEST_XDIST_WORKER')
         xdist_worker_count: Optional[str] = os.getenv('PYTEST_XDIST_WORKER_COUNT')
 
-        if self.results:
-            self.controller.upload_results_to_testrail(self.results)
+        if self.shard_artifact:
+            self.write_shard_artifact()
+
+        elif self.finish_budget:
+            self.controller.deadline = time.monotonic() + self.finish_budget
+
+        # Reported once, by the process that didn't raise it at collection.
+        configuration_error = self.configuration_error
+        if not self.configuration_checked():
+            if configuration_error is None and not os.getenv('PYTEST_XDIST_WORKER'):
+                warnings.warn(pytest.PytestWarning(self.configuration_error))
+
+            if self.results and not self.shard_artifact:
+                try:
+                    self.spool_results(self.results.iter_sorted(), str(self.configuration_error))
+                finally:
+                    self.results.cleanup()
+
+            self.finish_session()
+            return
+
+        # xdist workers must not exit before the testrun is in the store.
+        testrun_exists = self.wait_for_testrun(
+            timeout=self.controller.time_left() if self.finish_budget else None,
+        )
+
+        flushed = self.stop_flushing()
+        # Every result was sent while tests ran.
+        all_flushed = bool(flushed) and len(flushed) == len(self.case_result_counts)
+
+        if self.results and not self.shard_artifact:
+            try:
+                if not testrun_exists and self.testrun_timed_out:
+                    # The testrun can still be created, its id is kept if it already was.
+                    self.spool_results(
+                        self.results.iter_sorted(),
+                        'Testrun not created within the finish budget',
+                        run_id=self._testrun_id or None,
+                    )
+                elif not testrun_exists:
+                    self.spool_results(
+                        self.results.iter_sorted(),
+                        f'Testrun could not be created: {self.testrun_error!r}',
+                    )
+                elif all_flushed or not self.hand_off_results(exclude_case_ids=flushed):
+                    if not all_flushed:
+                        self.controller.upload_results_to_testrail(
+                            self.results, exclude_case_ids=flushed,
+                        )
+                    # Results sent early have their ids too.
+                    if self.attachments:
+                        self.controller.upload_attachments(self.attachments)
+                    self.report_publishing()
+            finally:
+                self.results.cleanup()
 
         # pytest-xdist not installed or master session finished
         if not xdist_worker and not xdist_worker_count:
-            if self.close_on_complete:
-                # Don't rely on the class, always fetch from the store.
-                current_store = self.store.get_all()
-                self.controller.close_testrail(
-                    run_id=current_store.get('run_id'),
-                    plan_id=current_store.get('plan_id'),
-                )
+            if self.close_on_complete and not self.shard_artifact:
+                self.close()
 
+        self.finish_session()
+
+    def finish_session(self) -> None:
+        """Remove the store and write the metrics and trace, once every process is done."""
+        # pytest-xdist not installed or master session finished
+        if not os.getenv('PYTEST_XDIST_WORKER') and not os.getenv('PYTEST_XDIST_WORKER_COUNT'):
             # Remove store files when tests are complete.
             self.store.clear()
 
+            if self.metrics_json:
+                self.metrics.write_json(self.metrics_json)
+
+            if self.trace_path:
+                self.tracer.write(self.trace_path, self.trace_format)
+
+    def close(self) -> None:
+        """Close the testrun or testplan, if there is time left in the finish budget."""
+        # Don't rely on the class, always fetch from the store.
+        current_store = self.store.get_all()
+        run_id = current_store.get('run_id')
+        plan_id = current_store.get('plan_id')
+
+        name = f'testrun {run_id}' if run_id else f'testplan {plan_id}'
+        not_closed = f'{self._process_name()}: {name} not closed, finish budget exceeded'
+
+        if self.finish_budget and self.controller.deadline_passed():
+            self.publish_summary.append(not_closed)
+            return
+
+        # The daemon closes it once the results it holds are published.
+        if self.daemon_socket and self._hand_off({'close': True}, [], run_id, plan_id):
+            return
+
+        try:
+            with self.profiler.measure('sessionfinish.close'):
+                self.controller.close_testrail(run_id=run_id, plan_id=plan_id)
+        except requests.Timeout:
+            if not self.finish_budget:
+                raise
+
+            self.publish_summary.append(not_closed)
+
+    def _hand_off(
+        self,
+        header: Dict[str, Any],
+        results: Iterable[ResultItem],
+        run_id: Optional[int],
+        plan_id: Optional[int],
+    ) -> Optional[int]:
+        """Send results to the uploader daemon.
+
+        Returns:
+            The number of results sent, or None if the daemon could not be reached.
+        """
+        header = {
+            'run_id': run_id or None,
+            'plan_id': None if run_id else (plan_id or None),
+            'version': self.controller.version,
+            'custom_comment': self.controller.custom_comment,
+            'publish_blocked': self.controller.publish_blocked,
+            **header,
+        }
+
+        try:
+            return hand_off(self.daemon_socket, header, results)  # type: ignore
+        except OSError as error:
+            self.logger.warning(
+                f'Uploader daemon at {self.daemon_socket} not used, publishing directly: {error}',
+            )
+            return None
+
+    def hand_off_results(self, exclude_case_ids: Optional[List[int]] = None) -> bool:
+        """Send results to the uploader daemon instead of publishing them.
+
+        Results with attachments are always published directly, the
+        attachments need the ids of the new results.
+
+        Arguments:
+            exclude_case_ids: Cases whose results are not sent.
+
+        Returns:
+            bool: False if the results must be published directly.
+        """
+        if not self.daemon_socket or self.attachments:
+            return False
+
+        count = self._hand_off(
+            {},
+            self.results.iter_sorted(exclude_case_ids=exclude_case_ids),
+            self.testrun_id,
+            self.testplan_id,
+        )
+        if count is None:
+            return False
+
+        self.publish_summary.append(
+            f'{self._process_name()}: {count} results handed off to {self.daemon_socket}',
+        )
+        return True
+
+    @staticmethod
+    def _process_name() -> str:
+        """Get the name of this process in the publishing summary."""
+        return os.getenv('PYTEST_XDIST_WORKER', 'controller')
+
+    def report_publishing(self) -> None:
+        """Add what was published to the summary, and spool what was deferred."""
+        if self.finish_budget:
+            for run_id, count in sorted(self.controller.published.items()):
+                self.publish_summary.append(
+                    f'{self._process_name()}: {count} results published to testrun {run_id}',
+                )
+
+        reason = f'finish budget of {self.finish_budget}s exceeded'
+        for run_id, results in self.controller.deferred.items():
+            try:
+                self.spool_results(results.iter_sorted(), reason, run_id=run_id)
+            finally:
+                results.cleanup()
+
+        self.controller.deferred = {}
+
+    def spool_results(
+        self,
+        results: Iterable[ResultItem],
+        reason: str,
+        run_id: Optional[int] = None,
+    ) -> None:
+        """Write results to a spool file, so they can be published later.
+
+        Arguments:
+            results: Results to write, sorted for publishing.
+            reason: Why the results were not published.
+            run_id: Testrun the results are for. If not given, the results
+                are for the testplan, or for no testrun if there is none.
+        """
+        path = default_spool_path(str(self.config.invocation_params.dir), run_id)
+        header = {
+            'run_id': run_id,
+            'plan_id': None if run_id else (self.testplan_id or None),
+            'reason': reason,
+            'version': self.controller.version,
+            'custom_comment': self.controller.custom_comment,
+            'publish_blocked': self.controller.publish_blocked,
+        }
+        count = write_spool(path, results, header)
+
+        message = f'{count} results deferred to {path}: {reason}'
+        self.publish_summary.append(f'{self._process_name()}: {message}')
+        self.logger.error(message)
+
+    def write_shard_artifact(self) -> None:
+        """Write this shard's results, and what is needed to create its testrun, to a file."""
+        # The xdist controller neither collects nor runs tests.
+        if self.shard_artifact is None or not (self.results or self.shard_case_ids):
+            return
+
+        path = shard_artifact_path(self.shard_artifact)
+        header = {
+            'shard': True,
+            'run_id': self._testrun_id or None,
+            'plan_id': self.testplan_id or None,
+            'project_id': self.project_id,
+            'suite_id': self.suite_id,
+            'assign_user_id': self.assign_user_id,
+            'milestone_id': self.milestone_id,
+            'testrun_name': self.controller.testrun_name,
+            'description': self.testrun_description,
+            'include_all': self.controller.include_all,
+            'case_ids': self.shard_case_ids,
+            'version': self.controller.version,
+            'custom_comment': self.controller.custom_comment,
+            'publish_blocked': self.controller.publish_blocked,
+        }
+
+        try:
+            count = write_spool(path, self.results.iter_sorted(), header)
+        finally:
+            self.results.cleanup()
+
+        message = f'{count} results written to shard artifact {path}'
+        self.publish_summary.append(f'{self._process_name()}: {message}')
+        self.logger.info(message)
+
+    @pytest.hookimpl(optionalhook=True)
+    def pytest_configure_node(self, node) -> None:
+        """Send the durations used to order tests to a pytest-xdist worker."""
+        if self.duration_index is None:
+            return
+
+        worker_durations = None
+        if self.load_durations():
+            worker_durations = {
+                str(case_id): duration
+                for case_id, duration in self.duration_index.durations.items()
+            }
+
+        node.workerinput['testrail_durations'] = worker_durations
+
+    @pytest.hookimpl(optionalhook=True)
+    def pytest_testnodedown(self, node, error) -> None:
+        """Collect the measurements of a finished pytest-xdist worker."""
+        workeroutput = getattr(node, 'workeroutput', {})
+
+        worker_metrics = workeroutput.get('testrail_metrics')
+        if worker_metrics:
+            self.metrics.merge(worker_metrics)
+
+        worker_profile = workeroutput.get('testrail_profile')
+        if worker_profile:
+            self.profiler.merge(worker_profile)
+
+        worker_trace = workeroutput.get('testrail_trace')
+        if worker_trace:
+            self.tracer.merge(worker_trace)
+
+        self.publish_summary.extend(workeroutput.get('testrail_publish_summary', []))
+
+        worker_memory = workeroutput.get('testrail_memory')
+        if worker_memory:
+            self.worker_memory[node.gateway.id] = worker_memory
+
+    def pytest_terminal_summary(self, terminalreporter, exitstatus, config) -> None:
+        """Add publishing, TestRail API metrics and plugin profile to the terminal summary."""
+        if self.publish_summary:
+            terminalreporter.write_sep('-', 'pytest-testrail publishing')
+            for line in sorted(self.publish_summary):
+                terminalreporter.write_line(line)
+
+        if self.metrics:
+            terminalreporter.write_sep('-', 'TestRail API metrics')
+            for line in self.metrics.summary_lines():
+                terminalreporter.write_line(line)
+
+        if self.profiler:
+            outcomes = ('passed', 'failed', 'skipped', 'error', 'xfailed', 'xpassed')
+            test_count = sum(len(terminalreporter.stats.get(key, [])) for key in outcomes)
+
+            terminalreporter.write_sep('-', 'pytest-testrail profile')
+            lines = self.profiler.summary_lines(
+                test_count=test_count,
+                session_duration=time.perf_counter() - self.session_start,
+            )
+            for line in lines:
+                terminalreporter.write_line(line)
+
+        memory_reports = dict(self.worker_memory)
+        if self.memory_report.samples:
+            memory_reports = {'controller': self.memory_report.as_dict(), **memory_reports}
+
+        for name, data in memory_reports.items():
+            terminalreporter.write_sep('-', f'pytest-testrail memory ({name})')
+            for line in MemoryReport.summary_lines(data):
+                terminalreporter.write_line(line)
+
+    def pytest_unconfigure(self, config) -> None:
+        """Stop memory tracing and write any queued log records."""
+        self.memory_report.stop()
+        if self.queue_logging is not None:
+            stop_logging(self.queue_logging)
+
+
+@pytest.fixture
+def testrail_attach(request: pytest.FixtureRequest) -> Callable[[str], None]:
+    """Register files to attach to the TestRail result of the current test."""
+    def attach(path: str) -> None:
+        add_attachment(request.node, path)
+
+    return attach
+
 
 def pytest_addoption(parser: Parser) -> None:
     """Add plugin options."""
@@ -314,6 +1085,25 @@ def pytest_addoption(parser: Parser) -> None:
         default=30.0,
     )
 
+    add(
+        '--tr-cache',
+        help_msg=(
+            'Keep responses from read-only TestRail endpoints in a persistent cache'
+            ' shared by every session.'
+        ),
+        ini_type='bool',
+        action='store_true',
+        required=False,
+    )
+
+    add(
+        '--tr-cache-clear',
+        help_msg='Remove every cached response and case index before the session starts.',
+        ini_type='bool',
+        action='store_true',
+        required=False,
+    )
+
     add(
         '--tr-no-ssl-cert-check',
         help_msg='Do not check for valid SSL certificate on TestRail host.',
@@ -394,6 +1184,40 @@ def pytest_addoption(parser: Parser) -> None:
         required=False,
     )
 
+    add(
+        '--tr-validate-case-ids',
+        help_msg=(
+            'Check case ids from markers against a local index of the suite\'s cases'
+            ' and warn about unknown ones.'
+        ),
+        ini_type='bool',
+        action='store_true',
+        required=False,
+    )
+
+    add(
+        '--tr-order-by-duration',
+        help_msg=(
+            'ID of a testrun whose results give the time each case takes.'
+            ' Tests are run longest first. Durations are cached for a day.'
+        ),
+        opt_type=int,
+        ini_type='string',
+        action='store',
+        required=False,
+    )
+
+    add(
+        '--tr-drop-unknown-case-ids',
+        help_msg=(
+            'Remove case ids that are not in the suite from the testrun and results.'
+            ' Implies --tr-validate-case-ids.'
+        ),
+        ini_type='bool',
+        action='store_true',
+        required=False,
+    )
+
     add(
         '--tr-skip-missing',
         help_msg=(
@@ -404,6 +1228,28 @@ def pytest_addoption(parser: Parser) -> None:
         required=False,
     )
 
+    add(
+        '--tr-deselect-missing',
+        help_msg=(
+            'Deselect pytest test functions with marks that are not present in a specified'
+            ' testrun, so they are not run or reported. Takes precedence over --tr-skip-missing.'
+        ),
+        ini_type='bool',
+        action='store_true',
+        required=False,
+    )
+
+    add(
+        '--tr-rerun-failed',
+        help_msg=(
+            'Only run pytest test functions with marks that are failed, retest or untested'
+            ' in the testrun given by --tr-run-id. Other test functions are deselected.'
+        ),
+        ini_type='bool',
+        action='store_true',
+        required=False,
+    )
+
     # Testplan
     add(
         '--tr-plan-id',
@@ -455,6 +1301,166 @@ def pytest_addoption(parser: Parser) -> None:
         required=False,
     )
 
+    add(
+        '--tr-finish-budget',
+        help_msg=(
+            'Seconds allowed for publishing results and closing the testrun.'
+            ' Results not sent in time are written to a spool file. 0 has no limit.'
+        ),
+        opt_type=float,
+        ini_type='string',
+        action='store',
+        default=0,
+        required=False,
+    )
+
+    add(
+        '--tr-shard-artifact',
+        help_msg=(
+            'Write results to this file instead of publishing them.'
+            ' Artifacts of every shard are published at once by "pytest-testrail merge".'
+        ),
+        opt_type=str,
+        ini_type='string',
+        action='store',
+        default=None,
+        required=False,
+    )
+
+    add(
+        '--tr-daemon-socket',
+        help_msg=(
+            'Unix socket of a "pytest-testrail daemon". Results are handed off to it'
+            ' instead of being published by this session.'
+        ),
+        opt_type=str,
+        ini_type='string',
+        action='store',
+        default=None,
+        required=False,
+    )
+
+    add(
+        '--tr-flush-failures',
+        help_msg=(
+            'Send failed results while tests run, in small batches.'
+            ' Other results are sent at the end of the session.'
+        ),
+        ini_type='bool',
+        action='store_true',
+        default=None,
+        required=False,
+    )
+
+    add(
+        '--tr-upload-chunk-size',
+        help_msg='Maximum number of results sent in one request. 0 sends every result at once.',
+        opt_type=int,
+        ini_type='string',
+        action='store',
+        default=0,
+        required=False,
+    )
+
+    add(
+        '--tr-attachment-workers',
+        help_msg='Number of attachments uploaded at the same time.',
+        opt_type=int,
+        ini_type='string',
+        action='store',
+        default=4,
+        required=False,
+    )
+
+    add(
+        '--tr-max-attachment-size',
+        help_msg='Largest file, in MiB, uploaded as an attachment. Larger files are skipped.',
+        opt_type=int,
+        ini_type='string',
+        action='store',
+        default=256,
+        required=False,
+    )
+
+    add(
+        '--tr-spill-threshold',
+        help_msg=(
+            'Number of results held in memory before they are written to temporary files.'
+            ' 0 keeps every result in memory.'
+        ),
+        opt_type=int,
+        ini_type='string',
+        action='store',
+        default=0,
+        required=False,
+    )
+
+    add(
+        '--tr-metrics-json',
+        help_msg='Write TestRail API request metrics to a JSON file.',
+        opt_type=str,
+        ini_type='string',
+        action='store',
+        default=None,
+        required=False,
+    )
+
+    add(
+        '--tr-profile',
+        help_msg='Measure the time spent in the plugin and show it in the terminal summary.',
+        ini_type='bool',
+        action='store_true',
+        required=False,
+    )
+
+    add(
+        '--tr-trace',
+        help_msg='Write spans of the plugin\'s activity to a trace file.',
+        opt_type=str,
+        ini_type='string',
+        action='store',
+        default=None,
+        required=False,
+    )
+
+    add(
+        '--tr-trace-format',
+        help_msg='Format of the trace file: "chrome" (Perfetto, chrome://tracing) or "otlp".',
+        opt_type=str,
+        ini_type='string',
+        action='store',
+        default='chrome',
+        required=False,
+        choices=TRACE_FORMATS,
+    )
+
+    add(
+        '--tr-memory-report',
+        help_msg=(
+            'Trace memory allocated by the plugin with tracemalloc'
+            ' and show it in the terminal summary.'
+        ),
+        ini_type='bool',
+        action='store_true',
+        required=False,
+    )
+
+    add(
+        '--tr-columnar-results',
+        help_msg='Hold results in typed columns instead of one object per result.',
+        ini_type='bool',
+        action='store_true',
+        required=False,
+    )
+
+    add(
+        '--tr-compress-comments',
+        help_msg='Compress failure comments in memory until they are published.',
+        ini_type='bool',
+        action='store_true',
+        required=False,
+    )
+
 
 def pytest_configure(config: Config) -> None:  # noqa D103
     # Register marks
@@ -489,11 +1495,41 @@ def pytest_configure(config: Config) -> None:  # noqa D103
         if not tr_email or not tr_password:
             pytest.exit('TestRail credentials are required.', returncode=4)
 
+        # xdist workers start after the controller cleared the cache.
+        cache_clear = config_manager.get('--tr-cache-clear', 'tr_cache_clear')
+        if cache_clear and not os.getenv('PYTEST_XDIST_WORKER'):
+            clear_cache()
+
+        use_cache = config_manager.get('--tr-cache', 'tr_cache')
+        response_cache = ResponseCache() if use_cache else None
+
+        # Start tracing as early as possible.
+        memory_report = MemoryReport(
+            enabled=cast(bool, config_manager.get('--tr-memory-report', 'tr_memory_report')),
+        )
+        memory_report.start()
+
+        metrics = Metrics()
+
+        trace_path = config_manager.get('--tr-trace', 'tr_trace')
+        trace_path = cast(str, trace_path)
+
+        trace_format = config_manager.get('--tr-trace-format', 'tr_trace_format')
+        trace_format = cast(str, trace_format)
+
+        tracer = Tracer(
+            enabled=bool(trace_path),
+            lane=os.getenv('PYTEST_XDIST_WORKER', 'controller'),
+        )
+
         client = _TestRailAPI(
             base_url=tr_url,
             auth=(tr_email, tr_password),
             timeout=tr_timeout,
             verify=cert_check,
+            metrics=metrics,
+            tracer=tracer,
+            cache=response_cache,
         )
 
         assign_user_id = config_manager.get(
@@ -565,6 +1601,109 @@ def pytest_configure(config: Config) -> None:  # noqa D103
         skip_missing = config_manager.get('--tr-skip-missing')
         skip_missing = cast(bool, skip_missing)
 
+        deselect_missing = config_manager.get(
+            '--tr-deselect-missing',
+            'tr_deselect_missing',
+        )
+        deselect_missing = cast(bool, deselect_missing)
+
+        rerun_failed = config_manager.get(
+            '--tr-rerun-failed',
+            'tr_rerun_failed',
+        )
+        rerun_failed = cast(bool, rerun_failed)
+
+        drop_unknown_case_ids = config_manager.get(
+            '--tr-drop-unknown-case-ids',
+            'tr_drop_unknown_case_ids',
+        )
+        drop_unknown_case_ids = cast(bool, drop_unknown_case_ids)
+
+        validate_case_ids = config_manager.get(
+            '--tr-validate-case-ids',
+            'tr_validate_case_ids',
+        )
+        case_index = None
+        if validate_case_ids or drop_unknown_case_ids:
+            case_index = CaseIndex(client, project_id, suite_id)
+
+        duration_run_id = config_manager.get(
+            '--tr-order-by-duration',
+            'tr_order_by_duration',
+        )
+        duration_index = None
+        if duration_run_id:
+            duration_index = DurationIndex(client, int(cast(int, duration_run_id)))
+
+        compress_comments = config_manager.get(
+            '--tr-compress-comments',
+            'tr_compress_comments',
+        )
+        compress_comments = cast(bool, compress_comments)
+
+        upload_chunk_size = config_manager.get(
+            '--tr-upload-chunk-size',
+            'tr_upload_chunk_size',
+        )
+        upload_chunk_size = int(cast(int, upload_chunk_size) or 0)
+
+        finish_budget = config_manager.get(
+            '--tr-finish-budget',
+            'tr_finish_budget',
+        )
+        finish_budget = float(cast(float, finish_budget) or 0)
+
+        attachment_workers = config_manager.get(
+            '--tr-attachment-workers',
+            'tr_attachment_workers',
+        )
+        attachment_workers = int(cast(int, attachment_workers) or 1)
+
+        max_attachment_size = config_manager.get(
+            '--tr-max-attachment-size',
+            'tr_max_attachment_size',
+        )
+        max_attachment_size = int(cast(int, max_attachment_size) or 256) * 1024 * 1024
+
+        shard_artifact = config_manager.get(
+            '--tr-shard-artifact',
+            'tr_shard_artifact',
+        )
+        shard_artifact = cast(str, shard_artifact) or None
+
+        daemon_socket = config_manager.get(
+            '--tr-daemon-socket',
+            'tr_daemon_socket',
+        )
+        daemon_socket = cast(str, daemon_socket) or None
+
+        flush_failures = config_manager.get(
+            '--tr-flush-failures',
+            'tr_flush_failures',
+        )
+        flush_failures = cast(bool, flush_failures)
+
+        spill_threshold = config_manager.get(
+            '--tr-spill-threshold',
+            'tr_spill_threshold',
+        )
+        spill_threshold = int(cast(int, spill_threshold) or 0)
+
+        columnar_results = config_manager.get(
+            '--tr-columnar-results',
+            'tr_columnar_results',
+        )
+        columnar_results = cast(bool, columnar_results)
+
+        metrics_json = config_manager.get(
+            '--tr-metrics-json',
+            'tr_metrics_json',
+        )
+        metrics_json = cast(str, metrics_json)
+
+        profile = config_manager.get('--tr-profile', 'tr_profile')
+        profiler = Profiler(enabled=cast(bool, profile))
+
         testrail_controller = _TestRailController(
             client,
             publish_blocked=publish_blocked,
@@ -574,6 +1713,12 @@ def pytest_configure(config: Config) -> None:  # noqa D103
             testrun_name=tr_name,
             testrun_id=run_id,
             testplan_id=plan_id,
+            upload_chunk_size=upload_chunk_size,
+            profiler=profiler,
+            tracer=tracer,
+            background_checks=True,
+            attachment_workers=attachment_workers,
+            max_attachment_size=max_attachment_size,
         )
 
         config.pluginmanager.register(
@@ -591,7 +1736,27 @@ def pytest_configure(config: Config) -> None:  # noqa D103
                 version=version,
                 close_on_complete=close_on_complete,
                 skip_missing=skip_missing,
+                deselect_missing=deselect_missing,
+                rerun_failed=rerun_failed,
                 milestone_id=milestone_id,
+                compress_comments=compress_comments,
+                spill_threshold=spill_threshold,
+                columnar_results=columnar_results,
+                metrics=metrics,
+                metrics_json=metrics_json,
+                profiler=profiler,
+                tracer=tracer,
+                trace_path=trace_path,
+                trace_format=trace_format,
+                memory_report=memory_report,
+                case_index=case_index,
+                drop_unknown_case_ids=drop_unknown_case_ids,
+                duration_index=duration_index,
+                finish_budget=finish_budget,
+                shard_artifact=shard_artifact,
+                daemon_socket=daemon_socket,
+                queue_logging=start_logging(),
+                flush_failures=flush_failures,
             ),
             # Name of plugin instance (allow to be used by other plugins)
             name="pytest-testrail-instance",
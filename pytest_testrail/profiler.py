@@ -0,0 +1,168 @@
+import time
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, TypeVar
+
+T = TypeVar('T')
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    """Get a percentile from sorted samples, using the nearest rank.
+
+    Arguments:
+        samples: Sorted samples.
+        fraction: Percentile to get, between 0 and 1.
+    """
+    if not samples:
+        return 0.0
+
+    index = min(len(samples) - 1, max(0, int(round(fraction * len(samples))) - 1))
+    return samples[index]
+
+
+class _Timer:
+    """Context manager that records the time spent inside it."""
+
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler: 'Profiler', name: str):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self) -> '_Timer':
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.profiler.record(self.name, time.perf_counter() - self.start)
+
+
+class _NullTimer:
+    """Context manager that does nothing. Used when profiling is disabled."""
+
+    __slots__ = ()
+
+    def __enter__(self) -> '_NullTimer':
+        return self
+
+    def __exit__(self, *args) -> None:
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Profiler:
+    """Measure time spent in the plugin's own code.
+
+    Phases are named with dots, ie: 'sessionfinish.post'.
+    Only phases without a dot are counted in the plugin's total time,
+    the others are part of another phase.
+
+    Arguments:
+        enabled: If False, nothing is measured.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.phases: Dict[str, array] = {}
+
+    def __bool__(self) -> bool:
+        """If anything was measured."""
+        return bool(self.phases)
+
+    def measure(self, name: str):
+        """Get a context manager that measures the time spent inside it.
+
+        Arguments:
+            name: Name of the phase being measured.
+        """
+        if not self.enabled:
+            return _NULL_TIMER
+
+        return _Timer(self, name)
+
+    def record(self, name: str, elapsed: float) -> None:
+        """Add one measurement to a phase."""
+        samples = self.phases.get(name)
+        if samples is None:
+            samples = self.phases[name] = array('d')
+
+        samples.append(elapsed)
+
+    def timed_iter(self, name: str, iterable: Iterable[T]) -> Iterator[T]:
+        """Iterate, recording the total time spent getting items as one measurement."""
+        if not self.enabled:
+            yield from iterable
+            return
+
+        iterator = iter(iterable)
+        total = 0.0
+
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    total += time.perf_counter() - start
+                    return
+
+                total += time.perf_counter() - start
+                yield item
+        finally:
+            self.record(name, total)
+
+    def total(self) -> float:
+        """Get the time spent in every top level phase."""
+        return sum(sum(samples) for name, samples in self.phases.items() if '.' not in name)
+
+    def merge(self, data: Dict[str, List[float]]) -> None:
+        """Add measurements from the output of as_dict().
+
+        Used to combine the measurements of pytest-xdist workers.
+        """
+        for name, samples in data.items():
+            self.phases.setdefault(name, array('d')).extend(samples)
+
+    def as_dict(self) -> Dict[str, List[float]]:
+        """Get the measurements in a serializable form."""
+        return {name: samples.tolist() for name, samples in self.phases.items()}
+
+    def summary_lines(
+        self,
+        test_count: int = 0,
+        session_duration: Optional[float] = None,
+    ) -> List[str]:
+        """Get a table of the measurements, one line per phase.
+
+        Arguments:
+            test_count: Number of tests run, used for per-test averages.
+            session_duration: Duration of the pytest session, in seconds.
+        """
+        lines = [
+            f"{'phase':<32}{'calls':>8}{'total (s)':>11}{'per test (ms)':>15}"
+            f"{'p50 (ms)':>10}{'p95 (ms)':>10}{'p99 (ms)':>10}{'max (ms)':>10}",
+        ]
+
+        for name in sorted(self.phases):
+            samples = sorted(self.phases[name])
+            total = sum(samples)
+            per_test = total / test_count * 1000 if test_count else 0.0
+
+            lines.append(
+                f"{name:<32}{len(samples):>8}{total:>11.3f}{per_test:>15.3f}"
+                f"{percentile(samples, 0.5) * 1000:>10.3f}"
+                f"{percentile(samples, 0.95) * 1000:>10.3f}"
+                f"{percentile(samples, 0.99) * 1000:>10.3f}"
+                f"{samples[-1] * 1000:>10.3f}",
+            )
+
+        plugin_total = self.total()
+        summary = f'pytest-testrail total: {plugin_total:.3f}s'
+        if session_duration:
+            share = plugin_total / session_duration * 100
+            summary += f' of {session_duration:.3f}s session ({share:.1f}%)'
+        lines.append(summary)
+
+        return lines
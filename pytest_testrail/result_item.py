@@ -1,8 +1,17 @@
+import sys
 from dataclasses import dataclass
 from typing import List, Optional
 
+from .comment import Comment
 from .status import PYTEST_TO_TESTRAIL_STATUS
 
+TRUNCATED_COMMENT_MSG = 'Log truncated\n...\n'
+
+
+def comment_capture_size(comment_size_limit: int) -> int:
+    """Get how much of a comment must be kept to build a truncated API payload."""
+    return comment_size_limit + len(TRUNCATED_COMMENT_MSG)
+
 
 @dataclass
 class ResultItem:
@@ -17,17 +26,41 @@ class ResultItem:
         defects: TestRail defects field.
         test_parametrize: Parameters used in the test.
         timestamp: Time of when the ResultItem was created.
+
+    Instances use __slots__ instead of a __dict__, and the test name and
+    defects strings are interned, so results from the same test share them.
     """
 
+    __slots__ = (
+        'test_name',
+        'case_id',
+        'status_id',
+        'duration',
+        'comment',
+        'defects',
+        'test_parametrize',
+        'timestamp',
+    )
+
     test_name: str
     case_id: int
     status_id: str
     duration: float
-    comment: Optional[str]
+    comment: Optional[Comment]
     defects: Optional[str]
     test_parametrize: Optional[List[str]]
     timestamp: float
 
+    def __post_init__(self) -> None:
+        """Intern strings that are repeated across results."""
+        self.test_name = sys.intern(self.test_name)
+
+        if isinstance(self.status_id, str):
+            self.status_id = sys.intern(self.status_id)
+
+        if isinstance(self.defects, str):
+            self.defects = sys.intern(self.defects)
+
     @property
     def testrail_status_id(self) -> int:
         """Get the result status in testrail format.
@@ -82,8 +115,8 @@ class ResultItem:
 
         # Truncate comment if necessary.
         # Indent text to avoid string formatting by TestRail.
-        truncated_msg = 'Log truncated\n...\n'
-        truncate_amount = len(truncated_msg) + comment_size_limit
+        truncated_msg = TRUNCATED_COMMENT_MSG
+        truncate_amount = comment_capture_size(comment_size_limit)
 
         truncated_comment = _comment[-truncate_amount:].replace('\n', '\n    ')
 
@@ -0,0 +1,226 @@
+import math
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .comment import Comment
+from .result_item import ResultItem
+from .status import PYTEST_TO_TESTRAIL_STATUS
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+
+class _ValueTable:
+    """Store each distinct value once and refer to it by index.
+
+    Unhashable values, such as parametrize dicts, are matched by identity.
+    """
+
+    def __init__(self):
+        self.values: List[Any] = []
+        self._indexes: Dict[Tuple[Any, Any], int] = {}
+
+    def add(self, value: Any) -> int:
+        """Get the index of a value, adding it to the table if needed."""
+        try:
+            key: Tuple[Any, Any] = (type(value), value)
+            index = self._indexes.get(key)
+        except TypeError:
+            key = (id, id(value))
+            index = self._indexes.get(key)
+
+        if index is None:
+            index = len(self.values)
+            self.values.append(value)
+            self._indexes[key] = index
+
+        return index
+
+
+class ResultTable:
+    """Columnar storage for test results.
+
+    case_id, status, duration and timestamp are held in typed arrays.
+    Test names, defects and parametrize info are held once in value tables,
+    and each result only stores their index.
+
+    Indexing a ResultTable returns a ResultItem built from the columns.
+    Sorting and filtering work on indexes, numpy is used if it is installed.
+    """
+
+    def __init__(self, initlist: Optional[Iterable[ResultItem]] = None):
+        self.case_ids = array('q')
+        self.status_ids = array('B')
+        self.durations = array('d')
+        self.timestamps = array('d')
+        self.name_ids = array('L')
+        self.defects_ids = array('L')
+        self.parametrize_ids = array('L')
+        self.comments: List[Optional[Comment]] = []
+
+        self._names = _ValueTable()
+        self._statuses = _ValueTable()
+        self._defects = _ValueTable()
+        self._parametrize = _ValueTable()
+
+        for item in initlist or []:
+            self.append(item)
+
+    def __len__(self) -> int:
+        """Count results in the table."""
+        return len(self.case_ids)
+
+    def __getitem__(self, index: int) -> ResultItem:
+        """Get a ResultItem for one row of the table."""
+        duration = self.durations[index]
+
+        return ResultItem(
+            test_name=self._names.values[self.name_ids[index]],
+            case_id=self.case_ids[index],
+            status_id=self._statuses.values[self.status_ids[index]],
+            duration=None if math.isnan(duration) else duration,  # type: ignore
+            comment=self.comments[index],
+            defects=self._defects.values[self.defects_ids[index]],
+            test_parametrize=self._parametrize.values[self.parametrize_ids[index]],
+            timestamp=self.timestamps[index],
+        )
+
+    def __iter__(self) -> Iterator[ResultItem]:
+        """Iterate over every row, in the order they were added."""
+        for index in range(len(self)):
+            yield self[index]
+
+    def __eq__(self, other: object) -> bool:
+        """Compare rows against another sequence of results."""
+        try:
+            return list(self) == list(other)  # type: ignore
+        except TypeError:
+            return NotImplemented
+
+    def append(self, item: ResultItem) -> None:
+        """Add a result to the table."""
+        self.case_ids.append(item.case_id)
+        self.status_ids.append(self._statuses.add(item.status_id))
+        self.durations.append(math.nan if item.duration is None else item.duration)
+        self.timestamps.append(item.timestamp)
+        self.name_ids.append(self._names.add(item.test_name))
+        self.defects_ids.append(self._defects.add(item.defects))
+        self.parametrize_ids.append(self._parametrize.add(item.test_parametrize))
+        self.comments.append(item.comment)
+
+    def testrail_status_ids(self) -> List[int]:
+        """Get the TestRail status of every row."""
+        statuses = [PYTEST_TO_TESTRAIL_STATUS[s] for s in self._statuses.values]
+        return [statuses[s] for s in self.status_ids]
+
+    def _name_ranks(self) -> List[int]:
+        """Get the position of each name id when the names are sorted."""
+        names = self._names.values
+        ranks = [0] * len(names)
+        for rank, name_id in enumerate(sorted(range(len(names)), key=names.__getitem__)):
+            ranks[name_id] = rank
+
+        return ranks
+
+    def latest_indexes(self) -> Dict[Tuple[int, int], int]:
+        """Get the newest row of every (case_id, name id) group.
+
+        Ties on timestamp go to the row added last. This collapses reruns.
+        """
+        latest: Dict[Tuple[int, int], int] = {}
+        timestamps = self.timestamps
+
+        for index, group in enumerate(zip(self.case_ids, self.name_ids)):
+            current = latest.get(group)
+            if current is None or timestamps[index] >= timestamps[current]:
+                latest[group] = index
+
+        return latest
+
+    def sorted_indexes(self) -> List[int]:
+        """Get row indexes in the same order as Results._sort()."""
+        if numpy is not None:
+            return self._numpy_sorted_indexes()
+
+        testrail_status_ids = self.testrail_status_ids()
+        group_status = {
+            group: testrail_status_ids[index]
+            for group, index in self.latest_indexes().items()
+        }
+        ranks = self._name_ranks()
+
+        case_ids = self.case_ids
+        name_ids = self.name_ids
+        timestamps = self.timestamps
+
+        return sorted(
+            range(len(self)),
+            key=lambda i: (
+                group_status[(case_ids[i], name_ids[i])],
+                case_ids[i],
+                ranks[name_ids[i]],
+                timestamps[i],
+            ),
+        )
+
+    def _numpy_sorted_indexes(self) -> List[int]:
+        """Get row indexes in the same order as Results._sort(), using numpy."""
+        size = len(self)
+        if not size:
+            return []
+
+        case_ids = numpy.frombuffer(self.case_ids, dtype=numpy.int64)
+        timestamps = numpy.frombuffer(self.timestamps, dtype=numpy.float64)
+        names = numpy.asarray(self._name_ranks(), dtype=numpy.int64)[
+            numpy.asarray(self.name_ids, dtype=numpy.int64)
+        ]
+        statuses = numpy.asarray(self.testrail_status_ids(), dtype=numpy.int64)
+        rows = numpy.arange(size)
+
+        # Sort by group, then timestamp, then order added.
+        order = numpy.lexsort((rows, timestamps, names, case_ids))
+
+        # The last row of each group is the newest one.
+        sorted_case_ids = case_ids[order]
+        sorted_names = names[order]
+        group_start = numpy.empty(size, dtype=bool)
+        group_start[0] = True
+        group_start[1:] = sorted_case_ids[1:] != sorted_case_ids[:-1]
+        group_start[1:] |= sorted_names[1:] != sorted_names[:-1]
+        group_ids = numpy.cumsum(group_start) - 1
+        group_ends = numpy.append(numpy.flatnonzero(group_start)[1:], size) - 1
+        group_status = statuses[order][group_ends][group_ids]
+
+        return order[numpy.argsort(group_status, kind='stable')].tolist()
+
+    def filter_indexes(
+        self,
+        indexes: Iterable[int],
+        exclude_case_ids: Optional[Iterable[int]] = None,
+        testrail_status_id: Optional[int] = None,
+    ) -> List[int]:
+        """Filter row indexes by case_id and status.
+
+        Arguments:
+            indexes: Row indexes to filter.
+            exclude_case_ids: Rows with these case ids are removed.
+            testrail_status_id: If given, only rows with this status are kept.
+        """
+        excluded = set(exclude_case_ids or ())
+        case_ids = self.case_ids
+
+        keep_status = None
+        if testrail_status_id is not None:
+            keep_status = {
+                index for index, status in enumerate(self._statuses.values)
+                if PYTEST_TO_TESTRAIL_STATUS[status] == testrail_status_id
+            }
+
+        rv = [i for i in indexes if case_ids[i] not in excluded]
+
+        if keep_status is not None:
+            rv = [i for i in rv if self.status_ids[i] in keep_status]
+
+        return rv
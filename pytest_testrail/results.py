@@ -1,56 +1,256 @@
+import heapq
+import os
+import pickle
+import tempfile
 from collections import UserList
-from itertools import groupby
-from operator import attrgetter
-from typing import List
+from dataclasses import replace
+from typing import Dict, Generator, Iterable, Iterator, List, Optional, Set, Tuple, Union
 
 from .result_item import ResultItem
+from .result_table import ResultTable
+
+# case_id, test_name, timestamp, insertion order
+_SortKey = Tuple[int, str, float, int]
+_Record = Tuple[_SortKey, ResultItem]
+# Newest (timestamp, insertion order, status) of each (case_id, test_name).
+_Latest = Dict[Tuple[int, str], Tuple[float, int, int]]
+
+
+def _update_latest(latest: _Latest, records: Iterable[_Record]) -> None:
+    """Track the newest result of every test in the records."""
+    for (case_id, test_name, timestamp, order), item in records:
+        group = (case_id, test_name)
+        current = latest.get(group)
+        if current is None or (timestamp, order) >= current[:2]:
+            latest[group] = (timestamp, order, item.testrail_status_id)
+
+
+def _read_run(path: str) -> Generator[_Record, None, None]:
+    """Read every record from a spill file, in the order they were written.
+
+    The file is closed when the generator is closed, even if it was not read to the end.
+    """
+    f = open(path, 'rb')
+    try:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
+    finally:
+        f.close()
 
 
 class Results(UserList):
-    """Store ResultItem objects."""
+    """Store ResultItem objects.
+
+    When spill_threshold is set, results are written to temporary files
+    every time that many results are held in memory. Each file is written
+    already sorted. iter_sorted() then merges the files, so the sorted
+    results can be streamed without holding all of them in memory.
+
+    When columnar is set, results are held in a ResultTable instead of a
+    list of ResultItem objects.
+
+    Arguments:
+        initlist: Initial ResultItem objects.
+        spill_threshold: Number of results held in memory before
+            spilling to disk. 0 disables spilling.
+        spill_dir: Directory for the temporary files.
+        columnar: Hold results in a ResultTable.
+    """
+
+    def __init__(
+        self,
+        initlist: Optional[Iterable[ResultItem]] = None,
+        spill_threshold: int = 0,
+        spill_dir: Optional[str] = None,
+        columnar: bool = False,
+    ):
+        super().__init__()
+        self.spill_threshold = spill_threshold
+        self.spill_dir = spill_dir
+        self.columnar = columnar
+
+        self.data = self._new_data()
+        for item in initlist or []:
+            self.data.append(item)
+
+        self._spill_paths: List[str] = []
+        self._spilled_count = 0
+        self._insertion_count = 0
+
+        self._latest: _Latest = {}
+
+    def __len__(self) -> int:
+        """Count results in memory and on disk."""
+        return len(self.data) + self._spilled_count
+
+    def __iter__(self) -> Iterator[ResultItem]:
+        """Iterate over every result, spilled results first."""
+        for path in self._spill_paths:
+            run = _read_run(path)
+            try:
+                for _key, item in run:
+                    yield item
+            finally:
+                run.close()
+
+        yield from self.data
 
     def append(self, item: ResultItem) -> None:
         """Mimic default list behaviour."""
         self.data.append(item)
 
+        if self.spill_threshold and len(self.data) >= self.spill_threshold:
+            self._spill()
+
+    def _new_data(self) -> Union[List[ResultItem], ResultTable]:
+        """Get an empty container for in-memory results."""
+        if self.columnar:
+            return ResultTable()
+
+        return []
+
+    def empty_copy(self) -> 'Results':
+        """Get an empty Results that spills and stores results like this one."""
+        return Results(
+            spill_threshold=self.spill_threshold,
+            spill_dir=self.spill_dir,
+            columnar=self.columnar,
+        )
+
+    @property
+    def spilled(self) -> bool:
+        """If any results have been written to disk."""
+        return bool(self._spill_paths)
+
+    def _records(self) -> List[_Record]:
+        """Get the in-memory results with their sort key."""
+        offset = self._insertion_count
+        return [
+            ((item.case_id, item.test_name, item.timestamp, offset + index), item)
+            for index, item in enumerate(self.data)
+        ]
+
+    def _spill(self) -> None:
+        """Write the in-memory results to a sorted temporary file."""
+        records = self._records()
+        records.sort(key=lambda record: record[0])
+        _update_latest(self._latest, records)
+
+        fd, path = tempfile.mkstemp(
+            prefix='pytest_testrail_',
+            suffix='.results',
+            dir=self.spill_dir,
+        )
+        with os.fdopen(fd, 'wb') as f:
+            for key, item in records:
+                # Parametrize values may not be picklable, only str() is published.
+                if item.test_parametrize is not None:
+                    item = replace(item, test_parametrize=str(item.test_parametrize))
+                pickle.dump((key, item), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        self._spill_paths.append(path)
+        self._spilled_count += len(records)
+        self._insertion_count += len(records)
+        self.data = self._new_data()
+
+    def cleanup(self) -> None:
+        """Remove every temporary file and forget the spilled results."""
+        for path in self._spill_paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+        self._spill_paths = []
+        self._spilled_count = 0
+        self._latest = {}
+
+    def iter_sorted(
+        self,
+        exclude_case_ids: Optional[Iterable[int]] = None,
+    ) -> Iterator[ResultItem]:
+        """Iterate over results sorted to make sense for TestRail.
+
+        Results are grouped by case_id and test_name. Inside a group, results
+        are in timestamp order, so the newest result of a rerun is published
+        last. Groups are ordered by the status of their newest result, then
+        by case_id and test_name.
+
+        If results were spilled, the spilled files are merged once for every
+        status, so only one result per file is held in memory at a time.
+
+        Arguments:
+            exclude_case_ids: Results with these case ids are skipped.
+        """
+        excluded: Set[int] = set(exclude_case_ids or ())
+
+        if not self.spilled:
+            if isinstance(self.data, ResultTable):
+                indexes = self.data.filter_indexes(
+                    self.data.sorted_indexes(), exclude_case_ids=excluded,
+                )
+                for index in indexes:
+                    yield self.data[index]
+                return
+
+            for item in self._sort_in_memory():
+                if item.case_id not in excluded:
+                    yield item
+            return
+
+        memory_records = self._records()
+        memory_records.sort(key=lambda record: record[0])
+
+        latest = dict(self._latest)
+        _update_latest(latest, memory_records)
+
+        statuses = sorted({status for _, _, status in latest.values()})
+
+        for status in statuses:
+            runs = [_read_run(path) for path in self._spill_paths]
+            try:
+                for (case_id, test_name, _timestamp, _order), item in heapq.merge(
+                    *runs, iter(memory_records), key=lambda record: record[0],
+                ):
+                    if latest[(case_id, test_name)][2] == status and case_id not in excluded:
+                        yield item
+            finally:
+                # Closes the spill files if the caller stopped early.
+                for run in runs:
+                    run.close()
+
     def _sort(self) -> List[ResultItem]:
-        """Sort Pytest results to make sense for TestRail."""
-        # Every result, split by test_name
-        all_split_by_test_name: List[List[ResultItem]] = []
-
-        # First: Sort and split results by case_id
-        results = sorted(self.data, key=attrgetter('case_id'))
-        case_ids = groupby(results, lambda x: x.case_id)
-
-        # For each case_id:
-        for _case_id, cases_by_id in case_ids:
-            _cases_list: List[ResultItem] = list(cases_by_id)
-
-            # Second: Sort and split each case_id group by:
-            #     test_name, secondary sort by timestamp
-            # Handle rare scenario with same id, different test name
-            _cases_list.sort(key=attrgetter('test_name', 'timestamp'))
-
-            # Split by test_name.
-            test_name_group = groupby(_cases_list, lambda x: x.test_name)
-
-            # Third: Sort every test_name group by timestamp
-            #     This handles reruns.
-            #     Newest test is always the last published result
-            for _test_name, cases_by_test_name in test_name_group:
-                test_name_cases_list = list(cases_by_test_name)
-                test_name_cases_list.sort(key=attrgetter('timestamp'))
-
-                all_split_by_test_name.append(test_name_cases_list)
-
-        # Fourth: Sort list of test lists that are split by name.
-        # Now the order is status_id for test_name_groups, timestamp inside
-        all_split_by_test_name.sort(key=lambda x: x[-1].testrail_status_id)
-
-        # Fifth: Flatten list to send to TestRail
-        sorted_results: List[ResultItem] = []
-        for itemlist in all_split_by_test_name:
-            for item in itemlist:
-                sorted_results.append(item)
-
-        return sorted_results
+        """Sort Pytest results to make sense for TestRail, including spilled results."""
+        return list(self.iter_sorted())
+
+    def _sort_in_memory(self) -> List[ResultItem]:
+        """Sort the results held in memory, in the same order as iter_sorted()."""
+        if isinstance(self.data, ResultTable):
+            return [self.data[index] for index in self.data.sorted_indexes()]
+
+        # Newest result of every (case_id, test_name) group.
+        # Ties on timestamp go to the result added last.
+        latest: Dict[Tuple[int, str], ResultItem] = {}
+        for item in self.data:
+            group = (item.case_id, item.test_name)
+            current = latest.get(group)
+            if current is None or item.timestamp >= current.timestamp:
+                latest[group] = item
+
+        group_status = {
+            group: item.testrail_status_id for group, item in latest.items()
+        }
+
+        # sorted() is stable, equal keys stay in the order they were added.
+        return sorted(
+            self.data,
+            key=lambda x: (
+                group_status[(x.case_id, x.test_name)],
+                x.case_id,
+                x.test_name,
+                x.timestamp,
+            ),
+        )
@@ -0,0 +1,122 @@
+import json
+import os
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+from .result_item import ResultItem
+
+SPOOL_VERSION = 1
+
+
+def default_spool_path(directory: str, run_id: Optional[int] = None) -> str:
+    """Get a new spool path for this process.
+
+    Each pytest-xdist worker writes its own spool, one per testrun.
+    An existing spool is never replaced: if the path is taken, a number
+    is added to it, ie: testrail_spool_main_10-2.jsonl.
+    The returned path is created empty, so other sessions can't take it.
+    """
+    worker = os.getenv('PYTEST_XDIST_WORKER', 'main')
+    suffix = f'_{run_id}' if run_id else ''
+    root = os.path.join(directory, f'testrail_spool_{worker}{suffix}')
+
+    path = f'{root}.jsonl'
+    number = 1
+    while True:
+        try:
+            with open(path, 'x'):
+                return path
+        except FileExistsError:
+            number += 1
+            path = f'{root}-{number}.jsonl'
+
+
+def shard_artifact_path(path: str) -> str:
+    """Get the shard artifact path for this process.
+
+    Each pytest-xdist worker writes its own artifact, with the worker's
+    name before the extension.
+    """
+    worker = os.getenv('PYTEST_XDIST_WORKER')
+    if not worker:
+        return path
+
+    root, ext = os.path.splitext(path)
+    return f'{root}-{worker}{ext}'
+
+
+def encode_result(item: ResultItem) -> Dict[str, Any]:
+    """Get a ResultItem as JSON serializable data.
+
+    Only the text of comments and parametrize info is kept,
+    which is all the API payload uses.
+    """
+    return {
+        'test_name': item.test_name,
+        'case_id': item.case_id,
+        'status_id': item.status_id,
+        'duration': item.duration,
+        'comment': str(item.comment) if item.comment else item.comment,
+        'defects': item.defects,
+        'test_parametrize': str(item.test_parametrize) if item.test_parametrize else None,
+        'timestamp': item.timestamp,
+    }
+
+
+def decode_result(data: Dict[str, Any]) -> ResultItem:
+    """Get a ResultItem from the data of encode_result()."""
+    return ResultItem(**data)
+
+
+def write_spool(
+    path: str,
+    results: Iterable[ResultItem],
+    header: Optional[Dict[str, Any]] = None,
+) -> int:
+    """Write results to a spool file, to be published later.
+
+    The first line holds the header, then each line holds one result.
+
+    Arguments:
+        path: Path of the spool file.
+        results: Results to write.
+        header: Extra data about the results, ie: the testrun id.
+
+    Returns:
+        int: Number of results written.
+    """
+    count = 0
+    tmp_path = f'{path}.tmp'
+
+    with open(tmp_path, 'w') as f:
+        f.write(json.dumps({'spool_version': SPOOL_VERSION, **(header or {})}) + '\n')
+
+        for item in results:
+            f.write(json.dumps(encode_result(item)) + '\n')
+            count += 1
+
+    os.replace(tmp_path, path)
+    return count
+
+
+def read_spool(path: str) -> Tuple[Dict[str, Any], Iterator[ResultItem]]:
+    """Read a spool file.
+
+    Returns:
+        The header, and an iterator over the results. Results are read
+        from the file as the iterator is consumed.
+    """
+    with open(path) as f:
+        header: Dict[str, Any] = json.loads(f.readline())
+
+    if header.get('spool_version') != SPOOL_VERSION:
+        raise ValueError(f'Unsupported spool version in {path}: {header.get("spool_version")}')
+
+    def results() -> Iterator[ResultItem]:
+        with open(path) as f:
+            f.readline()
+
+            for line in f:
+                if line.strip():
+                    yield decode_result(json.loads(line))
+
+    return header, results()
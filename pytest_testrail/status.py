@@ -13,3 +13,6 @@ PYTEST_TO_TESTRAIL_STATUS = {
     "failed": TESTRAIL_TEST_STATUS["failed"],
     "skipped": TESTRAIL_TEST_STATUS["blocked"],
 }
+
+# Statuses of the cases run again by --tr-rerun-failed.
+RERUN_STATUSES = ("failed", "retest", "untested")
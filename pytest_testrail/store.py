@@ -1,11 +1,14 @@
 import json
 import os
-from typing import Any, Dict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
 
 from filelock import FileLock
 
 from pytest import Config
 
+from .tracing import Tracer
+
 
 class Store:
     """Handle the storing of JSON data in a file.
@@ -22,10 +25,12 @@ class Store:
 
     Arguments:
         config: pytest.Config instance.
+        tracer: Records how long the lock is waited on.
     """
 
-    def __init__(self, config: Config):
+    def __init__(self, config: Config, tracer: Optional[Tracer] = None):
         self.config = config
+        self.tracer = Tracer() if tracer is None else tracer
 
         self.name = 'store_pytest_testrail2'
 
@@ -35,13 +40,24 @@ class Store:
         # The lock prevents multiple test nodes from read/writing simultaneously
         self.lock = FileLock(f'{self.lock_path}')
 
+    @contextmanager
+    def locked(self) -> Iterator[None]:
+        """Hold the store's lock, recording the time spent waiting for it."""
+        with self.tracer.span('store_lock_wait'):
+            self.lock.acquire()
+
+        try:
+            yield
+        finally:
+            self.lock.release()
+
     def get_all(self) -> Dict[str, Any]:
         """Get a copy of all the data currently in the store.
 
         Returns:
             dict
         """
-        with self.lock:
+        with self.locked():
             if self.file_path.is_file():
                 data: Dict[str, Any] = json.loads(self.file_path.read_text())
                 return data
@@ -62,7 +78,7 @@ class Store:
         """
         stored_value = self.get_all().get(key)
         if not stored_value:
-            with self.lock:
+            with self.locked():
                 data = json.dumps({key: value})
                 self.file_path.write_text(data)
 
@@ -2,17 +2,30 @@ from typing import Any, Dict, List, Optional, Tuple, Union
 
 import inori
 
+import requests
+
+from .cache import ResponseCache
+from .logger import get_logger
+from .metrics import Metrics, MetricsSession
+from .tracing import Tracer
+
+# Number of objects requested per page from paginated routes.
+PAGE_SIZE = 250
+
 
 class _TestRailAPI(inori.Client):
     """Client for the TestRailAPI."""
 
     route_paths = {
+        'add_attachment_to_result/${result_id}',
         'add_results_for_cases/${run_id}',
         'add_run/${project_id}',
         'close_run/${run_id}',
         'close_plan/${plan_id}',
+        'get_cases/${project_id}',
         'get_run/${run_id}',
         'get_plan/${plan_id}',
+        'get_results_for_run/${run_id}',
         'get_tests/${run_id}',
 
     }
@@ -23,14 +36,50 @@ class _TestRailAPI(inori.Client):
         auth=None,
         timeout: Optional[Union[float, Tuple[float, float]]] = 30.0,
         verify: Optional[bool] = True,
+        metrics: Optional[Metrics] = None,
+        tracer: Optional[Tracer] = None,
+        cache: Optional[ResponseCache] = None,
     ):
+        # Routes create their session during Client.__init__()
+        self.metrics = Metrics() if metrics is None else metrics
+        self.tracer = Tracer() if tracer is None else tracer
+        self.cache = cache
+        # Sent with every request that doesn't set its own timeout.
+        self.timeout = timeout
+        self._session: Optional[MetricsSession] = None
+
         super().__init__(f'{base_url}/index.php?/api/v2/', auth)
 
-        self.request_kwargs['timeout'] = timeout
+        # Share the plugin logger instead of the one created by inori.
+        self.logger = get_logger()
+        self.logging.logger = self.logger
+
+        # The timeout is not in request_kwargs, they would replace the one given to a request.
         self.request_kwargs['verify'] = verify
 
         self.headers['Content-Type'] = 'application/json'
 
+    def new_session(self) -> requests.Session:
+        """Get the session shared by every route.
+
+        The session records request metrics and spans, and caches responses.
+        Sharing it lets requests reuse open connections.
+        """
+        if self._session is None:
+            self._session = MetricsSession(
+                self.metrics, self.tracer, self.cache, timeout=self.timeout,
+            )
+
+        return self._session
+
+    def warm_up(self) -> None:
+        """Open a connection to TestRail before the first API request."""
+        self.new_session().warm_up(  # type: ignore
+            self.base_uri,
+            timeout=self.timeout,
+            verify=self.request_kwargs.get('verify', True),
+        )
+
     def validate_response(
         self,
         response: Union[List[Any], Dict[str, Any]],
@@ -53,3 +102,50 @@ class _TestRailAPI(inori.Client):
 
                 if strict:
                     raise Exception(error)
+
+
+def fetch_pages(
+    client: _TestRailAPI,
+    route_name: str,
+    key: str,
+    path_params: Dict[str, Any],
+    params: Optional[Dict[str, Any]] = None,
+    request_kwargs: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    """Get every object from a paginated route, following its next links.
+
+    TestRail 6.7 and later return at most 250 objects per request.
+
+    Arguments:
+        client: TestRail API client.
+        route_name: Name of the route, ie: 'get_tests'.
+        key: Key of the objects in a page, ie: 'tests'.
+        path_params: Parameters of the route's path, ie: {'run_id': 1}.
+        params: Query parameters sent with every page.
+        request_kwargs: Keyword arguments for every request, ie: a timeout.
+    """
+    route = getattr(client, route_name)
+
+    rv: List[Dict[str, Any]] = []
+    offset = 0
+
+    while True:
+        response = route(**path_params).get(
+            params={**(params or {}), 'limit': PAGE_SIZE, 'offset': offset},
+            **(request_kwargs or {}),
+        ).json()
+
+        client.validate_response(response, strict=True)
+
+        # TestRail before 6.7 returns every object as a list.
+        if isinstance(response, list):
+            rv.extend(response)
+            return rv
+
+        page: List[Dict[str, Any]] = response.get(key) or []
+        rv.extend(page)
+
+        if not page or not (response.get('_links') or {}).get('next'):
+            return rv
+
+        offset += len(page)
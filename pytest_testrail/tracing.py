@@ -0,0 +1,236 @@
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+TRACE_FORMATS = ('chrome', 'otlp')
+
+
+def _new_id(size: int) -> str:
+    """Get a random hex id of `size` bytes."""
+    return os.urandom(size).hex()
+
+
+class _Span:
+    """Context manager that records a span when it exits."""
+
+    __slots__ = ('tracer', 'name', 'args', 'start', 'span_id', 'parent_id')
+
+    def __init__(self, tracer: 'Tracer', name: str, args: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+        self.start = 0
+        self.span_id = _new_id(8)
+        self.parent_id: Optional[str] = None
+
+    def __enter__(self) -> '_Span':
+        stack = self.tracer._stack()
+        self.parent_id = stack[-1] if stack else None
+        stack.append(self.span_id)
+
+        self.start = time.time_ns()
+        return self
+
+    def __exit__(self, exc_type, *args) -> None:
+        end = time.time_ns()
+        self.tracer._stack().pop()
+
+        if exc_type is not None:
+            self.args['error'] = exc_type.__name__
+
+        self.tracer.events.append({
+            'name': self.name,
+            'start_ns': self.start,
+            'end_ns': end,
+            'lane': self.tracer.lane,
+            'thread': threading.current_thread().name,
+            'thread_id': threading.get_ident(),
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'args': self.args,
+        })
+
+
+class _NullSpan:
+    """Context manager that does nothing. Used when tracing is disabled."""
+
+    __slots__ = ()
+
+    def __enter__(self) -> '_NullSpan':
+        return self
+
+    def __exit__(self, *args) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    """Record spans of the plugin's activity.
+
+    Spans can be written as a Chrome trace-event file, which can be opened
+    in Perfetto or chrome://tracing, or as an OTLP JSON file.
+
+    Arguments:
+        enabled: If False, nothing is recorded.
+        lane: Name of the lane spans are shown in, ie: the xdist worker id.
+    """
+
+    def __init__(self, enabled: bool = False, lane: str = 'controller'):
+        self.enabled = enabled
+        self.lane = lane
+        self.trace_id = _new_id(16)
+        self.events: List[Dict[str, Any]] = []
+
+        self._local = threading.local()
+
+    def _stack(self) -> List[str]:
+        """Get the ids of the open spans in the current thread."""
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+
+        return stack
+
+    def span(self, name: str, **args: Any):
+        """Get a context manager that records a span.
+
+        Arguments:
+            name: Name of the span.
+            args: Attributes added to the span.
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+
+        return _Span(self, name, args)
+
+    def merge(self, events: List[Dict[str, Any]]) -> None:
+        """Add spans recorded by another Tracer, ie: a pytest-xdist worker."""
+        self.events.extend(events)
+
+    def _lanes(self) -> Dict[str, int]:
+        """Get a process id for every lane, the controller first."""
+        lanes = sorted({event['lane'] for event in self.events} | {self.lane})
+        lanes.sort(key=lambda lane: lane != self.lane)
+        return {lane: index + 1 for index, lane in enumerate(lanes)}
+
+    @staticmethod
+    def _thread_key(event: Dict[str, Any]) -> Tuple[str, int, str]:
+        """Get the lane, thread ident and thread name of a span."""
+        return event['lane'], event['thread_id'], event['thread']
+
+    def as_chrome(self) -> Dict[str, Any]:
+        """Get the spans as Chrome trace events.
+
+        Every lane is a process, and every thread of a lane has its own track,
+        so spans from background threads don't overlap the main thread's.
+        """
+        lanes = self._lanes()
+
+        trace_events: List[Dict[str, Any]] = []
+        for lane, pid in lanes.items():
+            trace_events.append({
+                'name': 'process_name',
+                'ph': 'M',
+                'pid': pid,
+                'args': {'name': f'pytest-testrail {lane}'},
+            })
+            trace_events.append({
+                'name': 'process_sort_index',
+                'ph': 'M',
+                'pid': pid,
+                'args': {'sort_index': pid},
+            })
+
+        # Thread ids are numbered in each lane, in the order threads started a span.
+        # The name is in the key, finished threads' idents can be reused.
+        threads: Dict[Tuple[str, int, str], int] = {}
+        for event in sorted(self.events, key=lambda event: event['start_ns']):
+            key = self._thread_key(event)
+            if key in threads:
+                continue
+
+            tid = threads[key] = sum(1 for lane, *_ in threads if lane == event['lane'])
+            trace_events.append({
+                'name': 'thread_name',
+                'ph': 'M',
+                'pid': lanes[event['lane']],
+                'tid': tid,
+                'args': {'name': event['thread']},
+            })
+
+        for event in self.events:
+            trace_events.append({
+                'name': event['name'],
+                'ph': 'X',
+                'pid': lanes[event['lane']],
+                'tid': threads[self._thread_key(event)],
+                'ts': event['start_ns'] / 1000,
+                'dur': (event['end_ns'] - event['start_ns']) / 1000,
+                'args': event['args'],
+            })
+
+        return {'traceEvents': trace_events, 'displayTimeUnit': 'ms'}
+
+    def as_otlp(self) -> Dict[str, Any]:
+        """Get the spans as an OTLP JSON trace export."""
+        spans = []
+
+        for event in self.events:
+            attributes = [
+                {'key': 'pytest_testrail.lane', 'value': {'stringValue': event['lane']}},
+                {'key': 'thread.name', 'value': {'stringValue': event['thread']}},
+                {'key': 'thread.id', 'value': {'intValue': str(event['thread_id'])}},
+            ]
+            for key, value in event['args'].items():
+                attributes.append({'key': key, 'value': {'stringValue': str(value)}})
+
+            span = {
+                'traceId': self.trace_id,
+                'spanId': event['span_id'],
+                'name': event['name'],
+                'kind': 1,
+                'startTimeUnixNano': str(event['start_ns']),
+                'endTimeUnixNano': str(event['end_ns']),
+                'attributes': attributes,
+            }
+            if event['parent_id']:
+                span['parentSpanId'] = event['parent_id']
+
+            spans.append(span)
+
+        return {
+            'resourceSpans': [
+                {
+                    'resource': {
+                        'attributes': [
+                            {'key': 'service.name', 'value': {'stringValue': 'pytest-testrail'}},
+                        ],
+                    },
+                    'scopeSpans': [
+                        {
+                            'scope': {'name': 'pytest_testrail'},
+                            'spans': spans,
+                        },
+                    ],
+                },
+            ],
+        }
+
+    def write(self, path: str, trace_format: str = 'chrome') -> None:
+        """Write the spans to a file.
+
+        Arguments:
+            path: Path of the file to write.
+            trace_format: 'chrome' or 'otlp'.
+        """
+        if trace_format not in TRACE_FORMATS:
+            raise ValueError(f'Unknown trace format: {trace_format}')
+
+        data = self.as_otlp() if trace_format == 'otlp' else self.as_chrome()
+
+        with open(path, 'w') as f:
+            json.dump(data, f)
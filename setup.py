@@ -23,8 +23,14 @@ setup(
         'inori>=0.0.8,<1.0',
         'filelock>=3.6.0,<4.0',
     ],
+    extras_require={
+        'numpy': ['numpy'],
+    },
     include_package_data=True,
-    entry_points={'pytest11': ['pytest-testrail = pytest_testrail.plugin']},
+    entry_points={
+        'pytest11': ['pytest-testrail = pytest_testrail.plugin'],
+        'console_scripts': ['pytest-testrail = pytest_testrail.cli:main'],
+    },
     classifiers=[
         "Programming Language :: Python :: 3.7",
         "Programming Language :: Python :: 3.8",
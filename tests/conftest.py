@@ -21,7 +21,7 @@ def api_client():
     """Get a mock for the TestRailAPI client."""
     client = Mock()
 
-    client.request_kwargs = {}
+    client.timeout = 30.0
     client.get_run().get.return_value = MockResponse({'is_completed': False})
     client.get_plan().get.return_value = MockResponse({'is_completed': False})
     return client
@@ -0,0 +1,49 @@
+from pytest_testrail.attachments import MultipartFile, add_attachment, attachments_key
+
+import requests
+
+
+def test_multipart_file_body(tmp_path):
+    path = tmp_path / 'screenshot.png'
+    path.write_bytes(b'\x89PNG' + b'x' * 200_000)
+
+    body = MultipartFile(str(path))
+    data = b''.join(iter(lambda: body.read(1000), b''))
+
+    assert len(data) == len(body)
+    assert body.content_type == f'multipart/form-data; boundary={body.boundary}'
+    assert data.startswith(
+        f'--{body.boundary}\r\n'
+        'Content-Disposition: form-data; name="attachment"; filename="screenshot.png"\r\n'
+        'Content-Type: image/png\r\n\r\n'.encode(),
+    )
+    assert data.endswith(b'\x89PNG' + b'x' * 200_000 + f'\r\n--{body.boundary}--\r\n'.encode())
+
+
+def test_multipart_file_streamed_by_requests(tmp_path):
+    """The body is kept as a stream by requests, with a Content-Length."""
+    path = tmp_path / 'log.txt'
+    path.write_text('a log')
+
+    body = MultipartFile(str(path))
+    request = requests.Request(
+        'POST',
+        'http://testrail.example/index.php?/api/v2/add_attachment_to_result/1',
+        data=body,
+        headers={'Content-Type': body.content_type},
+    ).prepare()
+
+    assert request.body is body
+    assert request.headers['Content-Length'] == str(len(body))
+    assert 'Transfer-Encoding' not in request.headers
+
+    body.close()
+
+
+def test_add_attachment(test_items, tmp_path):
+    add_attachment(test_items[0], tmp_path / 'a.txt')
+    add_attachment(test_items[0], str(tmp_path / 'b.txt'))
+
+    expected = [str(tmp_path / 'a.txt'), str(tmp_path / 'b.txt')]
+    assert test_items[0].stash[attachments_key] == expected
+    assert attachments_key not in test_items[1].stash
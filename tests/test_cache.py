@@ -0,0 +1,99 @@
+import os
+import time
+
+import pytest
+
+from pytest_testrail import cache
+from pytest_testrail.cache import ResponseCache, clear_cache
+from pytest_testrail.metrics import Metrics, MetricsSession
+
+from .test_metrics import FakeAdapter
+
+
+def test_response_cache_put_get(tmp_path):
+    response_cache = ResponseCache(str(tmp_path))
+    key = response_cache.key('user', 'https://foo/get_project/1')
+
+    response_cache.put(key, 'get_project', '{"id": 1}')
+
+    assert response_cache.get(key) == '{"id": 1}'
+    other_key = response_cache.key('other_user', 'https://foo/get_project/1')
+    assert response_cache.get(other_key) is None
+
+
+@pytest.mark.parametrize('endpoint', ['get_tests', 'get_run', 'get_plan'])
+def test_response_cache_endpoint_not_cached(tmp_path, endpoint):
+    response_cache = ResponseCache(str(tmp_path))
+    key = response_cache.key('user', f'https://foo/{endpoint}/1')
+
+    response_cache.put(key, endpoint, '{}')
+
+    assert response_cache.get(key) is None
+
+
+def test_response_cache_expired(tmp_path, monkeypatch):
+    response_cache = ResponseCache(str(tmp_path), ttls={'get_project': 10})
+    key = response_cache.key('user', 'https://foo/get_project/1')
+    response_cache.put(key, 'get_project', '{}')
+
+    now = time.time() + 11
+    monkeypatch.setattr(cache.time, 'time', lambda: now)
+
+    assert response_cache.get(key) is None
+    assert not os.path.exists(response_cache._path(key))
+
+
+def test_response_cache_evicts_least_recently_used(tmp_path):
+    response_cache = ResponseCache(str(tmp_path), max_size=400)
+    keys = [response_cache.key('user', f'https://foo/get_project/{i}') for i in range(3)]
+
+    for index, key in enumerate(keys):
+        response_cache.put(key, 'get_project', 'x' * 80)
+        os.utime(response_cache._path(key), (index, index))
+
+    # Using the oldest entry makes it the most recently used.
+    assert response_cache.get(keys[0])
+
+    new_key = response_cache.key('user', 'https://foo/get_project/3')
+    response_cache.put(new_key, 'get_project', 'x' * 80)
+
+    assert response_cache.get(keys[0])
+    assert response_cache.get(keys[1]) is None
+
+
+def test_response_cache_scans_only_when_needed(tmp_path, monkeypatch):
+    response_cache = ResponseCache(str(tmp_path))
+    scans = []
+    scandir = os.scandir
+    monkeypatch.setattr(cache.os, 'scandir', lambda path: scans.append(path) or scandir(path))
+
+    for index in range(cache.EVICT_INTERVAL + 1):
+        key = response_cache.key('user', f'https://foo/get_project/{index}')
+        response_cache.put(key, 'get_project', '{}')
+
+    # On the first write, then once the interval is reached.
+    assert len(scans) == 2
+
+
+def test_clear_cache(tmp_path):
+    response_cache = ResponseCache(str(tmp_path))
+    key = response_cache.key('user', 'https://foo/get_project/1')
+    response_cache.put(key, 'get_project', '{}')
+
+    clear_cache(str(tmp_path))
+
+    assert response_cache.get(key) is None
+
+
+def test_metrics_session_cache(tmp_path):
+    metrics = Metrics()
+    session = MetricsSession(metrics, cache=ResponseCache(str(tmp_path)))
+    session.auth = ('user', 'password')
+    session.mount('https://', FakeAdapter(content=b'{"id": 1}'))
+
+    url = 'https://foo.testrail.io/index.php?/api/v2/get_project/1'
+    first = session.get(url)
+    second = session.get(url)
+
+    assert first.json() == second.json() == {'id': 1}
+    assert metrics.as_dict()['get_project']['count'] == 1
@@ -0,0 +1,90 @@
+import json
+import time
+from unittest.mock import Mock
+
+import pytest
+
+from pytest_testrail import case_index
+from pytest_testrail.case_index import CaseIndex
+
+from .mock_response import MockResponse
+
+
+def new_client(*pages):
+    client = Mock()
+    client.base_uri = 'https://foo.testrail.io/index.php?/api/v2/'
+    client.get_cases().get.side_effect = [MockResponse(page) for page in pages]
+    client.get_cases.reset_mock()
+    return client
+
+
+def page(case_ids, next_link=None):
+    return {
+        'cases': [{'id': case_id, 'updated_on': 1000 + case_id} for case_id in case_ids],
+        '_links': {'next': next_link, 'prev': None},
+    }
+
+
+def test_case_index_full_refresh(tmp_path):
+    client = new_client(page([1, 2], next_link='next'), page([3]))
+
+    index = CaseIndex(client, project_id=4, suite_id=1, cache_dir=str(tmp_path))
+    index.refresh()
+
+    assert index.case_ids == {1, 2, 3}
+    assert index.unknown([2, 5]) == [5]
+
+    params = [c.kwargs['params'] for c in client.get_cases().get.call_args_list]
+    assert [p['offset'] for p in params] == [0, 2]
+    assert params[0]['suite_id'] == 1
+    assert 'updated_after' not in params[0]
+
+    with open(index.path) as f:
+        data = json.load(f)
+
+    assert data['case_ids'] == [1, 2, 3]
+    assert data['updated_after'] == 1003
+
+
+def test_case_index_list_response(tmp_path):
+    client = new_client([{'id': 7}, {'id': 8}])
+
+    index = CaseIndex(client, project_id=4, cache_dir=str(tmp_path))
+    index.refresh()
+
+    assert index.case_ids == {7, 8}
+
+
+def test_case_index_reuses_recent_index(tmp_path):
+    CaseIndex(new_client(page([1])), 4, 1, cache_dir=str(tmp_path)).refresh()
+
+    client = new_client()
+    index = CaseIndex(client, 4, 1, cache_dir=str(tmp_path))
+    index.refresh()
+
+    assert index.case_ids == {1}
+    client.get_cases().get.assert_not_called()
+
+
+def test_case_index_incremental_refresh(tmp_path, monkeypatch):
+    CaseIndex(new_client(page([1, 2])), 4, 1, cache_dir=str(tmp_path)).refresh()
+
+    now = time.time() + case_index.REFRESH_INTERVAL + 1
+    monkeypatch.setattr(case_index.time, 'time', lambda: now)
+
+    client = new_client(page([3]))
+    index = CaseIndex(client, 4, 1, cache_dir=str(tmp_path))
+    index.refresh()
+
+    assert index.case_ids == {1, 2, 3}
+    assert client.get_cases().get.call_args.kwargs['params']['updated_after'] == 1002
+
+
+def test_case_index_error(tmp_path):
+    client = new_client({'error': 'Field :project_id is not a valid project.'})
+    client.validate_response.side_effect = Exception('ded')
+
+    index = CaseIndex(client, 4, 1, cache_dir=str(tmp_path))
+
+    with pytest.raises(Exception):
+        index.refresh()
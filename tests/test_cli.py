@@ -0,0 +1,203 @@
+import os
+
+import pytest
+
+from pytest_testrail.cli import main
+from pytest_testrail.spool import write_spool
+
+from .mock_response import MockResponse
+
+CONNECTION_ARGS = ['--tr-url=dummy', '--tr-email=dummy', '--tr-password=dummy']
+
+
+@pytest.fixture
+def cli_client(api_client, mocker):
+    mocker.patch('pytest_testrail.cli._TestRailAPI', return_value=api_client)
+    return api_client
+
+
+def test_publish(cli_client, new_resultitem, tmp_path, capsys):
+    path = str(tmp_path / 'testrail_spool_main_10.jsonl')
+    results = [
+        new_resultitem(case_id=1, status_id='passed'),
+        new_resultitem(case_id=2, status_id='failed'),
+    ]
+    write_spool(path, results, {'run_id': 10, 'version': '1.2.3'})
+
+    assert main(['publish', *CONNECTION_ARGS, path]) == 0
+
+    payload = cli_client.add_results_for_cases().post.call_args.kwargs['json']
+    assert [r['case_id'] for r in payload['results']] == [1, 2]
+    assert payload['results'][0]['version'] == '1.2.3'
+
+    assert not os.path.exists(path)
+    assert '2 results published' in capsys.readouterr().out
+
+
+def test_publish_without_testrun(cli_client, new_resultitem, tmp_path):
+    path = str(tmp_path / 'testrail_spool_main.jsonl')
+    write_spool(path, [new_resultitem(case_id=1, status_id='passed')], {'run_id': None})
+
+    assert main(['publish', *CONNECTION_ARGS, path]) == 1
+    assert os.path.exists(path)
+
+    assert main(['publish', *CONNECTION_ARGS, '--tr-run-id=12', '--keep', path]) == 0
+    assert os.path.exists(path)
+
+
+def test_publish_completed_testrun(cli_client, new_resultitem, tmp_path):
+    cli_client.get_run().get.return_value = MockResponse({'is_completed': True})
+
+    path = str(tmp_path / 'testrail_spool_main_10.jsonl')
+    write_spool(path, [new_resultitem(case_id=1, status_id='passed')], {'run_id': 10})
+
+    assert main(['publish', *CONNECTION_ARGS, path]) == 1
+    assert os.path.exists(path)
+
+
+def shard_header(**kwargs):
+    header = {'shard': True, 'project_id': 4, 'suite_id': 1, 'run_id': None, 'plan_id': None}
+    header.update(kwargs)
+    return header
+
+
+def test_merge(cli_client, new_resultitem, tmp_path, capsys):
+    """Scenario:
+
+    Given two shards each wrote an artifact
+    When the artifacts are merged
+    Then one testrun is created with the cases of every shard
+    And every result is sent in one request, sorted as if from one session
+    """
+    cli_client.add_run().post().json.return_value = {'id': 77}
+    cli_client.add_run.reset_mock()
+
+    first = str(tmp_path / 'shard-1.jsonl')
+    second = str(tmp_path / 'shard-2.jsonl')
+    write_spool(
+        first,
+        [
+            new_resultitem(test_name='test_a', case_id=1, status_id='failed', timestamp=1),
+            new_resultitem(test_name='test_b', case_id=2, status_id='passed', timestamp=2),
+        ],
+        shard_header(case_ids=[1, 2], testrun_name='Nightly'),
+    )
+    write_spool(
+        second,
+        [new_resultitem(test_name='test_c', case_id=3, status_id='passed', timestamp=3)],
+        shard_header(case_ids=[3, 1]),
+    )
+
+    assert main(['merge', *CONNECTION_ARGS, first, second]) == 0
+
+    cli_client.add_run.assert_called_once_with(project_id=4)
+    run_data = cli_client.add_run().post.call_args.kwargs['json']
+    assert run_data['case_ids'] == [1, 2, 3]
+    assert run_data['name'] == 'Nightly'
+
+    cli_client.add_results_for_cases.assert_called_with(run_id=77)
+    post = cli_client.add_results_for_cases().post
+    assert post.call_count == 1
+    payload = post.call_args.kwargs['json']
+    assert [r['case_id'] for r in payload['results']] == [2, 3, 1]
+
+    assert not os.path.exists(first)
+    assert not os.path.exists(second)
+    assert '3 results from 2 shard artifacts published to testrun 77' in capsys.readouterr().out
+
+
+def test_merge_different_projects(cli_client, new_resultitem, tmp_path, capsys):
+    first = str(tmp_path / 'shard-1.jsonl')
+    second = str(tmp_path / 'shard-2.jsonl')
+    write_spool(first, [new_resultitem(status_id='passed')], shard_header())
+    write_spool(second, [new_resultitem(status_id='passed')], shard_header(project_id=5))
+
+    assert main(['merge', *CONNECTION_ARGS, first, second]) == 1
+
+    cli_client.add_results_for_cases().post.assert_not_called()
+    assert 'different project_id: 4, 5' in capsys.readouterr().err
+    assert os.path.exists(first)
+
+
+def test_merge_not_a_shard_artifact(cli_client, new_resultitem, tmp_path):
+    path = str(tmp_path / 'testrail_spool_main_10.jsonl')
+    write_spool(path, [new_resultitem(status_id='passed')], {'run_id': 10})
+
+    assert main(['merge', *CONNECTION_ARGS, path]) == 1
+
+
+def test_import_junit(cli_client, tmp_path, capsys):
+    path = tmp_path / 'junit.xml'
+    path.write_text(
+        '<testsuite>'
+        '<testcase name="test_a"><properties><property name="case_id" value="C1"/></properties>'
+        '<failure message="boom"/></testcase>'
+        '<testcase name="test_b"><properties><property name="case_id" value="C2"/></properties>'
+        '</testcase>'
+        '<testcase name="test_c"/>'
+        '</testsuite>',
+    )
+    cli_client.add_run().post().json.return_value = {'id': 88}
+    cli_client.add_run.reset_mock()
+
+    exit_code = main([
+        'import-junit',
+        *CONNECTION_ARGS,
+        '--tr-testrun-project-id=4',
+        '--tr-testrun-suite-id=1',
+        '--tr-upload-chunk-size=1',
+        str(path),
+    ])
+
+    assert exit_code == 0
+
+    run_data = cli_client.add_run().post.call_args.kwargs['json']
+    assert run_data['case_ids'] == [1, 2]
+
+    cli_client.add_results_for_cases.assert_called_with(run_id=88)
+    calls = cli_client.add_results_for_cases().post.call_args_list
+    assert [[r['case_id'] for r in c.kwargs['json']['results']] for c in calls] == [[2], [1]]
+
+    assert '2 results from 1 JUnit files published to testrun 88' in capsys.readouterr().out
+
+
+def test_import_junit_rerun_published_last(cli_client, tmp_path):
+    first = tmp_path / 'a.xml'
+    first.write_text(
+        '<testsuite>'
+        '<testcase name="other"><properties><property name="case_id" value="C2"/></properties>'
+        '</testcase>'
+        '<testcase name="t"><properties><property name="case_id" value="C1"/></properties>'
+        '<failure message="boom"/></testcase>'
+        '</testsuite>',
+    )
+    rerun = tmp_path / 'b.xml'
+    rerun.write_text(
+        '<testsuite>'
+        '<testcase name="t"><properties><property name="case_id" value="C1"/></properties>'
+        '</testcase>'
+        '</testsuite>',
+    )
+
+    exit_code = main(['import-junit', *CONNECTION_ARGS, '--tr-run-id=10', str(first), str(rerun)])
+
+    assert exit_code == 0
+
+    results = cli_client.add_results_for_cases().post.call_args.kwargs['json']['results']
+    case_1 = [r['status_id'] for r in results if r['case_id'] == 1]
+    assert case_1 == [5, 1]
+
+
+def test_import_junit_new_testrun_needs_project(cli_client, tmp_path, capsys):
+    path = tmp_path / 'junit.xml'
+    path.write_text(
+        '<testsuite><testcase name="test_a">'
+        '<properties><property name="case_id" value="C1"/></properties>'
+        '</testcase></testsuite>',
+    )
+
+    assert main(['import-junit', *CONNECTION_ARGS, str(path)]) == 1
+    assert '--tr-testrun-project-id' in capsys.readouterr().err
+
+    assert main(['import-junit', *CONNECTION_ARGS, '--tr-run-id=10', str(path)]) == 0
+    cli_client.add_results_for_cases.assert_called_with(run_id=10)
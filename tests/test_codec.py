@@ -0,0 +1,182 @@
+import io
+import json
+import time
+
+import pytest
+
+from pytest_testrail.codec import (
+    MAGIC,
+    ResultEncoder,
+    decode_results,
+    encode_results,
+    read_results,
+    write_results,
+)
+from pytest_testrail.comment import CompressedComment
+from pytest_testrail.result_item import ResultItem
+from pytest_testrail.spool import encode_result
+
+
+def make_results():
+    return [
+        ResultItem(
+            test_name='test_passed',
+            case_id=1,
+            status_id='passed',
+            duration=0.25,
+            comment=None,
+            defects=None,
+            test_parametrize=None,
+            timestamp=1700000000.125,
+        ),
+        ResultItem(
+            test_name='test_failed[1-2]',
+            case_id=300000,
+            status_id='failed',
+            duration=12.5,
+            comment='E   assert 1 == 2\n' * 20,
+            defects='JS-1, JS-2',
+            test_parametrize="{'a': 1, 'b': 2}",
+            timestamp=1700000001.5,
+        ),
+        ResultItem(
+            test_name='test_failed[1-2]',
+            case_id=300000,
+            status_id='skipped',
+            duration=None,
+            comment='short',
+            defects='JS-1, JS-2',
+            test_parametrize=None,
+            timestamp=1700000002.0,
+        ),
+        ResultItem(
+            test_name='tést_ünicode',
+            case_id=None,  # type: ignore
+            status_id='xfailed',
+            duration=0.0,
+            comment=CompressedComment('compressed in memory'),
+            defects=None,
+            test_parametrize=None,
+            timestamp=0.0,
+        ),
+        ResultItem(
+            test_name='test_no_status',
+            case_id=2 ** 40,
+            status_id=None,  # type: ignore
+            duration=1.0,
+            comment='',
+            defects=None,
+            test_parametrize=None,
+            timestamp=3.0,
+        ),
+    ]
+
+
+def test_round_trip():
+    results = make_results()
+
+    decoded = decode_results(encode_results(results))
+
+    assert decoded[0] == results[0]
+    assert decoded[1] == results[1]
+    assert decoded[2] == results[2]
+    assert decoded[4] == results[4]
+
+    # Compressed comments are kept compressed.
+    assert isinstance(decoded[1].comment, CompressedComment)
+    assert decoded[3].comment == results[3].comment
+    assert decoded[3].status_id == 'xfailed'
+    assert decoded[3].case_id is None
+
+
+def test_round_trip_decompress():
+    decoded = decode_results(encode_results(make_results()), decompress=True)
+
+    assert decoded[1].comment == 'E   assert 1 == 2\n' * 20
+    assert decoded[3].comment == 'compressed in memory'
+
+
+def test_stream_round_trip():
+    results = make_results()
+    stream = io.BytesIO()
+
+    assert write_results(stream, results) == len(results)
+
+    stream.seek(0)
+    assert list(read_results(stream, decompress=True)) == list(
+        read_results(io.BytesIO(encode_results(results)), decompress=True),
+    )
+
+
+def test_empty_stream():
+    stream = io.BytesIO()
+    assert write_results(stream, []) == 0
+    assert stream.getvalue() == MAGIC
+
+    assert list(read_results(io.BytesIO(MAGIC))) == []
+    assert decode_results(encode_results([])) == []
+
+
+def test_string_table():
+    """Repeated test names and defects are only written once."""
+    encoder = ResultEncoder()
+    first, second = make_results()[1:3]
+
+    first_frame = encoder.encode(first)
+    second_frame = encoder.encode(second)
+
+    assert b'test_failed[1-2]' in first_frame
+    assert b'JS-1, JS-2' in first_frame
+    assert b'test_failed[1-2]' not in second_frame
+    assert b'JS-1, JS-2' not in second_frame
+
+
+def test_invalid_streams():
+    with pytest.raises(ValueError, match='Not a result stream'):
+        list(read_results(io.BytesIO(b'{"run_id": 1}')))
+
+    data = encode_results(make_results())
+    with pytest.raises(ValueError, match='Truncated'):
+        list(read_results(io.BytesIO(data[:-3])))
+
+
+def test_corrupt_frame():
+    data = encode_results(make_results())
+
+    # A frame whose size prefix matches, but whose content is cut short.
+    corrupt = MAGIC + bytes([2]) + data[len(MAGIC) + 1:len(MAGIC) + 3]
+    with pytest.raises(ValueError, match='Corrupt result frame'):
+        list(read_results(io.BytesIO(corrupt)))
+
+    with pytest.raises(ValueError, match='Corrupt result frame'):
+        decode_results(corrupt)
+
+
+def test_throughput(new_resultitem):
+    """Encoding is compact, and fast enough for a controller receiving many workers."""
+    comment = 'Traceback (most recent call last):\n' + 'E   AssertionError\n' * 50
+    results = [
+        new_resultitem(
+            test_name=f'test_{i % 500}',
+            case_id=i,
+            status_id='failed' if i % 10 == 0 else 'passed',
+            duration=0.5,
+            comment=comment if i % 10 == 0 else None,
+            defects='JS-1' if i % 10 == 0 else None,
+            timestamp=float(i),
+        )
+        for i in range(1, 50001)
+    ]
+
+    start = time.perf_counter()
+    data = encode_results(results)
+    decoded = decode_results(data, decompress=True)
+    elapsed = time.perf_counter() - start
+
+    assert decoded == results
+
+    json_size = sum(len(json.dumps(encode_result(item))) + 1 for item in results)
+    assert len(data) * 3 < json_size
+
+    # Generous bound, to catch accidental quadratic behaviour rather than measure speed.
+    assert elapsed < 20
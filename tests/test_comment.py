@@ -0,0 +1,94 @@
+import pytest
+
+from pytest_testrail.comment import (
+    CompressedComment,
+    TailBuffer,
+    capture_comment,
+    render_comment,
+)
+from pytest_testrail.result_item import comment_capture_size
+
+
+@pytest.fixture()
+def longrepr(pytester):
+    pytester.makepyfile(
+        """
+        def test_func():
+            data = ['x' * 100 for i in range(200)]
+            assert data == []
+        """,
+    )
+    reprec = pytester.inline_run()
+    reports = reprec.getreports('pytest_runtest_logreport')
+    return [rep for rep in reports if rep.when == 'call'][0].longrepr
+
+
+def test_tail_buffer():
+    buffer = TailBuffer(5)
+    for text in ['abc', 'def', 'ghi']:
+        buffer.write(text)
+
+    assert buffer.getvalue() == 'efghi'
+    assert buffer.truncated
+
+
+def test_tail_buffer_not_truncated():
+    buffer = TailBuffer(10)
+    buffer.write('abc')
+
+    assert buffer.getvalue() == 'abc'
+    assert not buffer.truncated
+
+
+def test_render_comment_matches_str(longrepr):
+    full = str(longrepr)
+
+    assert render_comment(longrepr, len(full) * 2) == full
+
+
+def test_render_comment_truncated(longrepr):
+    full = str(longrepr)
+
+    rv = render_comment(longrepr, 200)
+
+    assert len(rv) <= 200
+    assert full.endswith(rv)
+
+
+def test_render_comment_string():
+    assert render_comment('An error', 3) == 'ror'
+
+
+def test_render_comment_none():
+    assert render_comment(None, 3) is None
+
+
+def test_capture_comment_compressed():
+    rv = capture_comment('An error', 100, compress=True)
+
+    assert isinstance(rv, CompressedComment)
+    assert str(rv) == 'An error'
+    assert rv == 'An error'
+
+
+def test_capture_comment_payload_unchanged(longrepr, new_resultitem):
+    """Scenario:
+
+    Given a failure with a traceback longer than the comment size limit
+    When the comment is captured at report time
+    Then the API payload is the same as with the full traceback
+    """
+    comment_size_limit = 400
+
+    full_item = new_resultitem(status_id='failed', comment=str(longrepr))
+    captured_item = new_resultitem(
+        status_id='failed',
+        comment=capture_comment(
+            longrepr, comment_capture_size(comment_size_limit), compress=True,
+        ),
+    )
+
+    full_payload = full_item.as_api_payload(comment_size_limit=comment_size_limit)
+    captured_payload = captured_item.as_api_payload(comment_size_limit=comment_size_limit)
+
+    assert full_payload['comment'] == captured_payload['comment']
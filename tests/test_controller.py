@@ -1,3 +1,5 @@
+import logging
+import time
 from unittest import mock
 
 import pytest
@@ -5,6 +7,8 @@ import pytest
 from pytest_testrail.controller import _TestRailController
 from pytest_testrail.results import Results
 
+import requests
+
 from .mock_response import MockResponse, get_plan_response
 
 
@@ -43,6 +47,62 @@ def test_create_run(api_client):
     assert result == 100
 
 
+def test_get_cases_with_status(api_client):
+    controller = _TestRailController(api_client)
+
+    controller.client.get_tests().get.return_value = MockResponse({
+        'tests': [
+            {'case_id': 1, 'status_id': 1},
+            {'case_id': 2, 'status_id': 5},
+            {'case_id': 3, 'status_id': 3},
+            {'case_id': 4, 'status_id': 4},
+            {'case_id': 5, 'status_id': 2},
+        ],
+    })
+
+    result = controller.get_cases_with_status(10, ['failed', 'retest', 'untested'])
+
+    assert result == [2, 3, 4]
+    assert controller.get_blocked_cases(10) == [5]
+
+
+def test_get_cases_with_status_pages(api_client):
+    controller = _TestRailController(api_client)
+
+    controller.client.get_tests().get.side_effect = [
+        MockResponse({
+            'tests': [{'case_id': 1, 'status_id': 5}, {'case_id': 2, 'status_id': 1}],
+            '_links': {'next': '/api/v2/get_tests/10&offset=2', 'prev': None},
+        }),
+        MockResponse({
+            'tests': [{'case_id': 3, 'status_id': 5}, {'case_id': 4, 'status_id': 2}],
+            '_links': {'next': None, 'prev': '/api/v2/get_tests/10&offset=0'},
+        }),
+    ]
+
+    result = controller.get_cases_with_status(10, ['failed'])
+
+    assert result == [1, 3]
+    calls = controller.client.get_tests().get.call_args_list
+    assert [c.kwargs['params']['offset'] for c in calls] == [0, 2]
+
+
+def test_blocked_cases_fetched_once(api_client, new_resultitem):
+    controller = _TestRailController(api_client, publish_blocked=False, testrun_id=10)
+    controller.client.get_tests().get.return_value = MockResponse({
+        'tests': [{'case_id': 2, 'status_id': 2}],
+    })
+    controller.client.get_tests.reset_mock()
+
+    for case_id in (1, 2):
+        results = Results([new_resultitem(case_id=case_id, status_id='failed')])
+        controller.upload_results_to_testrail(results, quiet=True)
+
+    controller.client.get_tests.assert_called_once_with(run_id=10)
+    posted = controller.client.add_results_for_cases().post.call_args_list
+    assert [[r['case_id'] for r in c.kwargs['json']['results']] for c in posted] == [[1], []]
+
+
 def test_controller_testplan_completed(api_client):
     mock_client = mock.Mock()
     mock_client.get_plan().get.return_value = MockResponse({"is_completed": True})
@@ -127,3 +187,202 @@ def test_controller_upload_results_to_testrail_has_testplan_id(
 
     controller.get_open_runs.assert_called()
     controller.send_to_testrail.assert_called()
+
+
+def test_controller_send_to_testrail_chunked(new_resultitem):
+    """Scenario:
+
+    Given upload_chunk_size is set
+    When results are sent to TestRail
+    Then results are sent in requests of at most upload_chunk_size results
+    """
+    mock_client = mock.Mock()
+
+    controller = _TestRailController(
+        mock_client, publish_blocked=True, upload_chunk_size=2,
+    )
+
+    results = Results()
+    for timestamp in range(5):
+        results.append(new_resultitem(status_id='passed', timestamp=timestamp + 1))
+
+    controller.send_to_testrail(10, results)
+
+    calls = mock_client.add_results_for_cases().post.call_args_list
+    assert [len(c.kwargs['json']['results']) for c in calls] == [2, 2, 1]
+
+
+def test_controller_background_checks():
+    mock_client = mock.Mock()
+    mock_client.get_run().get.return_value = MockResponse({"is_completed": True})
+
+    controller = _TestRailController(mock_client, testrun_id=248, background_checks=True)
+
+    with pytest.raises(Exception) as exc:
+        controller.wait_until_ready()
+
+    assert str(exc.value) == "Test run is marked as completed."
+
+    # Raised again, results are never sent to a testrun that failed the checks.
+    with pytest.raises(Exception, match='Test run is marked as completed.'):
+        controller.wait_until_ready()
+
+
+def test_controller_background_checks_warm_up():
+    mock_client = mock.Mock()
+
+    controller = _TestRailController(mock_client, background_checks=True)
+    controller.wait_until_ready()
+
+    mock_client.warm_up.assert_called_once()
+
+
+def test_controller_deadline_defers_results(new_resultitem):
+    """Scenario:
+
+    Given a deadline is set
+    When the deadline passes while results are sent
+    Then the results not sent yet are deferred
+    """
+    mock_client = mock.Mock()
+    mock_client.timeout = 30.0
+
+    controller = _TestRailController(
+        mock_client, publish_blocked=True, upload_chunk_size=2,
+    )
+    controller.deadline = time.monotonic() + 10
+
+    timeouts = []
+
+    def post(**kwargs):
+        timeouts.append(kwargs['timeout'])
+        # The deadline passes during the first request.
+        controller.deadline = time.monotonic() - 1
+        return mock.Mock()
+
+    mock_client.add_results_for_cases().post.side_effect = post
+
+    results = Results()
+    for timestamp in range(5):
+        results.append(new_resultitem(case_id=timestamp + 1, status_id='passed'))
+
+    controller.send_to_testrail(10, results)
+
+    assert controller.published == {10: 2}
+    assert [r.case_id for r in controller.deferred[10]] == [3, 4, 5]
+
+    # The request timeout was limited to the time left, without changing the client's.
+    assert timeouts[0] <= 10
+    assert mock_client.timeout == 30.0
+
+
+def test_controller_deadline_timeout_defers_results(new_resultitem):
+    mock_client = mock.Mock()
+    mock_client.timeout = None
+    mock_client.add_results_for_cases().post.side_effect = requests.Timeout()
+
+    controller = _TestRailController(mock_client, publish_blocked=True)
+    controller.deadline = time.monotonic() + 60
+
+    results = Results([new_resultitem(case_id=1, status_id='passed')])
+    controller.send_to_testrail(10, results)
+
+    assert controller.published == {}
+    assert [r.case_id for r in controller.deferred[10]] == [1]
+    mock_client.metrics.record_retry.assert_called_once_with('add_results_for_cases')
+
+
+def test_controller_deadline_testplan_deferred(new_resultitem):
+    mock_client = mock.Mock()
+    mock_client.timeout = None
+    mock_client.get_plan().get.return_value = MockResponse({"is_completed": False})
+
+    controller = _TestRailController(mock_client, testplan_id=7)
+    controller.deadline = time.monotonic() - 1
+
+    results = Results([new_resultitem(case_id=1, status_id='passed')])
+    controller.upload_results_to_testrail(results)
+
+    mock_client.add_results_for_cases().post.assert_not_called()
+    assert [r.case_id for r in controller.deferred[None]] == [1]
+
+
+def test_controller_deferred_results_stay_spilled(new_resultitem, tmp_path):
+    mock_client = mock.Mock()
+    mock_client.timeout = None
+
+    controller = _TestRailController(mock_client, publish_blocked=True)
+    controller.deadline = time.monotonic() - 1
+
+    results = Results(spill_threshold=2, spill_dir=str(tmp_path))
+    for case_id in range(1, 8):
+        results.append(new_resultitem(case_id=case_id, status_id='passed'))
+
+    controller.send_to_testrail(10, results)
+
+    deferred = controller.deferred[10]
+    assert deferred.spilled
+    assert [r.case_id for r in deferred.iter_sorted()] == list(range(1, 8))
+
+
+def test_controller_logs_case_ids_at_debug(api_client, new_resultitem, caplog):
+    controller = _TestRailController(api_client, publish_blocked=True, testrun_id=10)
+    results = Results([new_resultitem(case_id=1234, status_id='passed')])
+
+    with caplog.at_level(logging.INFO, logger='pytest_testrail'):
+        controller.upload_results_to_testrail(results)
+
+    assert 'Publishing 1 results.' in caplog.messages
+    assert not [m for m in caplog.messages if '1234' in m]
+
+    caplog.clear()
+    with caplog.at_level(logging.DEBUG, logger='pytest_testrail'):
+        controller.upload_results_to_testrail(results)
+
+    assert 'Publishing testcases: 1234.' in caplog.messages
+
+
+def test_controller_upload_attachments(new_resultitem, tmp_path):
+    """Scenario:
+
+    Given results were sent to TestRail
+    When files are attached to the results
+    Then each file is sent to the newest result of its test
+    And files too large are skipped
+    """
+    mock_client = mock.Mock()
+    mock_client.timeout = None
+    mock_client.add_results_for_cases().post().json.return_value = [
+        {'id': 501}, {'id': 502}, {'id': 503},
+    ]
+    mock_client.add_attachment_to_result().post().json.return_value = {'attachment_id': 9}
+
+    controller = _TestRailController(
+        mock_client, publish_blocked=True, max_attachment_size=10,
+    )
+
+    results = Results([
+        new_resultitem(test_name='test_a', case_id=1, status_id='failed', timestamp=1),
+        new_resultitem(test_name='test_b', case_id=2, status_id='passed', timestamp=2),
+        new_resultitem(test_name='test_a', case_id=1, status_id='passed', timestamp=3),
+    ])
+    controller.send_to_testrail(10, results)
+
+    # Results of a test are sent together, oldest first.
+    assert controller.result_ids == {10: {(1, 'test_a'): 502, (2, 'test_b'): 503}}
+
+    small = tmp_path / 'small.txt'
+    small.write_text('log')
+    large = tmp_path / 'large.txt'
+    large.write_text('x' * 11)
+
+    mock_client.add_attachment_to_result.reset_mock()
+    attached = controller.upload_attachments({
+        (1, 'test_a'): [str(small), str(large)],
+        (3, 'test_c'): [str(small)],
+    })
+
+    assert attached == 1
+    mock_client.add_attachment_to_result.assert_called_once_with(result_id=502)
+    kwargs = mock_client.add_attachment_to_result().post.call_args.kwargs
+    assert kwargs['headers']['Content-Type'].startswith('multipart/form-data; boundary=')
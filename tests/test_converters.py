@@ -3,3 +3,11 @@ from pytest_testrail import converters
 
 def test_clean_test_ids():
     assert list(converters.clean_test_ids(['C1234', 'C12345'])) == [1234, 12345]
+
+
+def test_format_test_defects():
+    assert converters.format_test_defects(('PF-418', 'PF-517')) == 'PF-418, PF-517'
+
+
+def test_format_test_defects_empty():
+    assert converters.format_test_defects(None) is None
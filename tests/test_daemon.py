@@ -0,0 +1,242 @@
+import os
+import socket
+import tempfile
+import threading
+import time
+from unittest import mock
+
+import pytest
+
+from pytest_testrail.codec import MAGIC, encode_results
+from pytest_testrail.daemon import UploaderDaemon, hand_off
+from pytest_testrail.metrics import Metrics
+from pytest_testrail.spool import read_spool
+
+import requests
+
+from .mock_response import MockResponse
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'), reason='Needs Unix sockets')
+
+
+@pytest.fixture
+def socket_path():
+    # Unix socket paths have a short length limit, tmp_path can be too long.
+    directory = tempfile.mkdtemp(prefix='tr-')
+    yield os.path.join(directory, 'daemon.sock')
+    os.rmdir(directory)
+
+
+@pytest.fixture
+def start_daemon(api_client, socket_path):
+    """Start a daemon in a thread. Get a function that stops it and waits for the last flush."""
+    threads = []
+
+    def stop() -> None:
+        for uploader, thread in threads:
+            if thread.is_alive():
+                uploader.shutdown()
+                thread.join()
+
+    def start(**kwargs):
+        uploader = UploaderDaemon(api_client, socket_path, **kwargs)
+        thread = threading.Thread(target=uploader.serve_forever)
+        thread.start()
+        threads.append((uploader, thread))
+
+        # Wait until the daemon accepts connections.
+        for _ in range(500):
+            if os.path.exists(socket_path):
+                break
+            time.sleep(0.01)
+
+        return stop
+
+    yield start
+
+    stop()
+
+
+def test_daemon_coalesces_batches(api_client, start_daemon, socket_path, new_resultitem):
+    """Scenario:
+
+    Given two pytest processes hand off results for the same testrun
+    When the daemon flushes
+    Then every result is published in one request
+    And the testrun is closed afterwards
+    """
+    stop = start_daemon(flush_interval=60)
+
+    header = {'run_id': 10, 'version': '1.0'}
+    assert hand_off(socket_path, header, [new_resultitem(case_id=1, status_id='passed')]) == 1
+    assert hand_off(
+        socket_path,
+        header,
+        [
+            new_resultitem(case_id=2, status_id='failed'),
+            new_resultitem(case_id=3, status_id='passed'),
+        ],
+    ) == 2
+    assert hand_off(socket_path, {'run_id': 10, 'close': True}, []) == 0
+
+    api_client.add_results_for_cases().post.assert_not_called()
+
+    stop()
+
+    post = api_client.add_results_for_cases().post
+    assert post.call_count == 1
+    payload = post.call_args.kwargs['json']
+    assert [r['case_id'] for r in payload['results']] == [1, 3, 2]
+    assert payload['results'][0]['version'] == '1.0'
+
+    api_client.close_run().post.assert_called_once()
+    api_client.warm_up.assert_called_once()
+    assert not os.path.exists(socket_path)
+
+
+def test_daemon_retries_then_spools(api_client, new_resultitem, tmp_path):
+    api_client.add_results_for_cases().post.side_effect = requests.ConnectionError('down')
+
+    uploader = UploaderDaemon(
+        api_client, 'unused', max_retries=2, retry_delay=0, spool_dir=str(tmp_path),
+    )
+    uploader.add({'run_id': 10}, [new_resultitem(case_id=1, status_id='passed')])
+    uploader.add({'run_id': 10, 'close': True}, [])
+
+    for _ in range(3):
+        uploader.flush()
+
+    assert api_client.add_results_for_cases().post.call_count == 3
+    api_client.close_run().post.assert_not_called()
+    assert not uploader.unsent
+    assert not uploader.close_requested
+
+    (path,) = tmp_path.iterdir()
+    header, results = read_spool(str(path))
+    assert header['run_id'] == 10
+    assert [r.case_id for r in results] == [1]
+
+
+@pytest.mark.parametrize(
+    'error',
+    [requests.ConnectionError('down'), ValueError('Unexpected response')],
+)
+def test_daemon_retries_counted(api_client, new_resultitem, tmp_path, error):
+    """Scenario:
+
+    Given sending results fails twice, then succeeds
+    When the daemon flushes until they are sent
+    Then the metrics count two retries
+    """
+    api_client.metrics = Metrics()
+    api_client.add_results_for_cases().post.side_effect = [error, error, MockResponse([])]
+
+    uploader = UploaderDaemon(api_client, 'unused', retry_delay=0, spool_dir=str(tmp_path))
+    uploader.add({'run_id': 10}, [new_resultitem(case_id=1, status_id='passed')])
+
+    for _ in range(3):
+        uploader.flush()
+
+    assert not uploader.unsent
+    assert api_client.metrics.as_dict()['add_results_for_cases']['retries'] == 2
+
+
+def test_daemon_retry_sends_only_unsent_chunks(api_client, new_resultitem, tmp_path):
+    """Scenario:
+
+    Given results are sent in chunks
+    When the second chunk fails
+    Then the next flush only sends the second chunk
+    """
+    sent = []
+
+    def post(json, **kwargs):
+        if len(sent) == 1 and not post.failed:
+            post.failed = True
+            raise requests.ConnectionError('down')
+        sent.append([r['case_id'] for r in json['results']])
+        return MockResponse([])
+
+    post.failed = False
+    api_client.add_results_for_cases().post.side_effect = post
+
+    uploader = UploaderDaemon(
+        api_client, 'unused', retry_delay=0, upload_chunk_size=2, spool_dir=str(tmp_path),
+    )
+    uploader.add(
+        {'run_id': 10},
+        [new_resultitem(case_id=case_id, status_id='passed') for case_id in (1, 2, 3, 4)],
+    )
+    # Sent once the older results are.
+    uploader.flush()
+    uploader.add({'run_id': 10}, [new_resultitem(case_id=5, status_id='passed')])
+
+    assert sent == [[1, 2]]
+    assert [r.case_id for r in uploader.unsent[(10, None, '', '', True)][10]] == [3, 4]
+
+    uploader.flush()
+
+    assert sent == [[1, 2], [3, 4], [5]]
+    assert not uploader.unsent
+    assert not list(tmp_path.iterdir())
+
+
+def test_daemon_backoff_does_not_block_other_testruns(api_client, new_resultitem):
+    def post(json, **kwargs):
+        if post.run_id == 10:
+            raise requests.ConnectionError('down')
+        return MockResponse([])
+
+    def add_results_for_cases(run_id=None):
+        post.run_id = run_id
+        return route
+
+    route = mock.Mock()
+    route.post.side_effect = post
+    api_client.add_results_for_cases = add_results_for_cases
+
+    uploader = UploaderDaemon(api_client, 'unused', retry_delay=60)
+    uploader.add({'run_id': 10}, [new_resultitem(case_id=1, status_id='passed')])
+    uploader.add({'run_id': 11}, [new_resultitem(case_id=2, status_id='passed')])
+
+    start = time.monotonic()
+    uploader.flush()
+    uploader.add({'run_id': 11}, [new_resultitem(case_id=3, status_id='passed')])
+    uploader.flush()
+
+    # Testrun 10 waits for its retry without delaying testrun 11.
+    assert time.monotonic() - start < 5
+    assert route.post.call_count == 3
+    assert list(uploader.unsent) == [(10, None, '', '', True)]
+
+
+def test_daemon_rejects_corrupt_payload(api_client, start_daemon, socket_path, new_resultitem):
+    """Scenario:
+
+    Given a process sends a truncated result frame
+    Then the daemon replies with an error
+    And keeps accepting results
+    """
+    stop = start_daemon(flush_interval=60)
+
+    data = encode_results([new_resultitem(case_id=1, status_id='passed')])
+    corrupt = MAGIC + bytes([2]) + data[len(MAGIC) + 1:len(MAGIC) + 3]
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(10)
+        sock.connect(socket_path)
+        sock.sendall(b'{"run_id": 10}\n' + corrupt)
+        sock.shutdown(socket.SHUT_WR)
+
+        with sock.makefile('rb') as f:
+            reply = f.readline()
+
+    assert reply.startswith(b'error: Corrupt result frame')
+    assert hand_off(socket_path, {'run_id': 10}, [new_resultitem(status_id='passed')]) == 1
+
+    stop()
+
+
+def test_hand_off_without_daemon(socket_path, new_resultitem):
+    with pytest.raises(OSError):
+        hand_off(socket_path, {'run_id': 10}, [new_resultitem(status_id='passed')])
@@ -0,0 +1,107 @@
+import json
+import time
+from unittest.mock import Mock
+
+import pytest
+
+from pytest_testrail import durations
+from pytest_testrail.durations import DurationIndex, parse_elapsed
+
+from .mock_response import MockResponse
+
+
+def new_client(tests, *result_pages):
+    client = Mock()
+    client.base_uri = 'https://foo.testrail.io/index.php?/api/v2/'
+    client.get_tests().get.return_value = MockResponse(tests)
+    client.get_results_for_run().get.side_effect = [MockResponse(p) for p in result_pages]
+    client.get_tests.reset_mock()
+    client.get_results_for_run.reset_mock()
+    return client
+
+
+TESTS = {
+    'tests': [
+        {'id': 1, 'case_id': 1234},
+        {'id': 2, 'case_id': 8765},
+        {'id': 3, 'case_id': 5678},
+    ],
+    '_links': {'next': None, 'prev': None},
+}
+
+
+@pytest.mark.parametrize(
+    'elapsed, expected',
+    [
+        ('30s', 30),
+        ('1m 30s', 90),
+        ('1h 2m', 3720),
+        ('1d', 8 * 60 * 60),
+        ('1.5s', 1.5),
+        ('', None),
+        (None, None),
+        ('soon', None),
+    ],
+)
+def test_parse_elapsed(elapsed, expected):
+    assert parse_elapsed(elapsed) == expected
+
+
+def test_duration_index_refresh(tmp_path):
+    results = {
+        'results': [
+            {'test_id': 1, 'elapsed': '10s', 'created_on': 200},
+            {'test_id': 1, 'elapsed': '1m', 'created_on': 100},
+            {'test_id': 2, 'elapsed': '2m', 'created_on': 100},
+        ],
+        '_links': {'next': 'next', 'prev': None},
+    }
+    more_results = {
+        'results': [
+            {'test_id': 3, 'elapsed': None, 'created_on': 100},
+            {'test_id': 99, 'elapsed': '5m', 'created_on': 100},
+        ],
+        '_links': {'next': None, 'prev': None},
+    }
+    client = new_client(TESTS, results, more_results)
+
+    index = DurationIndex(client, run_id=10, cache_dir=str(tmp_path))
+    index.refresh()
+
+    assert index.durations == {1234: 10, 8765: 120}
+    assert index.duration([1234, 8765]) == 120
+    assert index.duration([5678]) == 0
+
+    params = [c.kwargs['params'] for c in client.get_results_for_run().get.call_args_list]
+    assert [p['offset'] for p in params] == [0, 3]
+
+    with open(index.path) as f:
+        data = json.load(f)
+
+    assert data['durations'] == {'1234': 10, '8765': 120}
+
+
+def test_duration_index_reuses_recent_file(tmp_path):
+    results = {'results': [{'test_id': 1, 'elapsed': '10s'}]}
+    DurationIndex(new_client(TESTS, results), 10, cache_dir=str(tmp_path)).refresh()
+
+    client = new_client(TESTS)
+    index = DurationIndex(client, 10, cache_dir=str(tmp_path))
+    index.refresh()
+
+    assert index.durations == {1234: 10}
+    client.get_results_for_run().get.assert_not_called()
+
+
+def test_duration_index_stale_file(tmp_path, monkeypatch):
+    results = {'results': [{'test_id': 1, 'elapsed': '10s'}]}
+    DurationIndex(new_client(TESTS, results), 10, cache_dir=str(tmp_path)).refresh()
+
+    now = time.time() + durations.REFRESH_INTERVAL + 1
+    monkeypatch.setattr(durations.time, 'time', lambda: now)
+
+    client = new_client(TESTS, [{'test_id': 2, 'elapsed': '20s'}])
+    index = DurationIndex(client, 10, cache_dir=str(tmp_path))
+    index.refresh()
+
+    assert index.durations == {8765: 20}
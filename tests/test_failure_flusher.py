@@ -0,0 +1,45 @@
+import threading
+
+from pytest_testrail.failure_flusher import FailureFlusher
+
+
+def test_failure_flusher_batches(new_resultitem):
+    batches = []
+    flusher = FailureFlusher(batches.append, batch_size=2, interval=60)
+
+    for case_id in [1, 2, 3, 1, 4]:
+        flusher.add(new_resultitem(case_id=case_id, status_id='failed'))
+
+    flusher.close()
+
+    assert [[item.case_id for item in batch] for batch in batches] == [[1, 2], [3, 1], [4]]
+    assert flusher.flushed == {1: 2, 2: 1, 3: 1, 4: 1}
+
+
+def test_failure_flusher_interval(new_resultitem):
+    """A batch is sent once its first result waited for the interval."""
+    sent = threading.Event()
+    flusher = FailureFlusher(lambda batch: sent.set(), batch_size=10, interval=0.01)
+
+    flusher.add(new_resultitem(case_id=1, status_id='failed'))
+
+    assert sent.wait(5)
+    flusher.close()
+
+
+def test_failure_flusher_send_error(new_resultitem):
+    def send(batch):
+        raise ConnectionError('down')
+
+    flusher = FailureFlusher(send, interval=0)
+    flusher.add(new_resultitem(case_id=1, status_id='failed'))
+    flusher.close()
+
+    assert flusher.flushed == {}
+
+
+def test_failure_flusher_unused():
+    flusher = FailureFlusher(lambda batch: None)
+    flusher.close()
+
+    assert flusher.flushed == {}
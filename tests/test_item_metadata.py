@@ -0,0 +1,34 @@
+from pytest_testrail.item_metadata import get_item_metadata, item_metadata_key
+from pytest_testrail.plugin import get_testrail_keys
+
+
+def test_get_item_metadata(test_items):
+    metadata = get_item_metadata(test_items[1])
+
+    assert metadata.case_ids == [8765]
+    assert metadata.defects == 'PF-418, PF-517'
+    assert metadata.test_parametrize is None
+
+
+def test_get_item_metadata_stashed(test_items):
+    """Scenario:
+
+    When get_testrail_keys() is called during collection
+    Then the metadata for every item is stored in the item's stash
+    """
+    get_testrail_keys(test_items)
+
+    for item in test_items:
+        assert item.stash[item_metadata_key] is get_item_metadata(item)
+
+
+def test_get_item_metadata_no_case_id(pytester):
+    file_data = """
+        def test_func():
+            pass
+    """
+    pytester.makepyfile(file_data)
+    item = pytester.getitems(file_data)[0]
+
+    assert get_item_metadata(item) is None
+    assert item.stash[item_metadata_key] is None
@@ -0,0 +1,99 @@
+import io
+
+from pytest_testrail.junit import iter_junit_results
+
+JUNIT_XML = b"""<?xml version="1.0" encoding="utf-8"?>
+<testsuites>
+  <testsuite name="pytest" tests="5">
+    <testcase classname="test_app" name="test_passed" time="1.5">
+      <properties>
+        <property name="case_id" value="C1"/>
+      </properties>
+      <system-out>a lot of output</system-out>
+    </testcase>
+    <testcase classname="test_app" name="test_failed" time="0.2">
+      <properties>
+        <property name="case_id" value="C2, C3"/>
+        <property name="defect_ids" value="JS-1 JS-2"/>
+      </properties>
+      <failure message="assert 1 == 2">def test_failed():
+&gt;       assert 1 == 2</failure>
+    </testcase>
+    <testcase classname="test_app" name="test_error">
+      <properties>
+        <property name="case_id" value="C4"/>
+      </properties>
+      <error message="fixture not found"/>
+    </testcase>
+    <testcase classname="test_app" name="test_skipped" time="0">
+      <properties>
+        <property name="case_id" value="C5"/>
+      </properties>
+      <skipped message="not today"/>
+    </testcase>
+    <testcase classname="test_app" name="test_no_case" time="0.1"/>
+  </testsuite>
+</testsuites>
+"""
+
+
+def test_iter_junit_results():
+    results = list(iter_junit_results(io.BytesIO(JUNIT_XML)))
+
+    assert [(r.test_name, r.case_id, r.status_id) for r in results] == [
+        ('test_passed', 1, 'passed'),
+        ('test_failed', 2, 'failed'),
+        ('test_failed', 3, 'failed'),
+        ('test_error', 4, 'failed'),
+        ('test_skipped', 5, 'skipped'),
+    ]
+
+    assert results[0].duration == 1.5
+    assert results[0].comment is None
+    assert results[1].comment == 'assert 1 == 2\ndef test_failed():\n>       assert 1 == 2'
+    assert results[1].defects == 'JS-1, JS-2'
+    assert results[3].comment == 'fixture not found'
+
+    # File order is kept for reruns.
+    assert [r.timestamp for r in results] == [0, 1, 1, 2, 3]
+
+
+def test_iter_junit_results_case_property():
+    xml = b"""<testsuite>
+      <testcase name="test_a"><properties><property name="tr" value="C9"/></properties></testcase>
+    </testsuite>"""
+
+    assert list(iter_junit_results(io.BytesIO(xml))) == []
+    assert [r.case_id for r in iter_junit_results(io.BytesIO(xml), case_property='tr')] == [9]
+
+
+def test_iter_junit_results_comment_size():
+    xml = (
+        b'<testsuite><testcase name="test_a">'
+        b'<properties><property name="case_id" value="C1"/></properties>'
+        b'<failure>' + b'x' * 10000 + b'end</failure>'
+        b'</testcase></testsuite>'
+    )
+
+    (result,) = iter_junit_results(io.BytesIO(xml), comment_size_limit=100)
+
+    assert len(result.comment) < 200
+    assert result.comment.endswith('end')
+
+
+def test_iter_junit_results_large_file(tmp_path):
+    path = tmp_path / 'junit.xml'
+    with open(path, 'w') as f:
+        f.write('<testsuites><testsuite>')
+        for i in range(20000):
+            f.write(
+                f'<testcase name="test_{i}" time="0.01">'
+                f'<properties><property name="case_id" value="C{i}"/></properties>'
+                f'<system-out>{"o" * 100}</system-out>'
+                '</testcase>',
+            )
+        f.write('</testsuite></testsuites>')
+
+    count = sum(1 for _ in iter_junit_results(str(path)))
+
+    assert count == 20000
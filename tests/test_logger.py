@@ -0,0 +1,90 @@
+import io
+import logging
+from logging.handlers import QueueHandler
+
+from pytest_testrail import logger as logger_module
+from pytest_testrail.logger import get_logger, start_logging, stop_logging
+
+
+def test_get_logger_is_shared():
+    assert get_logger() is get_logger()
+
+
+def test_get_logger_single_handler():
+    get_logger()
+    logger = get_logger()
+
+    assert len(logger.handlers) == 1
+
+
+def test_start_logging_queues_records():
+    queue_logging = start_logging()
+    try:
+        assert get_logger().handlers == [queue_logging.handler]
+        assert isinstance(queue_logging.handler, QueueHandler)
+    finally:
+        stop_logging(queue_logging)
+
+
+def test_stop_logging_restores_previous_handler():
+    logger = get_logger()
+    before = list(logger.handlers)
+
+    outer = start_logging()
+    inner = start_logging()
+
+    stop_logging(inner)
+    assert logger.handlers == [outer.handler]
+
+    stop_logging(outer)
+    assert logger.handlers == before
+
+
+def test_stop_logging_out_of_order():
+    logger = get_logger()
+    before = list(logger.handlers)
+
+    outer = start_logging()
+    inner = start_logging()
+
+    # The inner session's handler stays until it stops.
+    stop_logging(outer)
+    assert logger.handlers == [inner.handler]
+
+    stop_logging(inner)
+    assert logger.handlers == before
+
+
+def test_records_written_after_stop(monkeypatch):
+    stream = io.StringIO()
+    monkeypatch.setattr(logger_module.sys, 'stderr', stream)
+
+    stop_logging(start_logging())
+    get_logger().info('Publishing complete.')
+
+    assert 'Publishing complete.' in stream.getvalue()
+
+
+def test_records_written_to_stream_they_were_logged_with(monkeypatch):
+    first = io.StringIO()
+    second = io.StringIO()
+
+    queue_logging = start_logging()
+    try:
+        monkeypatch.setattr(logger_module.sys, 'stderr', first)
+        get_logger().info('first test')
+
+        # Another test's capture is active when the record is written.
+        monkeypatch.setattr(logger_module.sys, 'stderr', second)
+    finally:
+        stop_logging(queue_logging)
+
+    assert 'first test' in first.getvalue()
+    assert 'first test' not in second.getvalue()
+
+
+def test_logger_propagates(caplog):
+    with caplog.at_level(logging.INFO):
+        get_logger().info('Publishing complete.')
+
+    assert caplog.record_tuples[-1][2] == 'Publishing complete.'
@@ -0,0 +1,83 @@
+import tracemalloc
+
+import pytest
+
+from pytest_testrail.comment import capture_comment
+from pytest_testrail.memory import MemoryReport, PACKAGE_DIR
+from pytest_testrail.results import Results
+
+
+@pytest.fixture()
+def memory_report():
+    report = MemoryReport(enabled=True)
+    report.start()
+    yield report
+    report.stop()
+
+
+def test_memory_report_disabled():
+    report = MemoryReport()
+    report.start()
+
+    report.sample('collection')
+
+    assert report.samples == []
+    assert not tracemalloc.is_tracing()
+
+
+def test_memory_report_categories(memory_report, new_resultitem):
+    results = Results()
+    for index in range(200):
+        results.append(
+            new_resultitem(
+                status_id='failed',
+                comment=capture_comment(f'{index}' + 'x' * 5000, 4000),
+            ),
+        )
+
+    memory_report.sample('before_upload')
+
+    peak = memory_report.peak()
+    assert peak['comments'] >= 200 * 4000
+    assert peak['results'] > 0
+    assert memory_report.final() == memory_report.samples[-1][1]
+    assert memory_report.top_sites
+
+
+def test_memory_report_top_sites_in_plugin(memory_report, new_resultitem):
+    results = Results()
+    for _ in range(50):
+        results.append(new_resultitem(status_id='failed', comment='x' * 1000))
+
+    memory_report.sample('before_upload')
+    memory_report.sample('final')
+
+    # Sites are the plugin's own frames, not the libraries it calls or the report itself.
+    for site, _size in memory_report.top_sites:
+        assert site.startswith(PACKAGE_DIR)
+        assert 'memory.py' not in site
+
+
+def test_memory_report_peak(memory_report):
+    memory_report.samples = [
+        ('collection', {'results': 10, 'comments': 5}),
+        ('final', {'results': 2}),
+    ]
+
+    assert memory_report.peak() == {'results': 10, 'comments': 5}
+    assert memory_report.final() == {'results': 2}
+
+
+def test_memory_report_summary_lines():
+    data = {
+        'peak': {'results': 2048},
+        'final': {'results': 1024},
+        'process_peak': 4096,
+        'top_sites': [['results.py:10', 1024]],
+    }
+
+    lines = MemoryReport.summary_lines(data)
+
+    assert lines[1].split() == ['results', '2.0', '1.0']
+    assert lines[2] == 'plugin peak: 2.0 KiB, process traced peak: 4.0 KiB'
+    assert lines[-1].endswith('results.py:10')
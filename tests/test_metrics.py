@@ -0,0 +1,129 @@
+import json
+
+import pytest
+
+from pytest_testrail.metrics import Metrics, MetricsSession, endpoint_name
+
+import requests
+from requests.adapters import BaseAdapter
+
+
+class FakeAdapter(BaseAdapter):
+    """Return a canned response instead of sending a request."""
+
+    def __init__(self, status_code=200, content=b'{}'):
+        super().__init__()
+        self.status_code = status_code
+        self.content = content
+
+    def send(self, request, **kwargs):
+        self.timeout = kwargs.get('timeout')
+        response = requests.Response()
+        response.status_code = self.status_code
+        response._content = self.content
+        response.request = request
+        response.url = request.url
+        return response
+
+    def close(self):
+        pass
+
+
+def test_endpoint_name():
+    url = 'https://foo.testrail.io/index.php?/api/v2/get_run/10'
+    assert endpoint_name(url) == 'get_run'
+
+
+def test_metrics_record():
+    metrics = Metrics()
+    metrics.record('get_run', 0.2, bytes_sent=10, bytes_received=20)
+    metrics.record('get_run', 3.0, error=True)
+
+    data = metrics.as_dict()['get_run']
+
+    assert data['count'] == 2
+    assert data['errors'] == 1
+    assert data['bytes_sent'] == 10
+    assert data['bytes_received'] == 20
+    assert data['max_time'] == 3.0
+    assert sum(data['histogram']) == 2
+
+
+def test_metrics_record_retry():
+    metrics = Metrics()
+    metrics.record('add_results_for_cases', 0.2, error=True)
+    metrics.record_retry('add_results_for_cases')
+    metrics.record('add_results_for_cases', 0.2)
+
+    data = metrics.as_dict()['add_results_for_cases']
+    assert data['count'] == 2
+    assert data['errors'] == 1
+    assert data['retries'] == 1
+
+
+def test_metrics_merge():
+    worker = Metrics()
+    worker.record('add_results_for_cases', 1.0, bytes_sent=100)
+    worker.record_retry('add_results_for_cases')
+
+    metrics = Metrics()
+    metrics.record('add_results_for_cases', 2.0, bytes_sent=50)
+    metrics.merge(worker.as_dict())
+
+    data = metrics.as_dict()['add_results_for_cases']
+    assert data['count'] == 2
+    assert data['retries'] == 1
+    assert data['bytes_sent'] == 150
+
+
+def test_metrics_write_json(tmp_path):
+    metrics = Metrics()
+    metrics.record('get_plan', 0.1)
+
+    path = tmp_path / 'metrics.json'
+    metrics.write_json(str(path))
+
+    data = json.loads(path.read_text())
+    assert data['endpoints']['get_plan']['count'] == 1
+
+
+@pytest.mark.parametrize('status_code, errors', [(200, 0), (400, 1)])
+def test_metrics_session(status_code, errors):
+    metrics = Metrics()
+    session = MetricsSession(metrics)
+    session.mount('https://', FakeAdapter(status_code=status_code, content=b'{"id": 1}'))
+
+    session.post(
+        'https://foo.testrail.io/index.php?/api/v2/add_run/4',
+        json={'name': 'foo'},
+    )
+
+    data = metrics.as_dict()['add_run']
+    assert data['count'] == 1
+    assert data['errors'] == errors
+    assert data['bytes_sent'] == len(b'{"name": "foo"}')
+    assert data['bytes_received'] == len(b'{"id": 1}')
+
+
+def test_metrics_session_timeout():
+    session = MetricsSession(Metrics(), timeout=30.0)
+    adapter = FakeAdapter()
+    session.mount('https://', adapter)
+
+    session.get('https://foo.testrail.io/index.php?/api/v2/get_run/10')
+    assert adapter.timeout == 30.0
+
+    # A request's own timeout is kept.
+    session.get('https://foo.testrail.io/index.php?/api/v2/get_run/10', timeout=5.0)
+    assert adapter.timeout == 5.0
+
+
+def test_terminal_summary(tr_plugin, mocker):
+    tr_plugin.metrics.record('get_run', 0.2)
+    terminalreporter = mocker.Mock()
+
+    tr_plugin.pytest_terminal_summary(terminalreporter, 0, None)
+
+    terminalreporter.write_sep.assert_called_once_with('-', 'TestRail API metrics')
+    lines = [c.args[0] for c in terminalreporter.write_line.call_args_list]
+    assert lines[1].startswith('get_run')
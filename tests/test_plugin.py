@@ -1,11 +1,18 @@
+import threading
+from concurrent.futures import Future
 from unittest import mock
 from unittest.mock import call, patch
 
+import pytest
+
 from pytest_testrail import plugin
+from pytest_testrail.attachments import add_attachment, attachments_key
 from pytest_testrail.controller import _TestRailController
+from pytest_testrail.durations import DurationIndex
 from pytest_testrail.plugin import (
     PyTestRailPlugin,
 )
+from pytest_testrail.spool import read_spool
 from pytest_testrail.status import (
     TESTRAIL_TEST_STATUS,
 )
@@ -243,7 +250,7 @@ def test_publish_blocked_disabled(api_client, new_resultitem, request):
 
     my_plugin.pytest_sessionfinish(mock.Mock(), 0)
 
-    my_plugin.client.get_tests().get.assert_called_once_with()
+    my_plugin.client.get_tests().get.assert_called_once_with(params={'limit': 250, 'offset': 0})
 
     expected_data = {
         'results': [
@@ -333,6 +340,292 @@ def test_skip_missing_correlation_tests(api_client, tr_controller, test_items, r
     assert not test_items[1].get_closest_marker('skip')
 
 
+def test_deselect_missing(api_client, tr_controller, test_items, request):
+    my_plugin = PyTestRailPlugin(
+        request.config,
+        tr_controller,
+        api_client,
+        ASSIGN_USER_ID,
+        PROJECT_ID,
+        SUITE_ID,
+        True,
+        TR_NAME,
+        run_id=10,
+        version='1.0.0.0',
+        deselect_missing=True,
+    )
+
+    get_tests_return_value = {
+        'tests': [
+            {
+                'case_id': 1234,
+            },
+            {
+                'case_id': 5678,
+            },
+        ]
+    }
+
+    my_plugin.client.get_tests().get.return_value = MockResponse(get_tests_return_value)
+    my_plugin.client.get_run().get.return_value = MockResponse({'is_completed': False})
+
+    config = mock.Mock()
+    items = list(test_items)
+    my_plugin.pytest_collection_modifyitems(None, config, items)
+
+    assert test_items[0] in items
+    assert test_items[1] not in items
+    assert not test_items[0].get_closest_marker('skip')
+    config.hook.pytest_deselected.assert_called_once_with(items=[test_items[1]])
+
+
+def test_deselect_missing_pages(api_client, tr_controller, test_items, request):
+    my_plugin = PyTestRailPlugin(
+        request.config,
+        tr_controller,
+        api_client,
+        ASSIGN_USER_ID,
+        PROJECT_ID,
+        SUITE_ID,
+        True,
+        TR_NAME,
+        run_id=10,
+        version='1.0.0.0',
+        deselect_missing=True,
+    )
+
+    # Both cases of the items are past the first page.
+    my_plugin.client.get_tests().get.side_effect = [
+        MockResponse({
+            'tests': [{'case_id': 5678}],
+            '_links': {'next': '/api/v2/get_tests/10&offset=1', 'prev': None},
+        }),
+        MockResponse({
+            'tests': [{'case_id': 1234}, {'case_id': 8765}],
+            '_links': {'next': None, 'prev': '/api/v2/get_tests/10&offset=0'},
+        }),
+    ]
+    my_plugin.client.get_run().get.return_value = MockResponse({'is_completed': False})
+
+    config = mock.Mock()
+    items = list(test_items)
+    my_plugin.pytest_collection_modifyitems(None, config, items)
+
+    assert items == test_items
+    config.hook.pytest_deselected.assert_not_called()
+
+
+def test_deselect_missing_correlation_tests(api_client, tr_controller, test_items, request):
+    my_plugin = PyTestRailPlugin(
+        request.config,
+        tr_controller,
+        api_client,
+        ASSIGN_USER_ID,
+        PROJECT_ID,
+        SUITE_ID,
+        True,
+        TR_NAME,
+        run_id=10,
+        version='1.0.0.0',
+        deselect_missing=True,
+    )
+
+    get_tests_return_value = {
+        'tests': [
+            {
+                'case_id': 1234,
+            },
+            {
+                'case_id': 8765,
+            },
+        ]
+    }
+
+    my_plugin.client.get_tests().get.return_value = MockResponse(get_tests_return_value)
+    my_plugin.client.get_run().get.return_value = MockResponse({'is_completed': False})
+
+    config = mock.Mock()
+    items = list(test_items)
+    my_plugin.pytest_collection_modifyitems(None, config, items)
+
+    assert items == test_items
+    config.hook.pytest_deselected.assert_not_called()
+
+
+def test_rerun_failed(api_client, tr_controller, test_items, request):
+    my_plugin = PyTestRailPlugin(
+        request.config,
+        tr_controller,
+        api_client,
+        ASSIGN_USER_ID,
+        PROJECT_ID,
+        SUITE_ID,
+        True,
+        TR_NAME,
+        run_id=10,
+        version='1.0.0.0',
+        deselect_missing=True,
+        rerun_failed=True,
+    )
+
+    get_tests_return_value = {
+        'tests': [
+            {
+                'case_id': 1234,
+                'status_id': 1,
+            },
+            {
+                'case_id': 8765,
+                'status_id': 5,
+            },
+        ]
+    }
+
+    my_plugin.client.get_tests().get.return_value = MockResponse(get_tests_return_value)
+
+    config = mock.Mock()
+    items = list(test_items)
+    my_plugin.pytest_collection_modifyitems(None, config, items)
+
+    assert items == [test_items[1]]
+    config.hook.pytest_deselected.assert_called_once_with(items=[test_items[0]])
+
+
+def test_deselect_items_unmarked(tr_plugin, test_items):
+    unmarked = object()
+    items = [test_items[0], unmarked, test_items[1]]
+    items_with_tr_keys = [(test_items[0], [1234]), (test_items[1], [8765])]
+    config = mock.Mock()
+
+    kept = tr_plugin.deselect_items(config, items, items_with_tr_keys, [8765])
+
+    assert kept == [(test_items[1], [8765])]
+    assert items == [unmarked, test_items[1]]
+
+    items = [test_items[0], unmarked, test_items[1]]
+    tr_plugin.deselect_items(config, items, items_with_tr_keys, [8765], keep_unmarked=False)
+
+    assert items == [test_items[1]]
+    config.hook.pytest_deselected.assert_called_with(items=[test_items[0], unmarked])
+
+
+def test_order_by_duration(api_client, tr_controller, test_items, request):
+    duration_index = mock.Mock()
+    duration_index.duration.side_effect = lambda case_ids: 60 if 8765 in case_ids else 0
+
+    my_plugin = PyTestRailPlugin(
+        request.config,
+        tr_controller,
+        api_client,
+        ASSIGN_USER_ID,
+        PROJECT_ID,
+        SUITE_ID,
+        True,
+        TR_NAME,
+        run_id=10,
+        version='1.0.0.0',
+        duration_index=duration_index,
+    )
+
+    items = list(test_items)
+    my_plugin.pytest_collection_modifyitems(None, None, items)
+
+    duration_index.refresh.assert_called_once_with()
+    assert items == [test_items[1], test_items[0]]
+
+
+def test_order_by_duration_error(api_client, tr_controller, test_items, request):
+    duration_index = mock.Mock()
+    duration_index.refresh.side_effect = Exception('ded')
+
+    my_plugin = PyTestRailPlugin(
+        request.config,
+        tr_controller,
+        api_client,
+        ASSIGN_USER_ID,
+        PROJECT_ID,
+        SUITE_ID,
+        True,
+        TR_NAME,
+        run_id=10,
+        version='1.0.0.0',
+        duration_index=duration_index,
+    )
+
+    items = list(test_items)
+    my_plugin.pytest_collection_modifyitems(None, None, items)
+
+    assert items == test_items
+
+
+def test_order_by_duration_worker(api_client, tr_controller, test_items, request, tmp_path):
+    duration_index = DurationIndex(api_client, 10, cache_dir=str(tmp_path))
+    duration_index.refresh = mock.Mock()
+
+    my_plugin = PyTestRailPlugin(
+        request.config,
+        tr_controller,
+        api_client,
+        ASSIGN_USER_ID,
+        PROJECT_ID,
+        SUITE_ID,
+        True,
+        TR_NAME,
+        run_id=10,
+        version='1.0.0.0',
+        duration_index=duration_index,
+    )
+
+    # The controller loads the durations once for every worker.
+    node = mock.Mock(workerinput={})
+    duration_index.durations = {8765: 60}
+    my_plugin.durations_loaded = True
+    my_plugin.pytest_configure_node(node)
+
+    assert node.workerinput == {'testrail_durations': {'8765': 60}}
+
+    my_plugin.config = mock.Mock(workerinput=node.workerinput)
+    duration_index.durations = {}
+    items = list(test_items)
+    my_plugin.pytest_collection_modifyitems(None, None, items)
+
+    duration_index.refresh.assert_not_called()
+    assert items == [test_items[1], test_items[0]]
+
+
+def test_order_by_duration_worker_error(api_client, tr_controller, test_items, request):
+    duration_index = mock.Mock()
+    duration_index.refresh.side_effect = Exception('ded')
+
+    my_plugin = PyTestRailPlugin(
+        request.config,
+        tr_controller,
+        api_client,
+        ASSIGN_USER_ID,
+        PROJECT_ID,
+        SUITE_ID,
+        True,
+        TR_NAME,
+        run_id=10,
+        version='1.0.0.0',
+        duration_index=duration_index,
+    )
+
+    nodes = [mock.Mock(workerinput={}), mock.Mock(workerinput={})]
+    for node in nodes:
+        my_plugin.pytest_configure_node(node)
+
+    # Every worker gets the same answer, without trying again.
+    duration_index.refresh.assert_called_once_with()
+    assert [node.workerinput for node in nodes] == [{'testrail_durations': None}] * 2
+
+    my_plugin.config = mock.Mock(workerinput=nodes[0].workerinput)
+    items = list(test_items)
+    my_plugin.pytest_collection_modifyitems(None, None, items)
+
+    assert items == test_items
+
+
 def test_report_header_run(api_client, tr_controller, request):
     my_plugin = PyTestRailPlugin(
         request.config,
@@ -371,3 +664,385 @@ def test_report_header_plan(api_client, tr_controller, request):
     result = my_plugin.report_header()
 
     assert result == 'pytest-testrail: Using existing testplan ID=10'
+
+
+def test_check_case_ids_drop_unknown(api_client, tr_controller, test_items, request):
+    case_index = mock.Mock()
+    case_index.unknown.side_effect = lambda case_ids: [c for c in case_ids if c == 8765]
+
+    my_plugin = PyTestRailPlugin(
+        request.config,
+        tr_controller,
+        api_client,
+        ASSIGN_USER_ID,
+        PROJECT_ID,
+        SUITE_ID,
+        case_index=case_index,
+        drop_unknown_case_ids=True,
+    )
+
+    with pytest.warns(pytest.PytestWarning, match='C8765'):
+        items = my_plugin.check_case_ids(plugin.get_testrail_keys(test_items))
+
+    case_index.refresh.assert_called()
+    assert [case_ids for _item, case_ids in items] == [[1234]]
+    assert plugin.get_testrail_keys(test_items) == items
+
+
+def test_testrun_created_in_background(tr_plugin, test_items, mocker):
+    mocker.patch.object(tr_plugin.store, 'get_all', return_value={})
+    mocker.patch.object(tr_plugin.store, 'set_value')
+    mocker.patch.object(tr_plugin.controller, 'create_run', return_value=1985)
+
+    tr_plugin.pytest_collection_modifyitems(None, None, test_items)
+
+    assert tr_plugin.testrun_id == 1985
+    assert tr_plugin.controller.testrun_id == 1985
+    tr_plugin.controller.create_run.assert_called_once()
+    assert tr_plugin.controller.create_run.call_args[1]['tr_keys'] == [1234, 8765]
+
+
+def test_testrun_creation_failed_spools_results(
+    tr_plugin, test_items, new_resultitem, mocker, tmp_path,
+):
+    mocker.patch.object(tr_plugin.store, 'get_all', return_value={})
+    mocker.patch.object(tr_plugin.store, 'clear')
+    mocker.patch.object(
+        tr_plugin.controller, 'create_run', side_effect=Exception('Field :suite_id is invalid'),
+    )
+    mocker.patch.object(tr_plugin.controller, 'upload_results_to_testrail')
+    mocker.patch('pytest_testrail.plugin.default_spool_path', return_value=str(tmp_path / 'spool'))
+
+    tr_plugin.pytest_collection_modifyitems(None, None, test_items)
+    tr_plugin.results.append(new_resultitem(case_id=1234, status_id='failed'))
+
+    tr_plugin.publish()
+
+    tr_plugin.controller.upload_results_to_testrail.assert_not_called()
+    assert tr_plugin.testrun_id == 0
+
+    spool_path = tmp_path / 'spool'
+    assert tr_plugin.publish_summary == [
+        f"controller: 1 results deferred to {spool_path}: "
+        "Testrun could not be created: Exception('Field :suite_id is invalid')",
+    ]
+
+    terminalreporter = mocker.Mock()
+    tr_plugin.pytest_terminal_summary(terminalreporter, 0, None)
+
+    terminalreporter.write_sep.assert_any_call('-', 'pytest-testrail publishing')
+    lines = [c.args[0] for c in terminalreporter.write_line.call_args_list]
+    assert lines[0] == tr_plugin.publish_summary[0]
+
+
+def failed_checks(controller, message='Test run is marked as completed.'):
+    """Make the controller's background checks fail."""
+    checks = Future()
+    checks.set_exception(Exception(message))
+    controller._checks = checks
+
+
+def test_configuration_check_failed_usage_error(tr_plugin, test_items, mocker, monkeypatch):
+    monkeypatch.delenv('PYTEST_XDIST_WORKER', raising=False)
+    failed_checks(tr_plugin.controller)
+    mocker.patch.object(tr_plugin, 'start_testrun_creation')
+
+    with pytest.raises(pytest.UsageError, match='check failed: Test run is marked as completed'):
+        tr_plugin.pytest_collection_modifyitems(None, None, list(test_items))
+
+    tr_plugin.start_testrun_creation.assert_not_called()
+
+
+def test_configuration_check_failed_at_sessionfinish(
+    api_client, tr_plugin, new_resultitem, mocker, monkeypatch, tmp_path,
+):
+    """Scenario:
+
+    Given the background checks failed
+    And no collection hook waited for them, ie: on the xdist controller
+    When the session finishes
+    Then the error is shown as a warning
+    And the results are spooled instead of published
+    """
+    monkeypatch.delenv('PYTEST_XDIST_WORKER', raising=False)
+    failed_checks(tr_plugin.controller)
+    mocker.patch.object(tr_plugin.store, 'clear')
+    mocker.patch('pytest_testrail.plugin.default_spool_path', return_value=str(tmp_path / 'spool'))
+    tr_plugin.results.append(new_resultitem(case_id=1234, status_id='failed'))
+
+    with pytest.warns(pytest.PytestWarning, match='Test run is marked as completed'):
+        tr_plugin.pytest_sessionfinish(mock.Mock(), 0)
+
+    api_client.add_results_for_cases().post.assert_not_called()
+
+    header, spooled = read_spool(str(tmp_path / 'spool'))
+    assert header['reason'] == (
+        'TestRail configuration check failed: Test run is marked as completed.'
+    )
+    assert [r.case_id for r in spooled] == [1234]
+
+
+def test_testrun_creation_timeout_spools_results(
+    tr_plugin, test_items, new_resultitem, mocker, tmp_path,
+):
+    created = threading.Event()
+    release = threading.Event()
+
+    def create_run(**kwargs):
+        release.wait(10)
+        return 77
+
+    def set_value(key, value):
+        created.set()
+
+    tr_plugin.finish_budget = 0.1
+    mocker.patch.object(tr_plugin.store, 'get_all', return_value={})
+    mocker.patch.object(tr_plugin.store, 'set_value', side_effect=set_value)
+    mocker.patch.object(tr_plugin.store, 'clear')
+    mocker.patch.object(tr_plugin.controller, 'create_run', side_effect=create_run)
+    mocker.patch.object(tr_plugin.controller, 'upload_results_to_testrail')
+    mocker.patch('pytest_testrail.plugin.default_spool_path', return_value=str(tmp_path / 'spool'))
+
+    tr_plugin.pytest_collection_modifyitems(None, None, test_items)
+    tr_plugin.results.append(new_resultitem(case_id=1234, status_id='failed'))
+
+    tr_plugin.publish()
+
+    tr_plugin.controller.upload_results_to_testrail.assert_not_called()
+    assert tr_plugin.testrun_timed_out
+    assert tr_plugin.testrun_error is None
+
+    header, _spooled = read_spool(str(tmp_path / 'spool'))
+    assert header['reason'] == 'Testrun not created within the finish budget'
+
+    # The testrun is created after the results were spooled.
+    release.set()
+    assert created.wait(10)
+    assert tr_plugin.wait_for_testrun(timeout=10)
+
+    assert tr_plugin.testrun_id == 77
+    assert tr_plugin.publish_summary[-1] == (
+        'controller: Testrun ID=77 was created after the finish budget ran out.'
+        ' Spooled results can be published to it with: pytest-testrail publish --tr-run-id=77'
+    )
+
+
+def test_finish_budget_spools_deferred_results(
+    api_client, new_resultitem, request, mocker, tmp_path,
+):
+    controller = _TestRailController(
+        api_client, publish_blocked=True, upload_chunk_size=1, testrun_id=10,
+    )
+
+    my_plugin = PyTestRailPlugin(
+        request.config,
+        controller,
+        api_client,
+        ASSIGN_USER_ID,
+        PROJECT_ID,
+        SUITE_ID,
+        run_id=10,
+        close_on_complete=True,
+        finish_budget=60,
+    )
+    mocker.patch.object(my_plugin.store, 'clear')
+    mocker.patch.object(my_plugin.store, 'get_all', return_value={'run_id': 10})
+    mocker.patch('pytest_testrail.plugin.default_spool_path', return_value=str(tmp_path / 'spool'))
+
+    def post(**kwargs):
+        # The budget runs out during the first request.
+        controller.deadline = 0
+        return mock.Mock()
+
+    api_client.add_results_for_cases().post.side_effect = post
+
+    for case_id in (1, 2, 3):
+        my_plugin.results.append(new_resultitem(case_id=case_id, status_id='passed'))
+
+    my_plugin.publish()
+
+    api_client.close_run().post.assert_not_called()
+
+    header, spooled = read_spool(str(tmp_path / 'spool'))
+    assert header['run_id'] == 10
+    assert [r.case_id for r in spooled] == [2, 3]
+
+    assert my_plugin.publish_summary == [
+        'controller: 1 results published to testrun 10',
+        f"controller: 2 results deferred to {tmp_path / 'spool'}: finish budget of 60s exceeded",
+        'controller: testrun 10 not closed, finish budget exceeded',
+    ]
+
+
+def test_add_attachments(tr_plugin, test_items, tmp_path):
+    add_attachment(test_items[0], tmp_path / 'screenshot.png')
+
+    for item in test_items:
+        tr_plugin.add_attachments(item)
+
+    assert tr_plugin.attachments == {(1234, 'test_func'): [str(tmp_path / 'screenshot.png')]}
+    assert attachments_key not in test_items[0].stash
+
+
+def test_publish_uploads_attachments(tr_plugin, new_resultitem, mocker):
+    mocker.patch.object(tr_plugin.store, 'get_all', return_value={})
+    mocker.patch.object(tr_plugin.store, 'clear')
+    mocker.patch.object(tr_plugin.controller, 'upload_results_to_testrail')
+    mocker.patch.object(tr_plugin.controller, 'upload_attachments')
+
+    tr_plugin.testrun_id = 10
+    tr_plugin.results.append(new_resultitem(test_name='test_func', case_id=1234))
+    tr_plugin.attachments = {(1234, 'test_func'): ['screenshot.png']}
+
+    tr_plugin.publish()
+
+    tr_plugin.controller.upload_attachments.assert_called_once_with(
+        {(1234, 'test_func'): ['screenshot.png']},
+    )
+
+
+def test_shard_artifact(api_client, tr_controller, test_items, new_resultitem, request, tmp_path):
+    """Scenario:
+
+    Given tr-shard-artifact is set
+    When the session finishes
+    Then no testrun is created and nothing is published
+    And the results are written to the artifact
+    """
+    path = str(tmp_path / 'shard.jsonl')
+
+    my_plugin = PyTestRailPlugin(
+        request.config,
+        tr_controller,
+        api_client,
+        ASSIGN_USER_ID,
+        PROJECT_ID,
+        SUITE_ID,
+        shard_artifact=path,
+    )
+
+    with patch.object(my_plugin.store, 'clear'), patch.object(my_plugin, 'start_testrun_creation'):
+        my_plugin.pytest_collection_modifyitems(None, None, test_items)
+        my_plugin.results.append(new_resultitem(case_id=1234, status_id='passed'))
+        my_plugin.publish()
+
+        my_plugin.start_testrun_creation.assert_not_called()
+
+    api_client.add_results_for_cases().post.assert_not_called()
+
+    header, results = read_spool(path)
+    assert header['shard'] is True
+    assert header['case_ids'] == [1234, 8765]
+    assert header['project_id'] == PROJECT_ID
+    assert [r.case_id for r in results] == [1234]
+
+
+def test_publish_hands_off_to_daemon(tr_plugin, new_resultitem, mocker):
+    mocker.patch.object(tr_plugin.store, 'get_all', return_value={'run_id': 10})
+    mocker.patch.object(tr_plugin.store, 'clear')
+    mocker.patch.object(tr_plugin.controller, 'upload_results_to_testrail')
+    mocker.patch.object(tr_plugin.controller, 'close_testrail')
+    hand_off = mocker.patch('pytest_testrail.plugin.hand_off', return_value=1)
+
+    tr_plugin.daemon_socket = '/tmp/daemon.sock'
+    tr_plugin.close_on_complete = True
+    tr_plugin.testrun_id = 10
+    tr_plugin.results.append(new_resultitem(case_id=1234, status_id='passed'))
+
+    tr_plugin.publish()
+
+    tr_plugin.controller.upload_results_to_testrail.assert_not_called()
+    tr_plugin.controller.close_testrail.assert_not_called()
+
+    results_call, close_call = hand_off.call_args_list
+    assert results_call.args[0] == '/tmp/daemon.sock'
+    assert results_call.args[1]['run_id'] == 10
+    assert [r.case_id for r in results_call.args[2]] == [1234]
+    assert close_call.args[1]['close'] is True
+    assert tr_plugin.publish_summary == ['controller: 1 results handed off to /tmp/daemon.sock']
+
+
+def test_publish_without_daemon_publishes_directly(tr_plugin, new_resultitem, mocker):
+    mocker.patch.object(tr_plugin.store, 'get_all', return_value={})
+    mocker.patch.object(tr_plugin.store, 'clear')
+    mocker.patch.object(tr_plugin.controller, 'upload_results_to_testrail')
+    mocker.patch('pytest_testrail.plugin.hand_off', side_effect=ConnectionRefusedError())
+
+    tr_plugin.daemon_socket = '/tmp/daemon.sock'
+    tr_plugin.testrun_id = 10
+    tr_plugin.results.append(new_resultitem(case_id=1234, status_id='passed'))
+
+    tr_plugin.publish()
+
+    tr_plugin.controller.upload_results_to_testrail.assert_called_once()
+
+
+def test_flush_failures(api_client, tr_controller, test_items, request, mocker):
+    """Scenario:
+
+    Given tr-flush-failures is set
+    When a test fails, then passes on rerun, and another test fails
+    Then the failures are sent while tests run
+    And the final upload only has the case with a newer result, newest last
+    """
+    my_plugin = PyTestRailPlugin(
+        request.config,
+        tr_controller,
+        api_client,
+        ASSIGN_USER_ID,
+        PROJECT_ID,
+        SUITE_ID,
+        run_id=10,
+        flush_failures=True,
+    )
+    tr_controller.testrun_id = 10
+    tr_controller.publish_blocked = True
+    my_plugin.flusher.interval = 60
+    mocker.patch.object(my_plugin.store, 'clear')
+
+    def report(outcome):
+        return mock.Mock(when='call', outcome=outcome, longrepr=None, duration=1)
+
+    my_plugin.add_result(test_items[0], report('failed'))
+    my_plugin.add_result(test_items[1], report('failed'))
+    my_plugin.add_result(test_items[0], report('passed'))
+
+    my_plugin.publish()
+
+    posts = api_client.add_results_for_cases().post.call_args_list
+    sent = [
+        [(r['case_id'], r['status_id']) for r in c.kwargs['json']['results']] for c in posts
+    ]
+    failed = TESTRAIL_TEST_STATUS['failed']
+    passed = TESTRAIL_TEST_STATUS['passed']
+    assert sent == [
+        [(1234, failed), (8765, failed)],
+        [(1234, failed), (1234, passed)],
+    ]
+
+
+def test_flush_failures_all_sent(api_client, tr_controller, test_items, request, mocker):
+    my_plugin = PyTestRailPlugin(
+        request.config,
+        tr_controller,
+        api_client,
+        ASSIGN_USER_ID,
+        PROJECT_ID,
+        SUITE_ID,
+        run_id=10,
+        flush_failures=True,
+    )
+    tr_controller.testrun_id = 10
+    tr_controller.publish_blocked = True
+    mocker.patch.object(my_plugin.store, 'clear')
+    cleanup = mocker.spy(my_plugin.results, 'cleanup')
+
+    my_plugin.add_result(
+        test_items[0], mock.Mock(when='call', outcome='failed', longrepr=None, duration=1),
+    )
+
+    my_plugin.publish()
+
+    assert api_client.add_results_for_cases().post.call_count == 1
+    cleanup.assert_called_once_with()
+    assert my_plugin.publish_summary == ['controller: 1 failed results sent while tests ran']
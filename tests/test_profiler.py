@@ -0,0 +1,64 @@
+from pytest_testrail.profiler import Profiler, percentile
+
+
+def test_profiler_disabled():
+    profiler = Profiler()
+
+    with profiler.measure('collection'):
+        pass
+
+    assert not profiler
+
+
+def test_profiler_measure():
+    profiler = Profiler(enabled=True)
+
+    with profiler.measure('collection'):
+        pass
+
+    assert len(profiler.phases['collection']) == 1
+
+
+def test_profiler_timed_iter():
+    profiler = Profiler(enabled=True)
+
+    assert list(profiler.timed_iter('sessionfinish.sort', [1, 2, 3])) == [1, 2, 3]
+    assert len(profiler.phases['sessionfinish.sort']) == 1
+
+
+def test_profiler_total_ignores_nested_phases():
+    profiler = Profiler(enabled=True)
+    profiler.record('sessionfinish', 2.0)
+    profiler.record('sessionfinish.post', 1.5)
+    profiler.record('makereport', 0.5)
+
+    assert profiler.total() == 2.5
+
+
+def test_profiler_merge():
+    worker = Profiler(enabled=True)
+    worker.record('makereport', 0.5)
+
+    profiler = Profiler(enabled=True)
+    profiler.record('makereport', 0.25)
+    profiler.merge(worker.as_dict())
+
+    assert sorted(profiler.phases['makereport']) == [0.25, 0.5]
+
+
+def test_percentile():
+    samples = [float(i) for i in range(1, 101)]
+
+    assert percentile(samples, 0.5) == 50.0
+    assert percentile(samples, 0.99) == 99.0
+    assert percentile([], 0.5) == 0.0
+
+
+def test_profiler_summary_lines():
+    profiler = Profiler(enabled=True)
+    profiler.record('makereport', 0.5)
+
+    lines = profiler.summary_lines(test_count=2, session_duration=10.0)
+
+    assert lines[1].startswith('makereport')
+    assert lines[-1] == 'pytest-testrail total: 0.500s of 10.000s session (5.0%)'
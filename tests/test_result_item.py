@@ -1,3 +1,5 @@
+import tracemalloc
+
 from pytest_testrail.status import PYTEST_TO_TESTRAIL_STATUS
 
 
@@ -45,3 +47,66 @@ def test_resultitem_as_api_payload_truncated_comment(new_resultitem):
     data = result_item.as_api_payload()
 
     assert 'Log truncated\n...\n' in data['comment']
+
+
+def test_resultitem_slots(new_resultitem):
+    result_item = new_resultitem(status_id='passed')
+
+    assert not hasattr(result_item, '__dict__')
+
+
+def test_resultitem_interned_strings(new_resultitem):
+    """Scenario:
+
+    Given two results for the same test
+    When the test name and defects are built from different string objects
+    Then both results share the same string objects
+    """
+    first = new_resultitem(
+        test_name=''.join(['test_', 'foo']),
+        status_id='passed',
+        defects=''.join(['PF-', '516']),
+    )
+    second = new_resultitem(
+        test_name=''.join(['test_', 'foo']),
+        status_id='failed',
+        defects=''.join(['PF-', '516']),
+    )
+
+    assert first.test_name is second.test_name
+    assert first.defects is second.defects
+
+
+def test_resultitem_memory_bounded(new_resultitem):
+    """Scenario:
+
+    Given many results for the same test
+    When they are held in memory
+    Then each result only costs its own slots
+
+    A __dict__ per instance, or a copy of the test name per result,
+    makes each result larger than this bound.
+    """
+    count = 10000
+    timestamp = 1.0
+
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        results = [
+            new_resultitem(
+                test_name=''.join(['test_foo[', 'param', ']']),
+                case_id=1234,
+                status_id='passed',
+                defects=''.join(['PF-', '516']),
+                timestamp=timestamp,
+                duration=timestamp,
+            )
+            for _ in range(count)
+        ]
+        size = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+
+    assert len(results) == count
+    assert size / count < 128
@@ -0,0 +1,110 @@
+import random
+
+import pytest
+
+from pytest_testrail import result_table
+from pytest_testrail.result_table import ResultTable
+from pytest_testrail.results import Results
+from pytest_testrail.status import TESTRAIL_TEST_STATUS
+
+
+def _random_results(new_resultitem, count, seed):
+    rng = random.Random(seed)
+    return [
+        new_resultitem(
+            test_name=f'test_foo_{rng.randint(0, 5)}',
+            case_id=rng.randint(1, 4),
+            status_id=rng.choice(['passed', 'failed', 'skipped']),
+            timestamp=rng.randint(1, 20),
+            duration=rng.choice([None, 0.5, 2.0]),
+        )
+        for _ in range(count)
+    ]
+
+
+def test_result_table_view(new_resultitem):
+    item = new_resultitem(
+        status_id='failed',
+        duration=None,
+        defects='PF-516',
+        test_parametrize={'foo': 1},
+        comment='An error',
+    )
+
+    table = ResultTable([item])
+
+    assert len(table) == 1
+    assert table[0] == item
+    assert table[0].as_api_payload() == item.as_api_payload()
+
+
+def test_result_table_shared_values(new_resultitem):
+    params = {'foo': 1}
+    table = ResultTable([
+        new_resultitem(test_name='test_foo', status_id='passed', test_parametrize=params),
+        new_resultitem(test_name='test_foo', status_id='failed', test_parametrize=params),
+    ])
+
+    assert table.name_ids[0] == table.name_ids[1]
+    assert table.parametrize_ids[0] == table.parametrize_ids[1]
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_result_table_sorted_indexes(new_resultitem, monkeypatch, seed):
+    monkeypatch.setattr(result_table, 'numpy', None)
+    items = _random_results(new_resultitem, 100, seed)
+
+    table = ResultTable(items)
+
+    assert [items[i] for i in table.sorted_indexes()] == Results(items)._sort()
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_result_table_sorted_indexes_numpy(new_resultitem, seed):
+    pytest.importorskip('numpy')
+    items = _random_results(new_resultitem, 100, seed)
+
+    table = ResultTable(items)
+
+    assert [items[i] for i in table.sorted_indexes()] == Results(items)._sort()
+
+
+def test_result_table_filter_indexes(new_resultitem):
+    items = [
+        new_resultitem(case_id=1, status_id='passed'),
+        new_resultitem(case_id=2, status_id='failed'),
+        new_resultitem(case_id=3, status_id='failed'),
+    ]
+    table = ResultTable(items)
+
+    rv = table.filter_indexes(
+        range(len(table)),
+        exclude_case_ids=[3],
+        testrail_status_id=TESTRAIL_TEST_STATUS['failed'],
+    )
+
+    assert rv == [1]
+
+
+def test_result_table_latest_indexes(new_resultitem):
+    items = [
+        new_resultitem(test_name='test_foo', case_id=1, status_id='failed', timestamp=1),
+        new_resultitem(test_name='test_foo', case_id=1, status_id='passed', timestamp=2),
+    ]
+    table = ResultTable(items)
+
+    assert list(table.latest_indexes().values()) == [1]
+
+
+@pytest.mark.parametrize('spill_threshold', [0, 7])
+def test_results_columnar(new_resultitem, tmp_path, spill_threshold):
+    items = _random_results(new_resultitem, 50, 0)
+
+    columnar = Results(spill_threshold=spill_threshold, spill_dir=str(tmp_path), columnar=True)
+    for item in items:
+        columnar.append(item)
+
+    expected = [i for i in Results(items)._sort() if i.case_id != 2]
+
+    assert len(columnar) == len(items)
+    assert list(columnar.iter_sorted(exclude_case_ids=[2])) == expected
@@ -1,3 +1,10 @@
+import random
+from itertools import groupby
+from operator import attrgetter
+
+import pytest
+
+from pytest_testrail import results as results_module
 from pytest_testrail.results import Results
 
 
@@ -440,3 +447,123 @@ def test_add_results_sort_by_status_id_and_timestamp(api_client, new_resultitem)
     r2 = res._sort()
 
     assert r2 == expected_results
+
+
+def _random_results(new_resultitem, count, seed):
+    rng = random.Random(seed)
+    return [
+        new_resultitem(
+            test_name=f'test_foo_{rng.randint(0, 5)}',
+            case_id=rng.randint(1, 4),
+            status_id=rng.choice(['passed', 'failed', 'skipped']),
+            timestamp=rng.randint(1, 20),
+        )
+        for _ in range(count)
+    ]
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_iter_sorted_spilled_matches_sort(new_resultitem, tmp_path, seed):
+    """Scenario:
+
+    Given a collection of test results larger than the spill threshold
+    When the results are sorted
+    Then the spilled results are in the same order as the in-memory sort
+    """
+    results = _random_results(new_resultitem, 100, seed)
+
+    in_memory = Results()
+    spilled = Results(spill_threshold=7, spill_dir=str(tmp_path))
+    for result in results:
+        in_memory.append(result)
+        spilled.append(result)
+
+    assert spilled.spilled
+    assert len(spilled) == len(in_memory)
+
+    expected = [(r.case_id, r.test_name, r.timestamp, r.status_id) for r in in_memory._sort()]
+    actual = [(r.case_id, r.test_name, r.timestamp, r.status_id) for r in spilled.iter_sorted()]
+
+    assert actual == expected
+
+
+def test_sort_includes_spilled(new_resultitem, tmp_path):
+    results = _random_results(new_resultitem, 20, 0)
+
+    spilled = Results(spill_threshold=7, spill_dir=str(tmp_path))
+    for result in results:
+        spilled.append(result)
+
+    assert spilled._sort() == list(spilled.iter_sorted())
+    assert len(spilled._sort()) == 20
+
+
+def test_iter_sorted_closes_abandoned_spill_files(new_resultitem, tmp_path, monkeypatch):
+    opened = []
+
+    def tracked_open(*args, **kwargs):
+        f = open(*args, **kwargs)
+        opened.append(f)
+        return f
+
+    monkeypatch.setattr(results_module, 'open', tracked_open, raising=False)
+
+    spilled = Results(spill_threshold=2, spill_dir=str(tmp_path))
+    for result in _random_results(new_resultitem, 10, 0):
+        spilled.append(result)
+
+    sorted_results = spilled.iter_sorted()
+    next(sorted_results)
+    sorted_results.close()
+
+    assert opened
+    assert all(f.closed for f in opened)
+
+
+def test_results_cleanup(new_resultitem, tmp_path):
+    res = Results(spill_threshold=2, spill_dir=str(tmp_path))
+    for _ in range(5):
+        res.append(new_resultitem(status_id='passed', test_parametrize={'foo': lambda: 1}))
+
+    assert len(list(tmp_path.iterdir())) == 2
+
+    res.cleanup()
+
+    assert list(tmp_path.iterdir()) == []
+    assert len(res) == 1
+
+
+def _reference_sort(data):
+    """Multi-pass sort used before Results._sort() was a single keyed sort."""
+    all_split_by_test_name = []
+
+    results = sorted(data, key=attrgetter('case_id'))
+    for _case_id, cases_by_id in groupby(results, lambda x: x.case_id):
+        cases_list = list(cases_by_id)
+        cases_list.sort(key=attrgetter('test_name', 'timestamp'))
+
+        for _test_name, cases_by_test_name in groupby(cases_list, lambda x: x.test_name):
+            test_name_cases_list = list(cases_by_test_name)
+            test_name_cases_list.sort(key=attrgetter('timestamp'))
+            all_split_by_test_name.append(test_name_cases_list)
+
+    all_split_by_test_name.sort(key=lambda x: x[-1].testrail_status_id)
+
+    return [item for itemlist in all_split_by_test_name for item in itemlist]
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_sort_matches_reference(new_resultitem, seed):
+    """Scenario:
+
+    Given a random collection of test results
+    When the results are sorted
+    Then the order is the same as the multi-pass reference sort
+    """
+    results = _random_results(new_resultitem, 200, seed)
+
+    res = Results()
+    for result in results:
+        res.append(result)
+
+    assert [id(r) for r in res._sort()] == [id(r) for r in _reference_sort(results)]
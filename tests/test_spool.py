@@ -0,0 +1,44 @@
+from pytest_testrail.comment import CompressedComment
+from pytest_testrail.spool import default_spool_path, read_spool, write_spool
+
+
+def test_spool_round_trip(new_resultitem, tmp_path):
+    results = [
+        new_resultitem(
+            test_name='test_foo[1]',
+            case_id=1234,
+            status_id='failed',
+            duration=2.6,
+            comment=CompressedComment('An error'),
+            defects='PF-418',
+            test_parametrize={'a': 1},
+            timestamp=999,
+        ),
+        new_resultitem(case_id=5678, status_id='passed'),
+    ]
+
+    path = str(tmp_path / 'spool.jsonl')
+    assert write_spool(path, results, {'run_id': 10}) == 2
+
+    header, spooled = read_spool(path)
+    spooled = list(spooled)
+
+    assert header['run_id'] == 10
+    assert spooled[0].comment == 'An error'
+    assert spooled[1] == results[1]
+
+    # The payload is the same, the parametrize info is kept as text.
+    for original, copy in zip(results, spooled):
+        assert copy.as_api_payload() == original.as_api_payload()
+
+
+def test_spool_twice_keeps_both(new_resultitem, tmp_path):
+    first = default_spool_path(str(tmp_path), 10)
+    write_spool(first, [new_resultitem(case_id=1, status_id='failed')], {'run_id': 10})
+
+    second = default_spool_path(str(tmp_path), 10)
+    write_spool(second, [new_resultitem(case_id=2, status_id='passed')], {'run_id': 10})
+
+    assert first != second
+    assert [item.case_id for item in read_spool(first)[1]] == [1]
+    assert [item.case_id for item in read_spool(second)[1]] == [2]
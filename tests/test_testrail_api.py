@@ -19,3 +19,17 @@ def test_get_api_error_strict():
         client.validate_response(response, strict=True)
 
     assert str(exc.value) == 'ded'
+
+
+def test_routes_share_session():
+    client = _TestRailAPI('dummy', 'a', 'b')
+
+    assert client.get_run(run_id=1).session is client.get_plan(plan_id=2).session
+
+
+def test_timeout_not_in_request_kwargs():
+    """The client's timeout doesn't replace the timeout given to a request."""
+    client = _TestRailAPI('dummy', ('a', 'b'), timeout=12.0)
+
+    assert 'timeout' not in client.request_kwargs
+    assert client.get_run(run_id=1).session.timeout == 12.0
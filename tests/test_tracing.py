@@ -0,0 +1,102 @@
+import json
+import threading
+
+import pytest
+
+from pytest_testrail.tracing import Tracer
+
+
+def test_tracer_disabled():
+    tracer = Tracer()
+
+    with tracer.span('create_run'):
+        pass
+
+    assert tracer.events == []
+
+
+def test_tracer_nested_spans():
+    tracer = Tracer(enabled=True)
+
+    with tracer.span('sessionfinish'):
+        with tracer.span('upload_chunk', run_id=10):
+            pass
+
+    inner, outer = tracer.events
+    assert inner['name'] == 'upload_chunk'
+    assert inner['parent_id'] == outer['span_id']
+    assert inner['args'] == {'run_id': 10}
+    assert outer['parent_id'] is None
+
+
+def test_tracer_span_error():
+    tracer = Tracer(enabled=True)
+
+    with pytest.raises(ValueError):
+        with tracer.span('create_run'):
+            raise ValueError
+
+    assert tracer.events[0]['args'] == {'error': 'ValueError'}
+
+
+def test_tracer_chrome_lanes():
+    worker = Tracer(enabled=True, lane='gw0')
+    with worker.span('upload_chunk'):
+        pass
+
+    tracer = Tracer(enabled=True)
+    with tracer.span('create_run'):
+        pass
+    tracer.merge(worker.events)
+
+    trace_events = tracer.as_chrome()['traceEvents']
+
+    lanes = {e['args']['name']: e['pid'] for e in trace_events if e['name'] == 'process_name'}
+    assert lanes == {'pytest-testrail controller': 1, 'pytest-testrail gw0': 2}
+
+    spans = {e['name']: e for e in trace_events if e['ph'] == 'X'}
+    assert (spans['create_run']['pid'], spans['create_run']['tid']) == (1, 0)
+    assert (spans['upload_chunk']['pid'], spans['upload_chunk']['tid']) == (2, 0)
+
+
+def test_tracer_chrome_threads():
+    tracer = Tracer(enabled=True)
+
+    def create_run():
+        with tracer.span('create_run'):
+            pass
+
+    with tracer.span('collection'):
+        thread = threading.Thread(target=create_run, name='pytest-testrail-create-run')
+        thread.start()
+        thread.join()
+
+    trace_events = tracer.as_chrome()['traceEvents']
+
+    threads = {e['args']['name']: e['tid'] for e in trace_events if e['name'] == 'thread_name'}
+    assert threads == {'MainThread': 0, 'pytest-testrail-create-run': 1}
+
+    spans = {e['name']: e for e in trace_events if e['ph'] == 'X'}
+    assert spans['collection']['tid'] == 0
+    assert spans['create_run']['tid'] == 1
+    assert spans['collection']['pid'] == spans['create_run']['pid']
+
+
+def test_tracer_write_otlp(tmp_path):
+    tracer = Tracer(enabled=True)
+    with tracer.span('create_run', project_id=4):
+        pass
+
+    path = tmp_path / 'trace.json'
+    tracer.write(str(path), 'otlp')
+
+    data = json.loads(path.read_text())
+    span = data['resourceSpans'][0]['scopeSpans'][0]['spans'][0]
+    assert span['name'] == 'create_run'
+    assert span['traceId'] == tracer.trace_id
+    assert {'key': 'project_id', 'value': {'stringValue': '4'}} in span['attributes']
+
+
+def test_tracer_write_unknown_format(tmp_path):
+    with pytest.raises(ValueError):
+        Tracer().write(str(tmp_path / 'trace.json'), 'foo')
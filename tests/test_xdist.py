@@ -1,3 +1,5 @@
+import json
+
 import pytest
 
 
@@ -93,3 +95,90 @@ def test_xdist_create_new_run(pytester, dummy_test_file2, caplog):
     )
 
     result.assert_outcomes(passed=4, skipped=0, failed=0, errors=0)
+
+
+def test_xdist_profile(pytester, dummy_test_file2):
+    """Scenario: pytest-xdist is installed
+
+    When pytest is invoked with xdist and --tr-profile
+    Then the plugin's profile is shown in the terminal summary
+    And it includes the measurements from the xdist workers.
+    """
+    result = pytester.runpytest(
+        '--testrail',
+        '--tr-url=dummy',
+        '--tr-email=dummy',
+        '--tr-password=dummy',
+        '--tr-profile',
+        '-n 2',
+    )
+
+    result.assert_outcomes(passed=4)
+    result.stdout.fnmatch_lines([
+        '*pytest-testrail profile*',
+        'makereport*',
+        'pytest-testrail total:*',
+    ])
+
+
+def test_xdist_trace(pytester, dummy_test_file2):
+    """Scenario: pytest-xdist is installed
+
+    When pytest is invoked with xdist and --tr-trace
+    Then a Chrome trace file is written
+    And every xdist worker has its own lane.
+    """
+    result = pytester.runpytest(
+        '--testrail',
+        '--tr-url=dummy',
+        '--tr-email=dummy',
+        '--tr-password=dummy',
+        '--tr-trace=trace.json',
+        '-n 2',
+    )
+
+    result.assert_outcomes(passed=4)
+
+    data = json.loads((pytester.path / 'trace.json').read_text())
+    lanes = {e['args']['name'] for e in data['traceEvents'] if e['name'] == 'process_name'}
+    assert {'pytest-testrail gw0', 'pytest-testrail gw1'} <= lanes
+
+
+def test_xdist_memory_report(pytester, dummy_test_file2):
+    """Scenario: pytest-xdist is installed
+
+    When pytest is invoked with xdist and --tr-memory-report
+    Then the memory held by the plugin in each worker is shown in the terminal summary.
+    """
+    result = pytester.runpytest(
+        '--testrail',
+        '--tr-url=dummy',
+        '--tr-email=dummy',
+        '--tr-password=dummy',
+        '--tr-memory-report',
+        '-n 2',
+    )
+
+    result.assert_outcomes(passed=4)
+    result.stdout.fnmatch_lines([
+        '*pytest-testrail memory (gw*)*',
+        'plugin peak:*',
+    ])
+
+
+def test_xdist_configuration_check_failed(pytester, dummy_test_file2):
+    """Scenario: pytest-xdist is installed
+
+    When pytest is invoked with xdist and a testrun TestRail can't check
+    Then the xdist controller shows the error as a warning.
+    """
+    result = pytester.runpytest(
+        '--testrail',
+        '--tr-url=dummy',
+        '--tr-email=dummy',
+        '--tr-password=dummy',
+        '--tr-run-id=5',
+        '-n 2',
+    )
+
+    result.stdout.fnmatch_lines(['*PytestWarning: TestRail configuration check failed:*'])